@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Liaisons protocolaires des services.
+
+Chaque service expose :
+- ``/<Nom>``      : SOAP 1.1 validé par lxml (point d'entrée public, inchangé)
+- ``/<Nom>Json``  : document JSON sur HTTP POST, sans validation de schéma,
+                    réservé aux appels internes du composite
+
+Corps d'une requête JSON : ``{"<operation>": {"<param>": <valeur>}}`` ;
+la réponse est la valeur de retour sérialisée en JSON.
+Les deux points d'entrée compressent leurs réponses en gzip si le client l'accepte
+(voir common/wire.py).
+"""
+
+import json
+
+from spyne import Application
+from spyne.protocol.json import JsonDocument
+from spyne.server.wsgi import WsgiApplication
+
+from common.wire import gzip_wsgi_app
+
+JSON_PATH_SUFFIX = "Json"
+
+
+def json_application(services, tns: str) -> Application:
+    return Application(
+        services,
+        tns=tns,
+        in_protocol=JsonDocument(validator='soft'),
+        out_protocol=JsonDocument()
+    )
+
+
+def wsgi_endpoints(soap_app: Application, json_app: Application, path: str):
+    """Retourne les couples (WsgiApplication, url) attendus par ``run_twisted``."""
+    return [
+        (gzip_wsgi_app(WsgiApplication(soap_app)), path.encode()),
+        (gzip_wsgi_app(WsgiApplication(json_app)), (path + JSON_PATH_SUFFIX).encode()),
+    ]
+
+
+def readiness_wsgi_app_for(status):
+    """
+    Point d'entrée HTTP GET /ready : 200 une fois le service prêt, 503 pendant le warm-up.
+    ``status`` retourne (prêt, détails).
+    """
+    def readiness_wsgi_app(environ, start_response):
+        ready, details = status()
+        start_response("200 OK" if ready else "503 Service Unavailable", [("Content-Type", "application/json")])
+        return [json.dumps({"status": "ready" if ready else "warming_up", **details}).encode("utf-8")]
+    return readiness_wsgi_app
+
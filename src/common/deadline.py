@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Propagation des échéances (deadlines) entre le composite et les services.
+
+Le composite attribue à chaque requête une échéance globale, la découpe en
+budgets par étape et transmet le budget restant à chaque enfant :
+- en SOAP, dans l'en-tête ``CallContext`` (request_id, budget_ms) ; l'en-tête
+  n'est pas déclaré dans le WSDL (suds ne résout pas les messages d'en-tête
+  que Spyne place dans un autre namespace) : il est lu tel quel dans l'enveloppe
+- sur le chemin JSON, dans les en-têtes HTTP X-Request-Id / X-Request-Budget-Ms
+
+Le même en-tête porte le jeton de profilage d'une trace (voir common/profiling.py).
+
+Le budget est relatif (millisecondes restantes), pas une heure absolue : les
+horloges des processus n'ont pas besoin d'être synchronisées.
+Côté enfant, ``enforce_deadlines`` refuse les appels arrivés hors délai et
+rend l'échéance disponible au code métier via ``current_deadline(ctx)``.
+"""
+
+import time
+from typing import Dict, Optional
+
+from lxml import etree
+from spyne.error import Fault
+from spyne.util.xml import get_object_as_xml, get_xml_as_object
+
+from common.models import CallContext
+
+BUDGET_HTTP_HEADER = "X-Request-Budget-Ms"
+REQUEST_ID_HTTP_HEADER = "X-Request-Id"
+PROFILE_TOKEN_HTTP_HEADER = "X-Profile-Token"
+
+
+class DeadlineExceeded(Fault):
+    """Échéance dépassée pendant ``stage``."""
+
+    def __init__(self, stage: str):
+        super().__init__(faultcode="Server.DeadlineExceeded", faultstring=f"Deadline exceeded during {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Instant limite sur l'horloge monotone du processus."""
+    __slots__ = ("expires_at",)
+
+    def __init__(self, expires_at: float):
+        self.expires_at = expires_at
+
+    @classmethod
+    def after_ms(cls, budget_ms: float) -> "Deadline":
+        return cls(time.monotonic() + budget_ms / 1000.0)
+
+    def remaining(self) -> float:
+        """Secondes restantes (jamais négatif)."""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def remaining_ms(self) -> int:
+        return int(self.remaining() * 1000)
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, stage: str):
+        if self.expired():
+            raise DeadlineExceeded(stage)
+
+    def share(self, weight: float, total_weight: float) -> "Deadline":
+        """
+        Sous-échéance d'une étape : une part ``weight / total_weight`` du temps restant.
+        Le temps non consommé par les étapes précédentes profite aux suivantes.
+        """
+        if total_weight <= 0:
+            return self
+        return Deadline(time.monotonic() + self.remaining() * weight / total_weight)
+
+
+# --- Côté service (Spyne) --- #
+_CALL_CONTEXT_TAG = "{%s}%s" % (CallContext.get_namespace(), CallContext.get_type_name())
+
+
+def call_context_header(ctx) -> Optional[CallContext]:
+    """En-tête SOAP CallContext de l'appel en cours (lu tel quel dans l'enveloppe), ou None."""
+    for element in getattr(ctx, "in_header_doc", None) or ():
+        if getattr(element, "tag", None) == _CALL_CONTEXT_TAG:
+            return get_xml_as_object(element, CallContext)
+    return None
+
+
+def http_header(ctx, name: str) -> Optional[str]:
+    """En-tête HTTP de la requête en cours (WSGI), ou None."""
+    env = getattr(ctx.transport, "req_env", None) or {}
+    return env.get("HTTP_" + name.upper().replace("-", "_"))
+
+
+def _header_budget(ctx) -> Optional[tuple]:
+    header = call_context_header(ctx)
+    if header is not None and header.budget_ms is not None:
+        return header.budget_ms, header.request_id
+    raw = http_header(ctx, BUDGET_HTTP_HEADER)
+    if raw:
+        try:
+            return int(raw), http_header(ctx, REQUEST_ID_HTTP_HEADER)
+        except ValueError:
+            return None
+    return None
+
+
+def deadline_from_ctx(ctx) -> Optional[Deadline]:
+    """Échéance transmise par l'appelant (en-tête SOAP ou HTTP), ou None."""
+    found = _header_budget(ctx)
+    return Deadline.after_ms(found[0]) if found else None
+
+
+def current_deadline(ctx) -> Optional[Deadline]:
+    """Échéance de l'appel en cours, fixée à son arrivée par ``enforce_deadlines``."""
+    return (ctx.udc or {}).get("deadline") if isinstance(ctx.udc, dict) else None
+
+
+def enforce_deadlines(service_name: str, logger, *apps):
+    """Enregistre sur chaque application le contrôle d'échéance à l'entrée des méthodes."""
+    def on_method_call(ctx):
+        found = _header_budget(ctx)
+        if not found:
+            return
+        budget_ms, request_id = found
+        if not isinstance(ctx.udc, dict):
+            ctx.udc = {}
+        ctx.udc["deadline"] = deadline = Deadline.after_ms(budget_ms)
+        if deadline.expired():
+            logger.warning("[%s] Dropping call for %s: deadline already passed", service_name, request_id)
+            raise DeadlineExceeded(service_name)
+
+    for app in apps:
+        app.event_manager.add_listener("method_call", on_method_call)
+
+
+def call_context_xml(deadline: Deadline, request_id: str = None, profile_token: str = None) -> str:
+    """En-tête SOAP CallContext sérialisé (à injecter dans l'enveloppe sortante)."""
+    header = CallContext(request_id=request_id, budget_ms=deadline.remaining_ms(), profile_token=profile_token)
+    return etree.tostring(get_object_as_xml(header, CallContext), encoding="unicode")
+
+
+def budget_headers(deadline: Deadline, request_id: str = None, profile_token: str = None) -> Dict[str, str]:
+    """En-têtes HTTP du chemin JSON."""
+    headers = {BUDGET_HTTP_HEADER: str(deadline.remaining_ms())}
+    if request_id:
+        headers[REQUEST_ID_HTTP_HEADER] = request_id
+    if profile_token:
+        headers[PROFILE_TOKEN_HTTP_HEADER] = profile_token
+    return headers
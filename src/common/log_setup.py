@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Logging partagé par les cinq services:
+- Formatage et écriture déportés sur un thread de fond (QueueHandler/QueueListener)
+- Sortie en lignes JSON structurées, sur stdout (LOG_STREAM=stderr pour les outils
+  en ligne de commande dont stdout porte les données)
+- Journalisation des payloads échantillonnée (LOG_PAYLOAD_SAMPLE_RATE)
+
+Les messages doivent utiliser le style ``logger.info("... %s", value)`` : les
+arguments ne sont interpolés que par le thread de fond, et jamais si le niveau
+est désactivé.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+
+# --- Configuration --- #
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", "0.1"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_STREAM = os.getenv("LOG_STREAM", "stdout").lower()
+
+# Attributs standards d'un LogRecord (tout le reste est considéré comme un champ structuré)
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Sérialise chaque enregistrement en une ligne JSON."""
+
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui ne formate rien dans le thread appelant.
+
+    Le QueueHandler standard interpole le message avant l'enqueue ; ici le
+    LogRecord est transmis tel quel et c'est le listener qui paie le formatage.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Ne jamais bloquer une requête pour un log : on le perd.
+            pass
+
+
+def setup_logging(service: str, level: str = None) -> logging.Logger:
+    """Installe le handler asynchrone sur le logger racine et retourne le logger du service."""
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(level or LOG_LEVEL)
+
+    if _listener is None:
+        stream = logging.StreamHandler(sys.stderr if LOG_STREAM == "stderr" else sys.stdout)
+        stream.setFormatter(JsonLineFormatter(service))
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_DeferredQueueHandler(log_queue))
+        _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+    return logging.getLogger(service)
+
+
+def log_payload(logger: logging.Logger, label: str, payload, rate: float = None, **fields):
+    """Journalise un payload complet, pour une fraction ``rate`` des appels seulement.
+
+    Le payload est attaché comme champ structuré et n'est sérialisé que par le
+    thread de fond ; l'appelant ne doit plus le modifier après l'appel.
+    """
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    rate = LOG_PAYLOAD_SAMPLE_RATE if rate is None else rate
+    if rate < 1.0 and random.random() >= rate:
+        return
+    logger.info("%s", label, extra={"payload": payload, **fields})
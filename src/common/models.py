@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Types Spyne partagés par les opérations typées des services.
+
+Les opérations historiques échangent une chaîne JSON dans un ``Unicode`` ;
+les opérations ``*_typed`` échangent directement ces ComplexModel, ce qui
+évite un encodage/décodage JSON à chaque saut.
+Tous les types vivent dans le même namespace pour pouvoir être relayés d'un
+service à l'autre sans conversion.
+"""
+
+from spyne import ComplexModel, Unicode, Double, Integer, Boolean, Array
+from spyne.util.dictdoc import get_dict_as_object, get_object_as_dict
+
+TYPES_NS = "loan.types"
+
+
+class CallContext(ComplexModel):
+    """En-tête SOAP propagé du composite vers les services (voir common/deadline.py)."""
+    __namespace__ = TYPES_NS
+
+    request_id = Unicode
+    budget_ms = Integer  # budget restant en millisecondes à l'envoi
+    profile_token = Unicode  # jeton d'administration : profiler cet appel (voir common/profiling.py)
+
+
+class ExtractedApplication(ComplexModel):
+    """Sortie de l'extraction d'information (mêmes clés que le JSON historique)."""
+    __namespace__ = TYPES_NS
+
+    nom = Unicode
+    prenom = Unicode
+    adresse = Unicode
+    email = Unicode
+    telephone = Unicode
+    montant_pret = Double
+    revenu_mensuel = Double
+    depenses_mensuelles = Double
+    age = Integer
+    emploi_stable = Unicode
+    description = Unicode
+    texte_original = Unicode
+
+
+class CreditBureau(ComplexModel):
+    __namespace__ = TYPES_NS
+
+    historique_paiement = Unicode
+    dettes_en_cours = Integer
+    retards_paiement = Integer
+    anciennete_credit = Integer
+    score_bureau = Integer
+
+
+class CreditResult(ComplexModel):
+    __namespace__ = TYPES_NS
+
+    credit_score = Double
+    credit_bureau = CreditBureau
+
+
+class PropertyValuation(ComplexModel):
+    __namespace__ = TYPES_NS
+
+    property_value = Double
+    region = Unicode
+    prix_m2 = Double
+    surface_estimee_m2 = Integer
+    facteur_condition = Double
+    facteur_conformite = Double
+    adjustment_factor = Double
+    conforme = Boolean
+    litige_en_cours = Boolean
+
+
+class DecisionInput(ComplexModel):
+    __namespace__ = TYPES_NS
+
+    credit_score = Double
+    property_value = Double
+    loan_amount = Double
+    revenu_mensuel = Double
+    depenses_mensuelles = Double
+    emploi_stable = Boolean
+    loan_term_months = Integer  # DEFAULT_LOAN_TERM_MONTHS si absent
+    include_schedule = Boolean  # tableau d'amortissement complet dans la réponse
+
+
+class RiskDetails(ComplexModel):
+    __namespace__ = TYPES_NS
+
+    credit_score = Double
+    loan_amount = Double
+    property_value = Double
+    loan_to_value = Double
+    debt_to_income = Double
+    monthly_savings = Double
+    employment_stable = Boolean
+    risk_score = Double
+    default_probability = Double
+    monthly_income = Double
+    monthly_expenses = Double
+    monthly_payment = Double
+    loan_term_months = Integer
+
+
+class AmortizationRow(ComplexModel):
+    __namespace__ = TYPES_NS
+
+    month = Integer
+    payment = Double
+    principal = Double
+    interest = Double
+    balance = Double
+
+
+class Amortization(ComplexModel):
+    __namespace__ = TYPES_NS
+
+    term_months = Integer
+    monthly_payment = Double
+    total_paid = Double
+    total_interest = Double
+    schedule = Array(AmortizationRow)
+
+
+class Decision(ComplexModel):
+    __namespace__ = TYPES_NS
+
+    approved = Boolean
+    interest_rate = Double
+    loan_amount = Double
+    risk_details = RiskDetails
+    reasons = Array(Unicode)
+    recommendations = Array(Unicode)
+    message = Unicode
+    policy_version = Unicode
+    degraded = Boolean  # CC ou PE servis depuis le cache de repli
+    degraded_stages = Array(Unicode)
+    stages_reused = Array(Unicode)  # étapes servies par la mémoïsation du composite
+    amortization = Amortization
+
+
+class LoanResponse(ComplexModel):
+    """Réponse de ``submitRequestTyped`` (équivalent typé de l'enveloppe JSON)."""
+    __namespace__ = TYPES_NS
+
+    status = Unicode
+    request_id = Unicode
+    message = Unicode
+    decision = Decision
+
+
+# --- Conversions dict <-> modèle --- #
+def to_model(cls, data: dict):
+    """Construit une instance ``cls`` depuis un dict (les clés inconnues sont ignorées)."""
+    return get_dict_as_object(data or {}, cls)
+
+
+def to_dict(obj) -> dict:
+    """Convertit une instance de ComplexModel en dict imbriqué."""
+    if obj is None:
+        return {}
+    return get_object_as_dict(obj, obj.__class__)
+
+
+def credit_result_from_dict(result: dict) -> CreditResult:
+    return CreditResult(
+        credit_score=result.get("credit_score"),
+        credit_bureau=to_model(CreditBureau, result.get("details", {}).get("credit_bureau")),
+    )
+
+
+def property_valuation_from_dict(result: dict) -> PropertyValuation:
+    details = result.get("details", {})
+    legal = details.get("legal", {})
+    return PropertyValuation(
+        property_value=result.get("property_value"),
+        region=details.get("region"),
+        prix_m2=details.get("prix_m2"),
+        surface_estimee_m2=details.get("surface_estimee_m2"),
+        facteur_condition=details.get("facteur_condition"),
+        facteur_conformite=details.get("facteur_conformite"),
+        adjustment_factor=details.get("adjustment_factor"),
+        conforme=legal.get("conforme"),
+        litige_en_cours=legal.get("litige_en_cours"),
+    )
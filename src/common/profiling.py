@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Profilage à la demande (cProfile) des cinq services, sans redémarrage.
+
+Un appel est profilé :
+- s'il porte le jeton d'administration PROFILE_ADMIN_TOKEN, dans l'en-tête
+  SOAP ``CallContext.profile_token`` ou l'en-tête HTTP X-Profile-Token ;
+- ou s'il fait partie des N prochains appels / de la fraction échantillonnée
+  réglés à chaud par l'opération d'administration ``/profiling`` :
+      curl -X POST -H "X-Profile-Token: $TOKEN" "http://127.0.0.1:8002/profiling?requests=1"
+      curl -X POST -H "X-Profile-Token: $TOKEN" "http://127.0.0.1:8000/profiling?sample_rate=0.01"
+
+Sans PROFILE_ADMIN_TOKEN, le profilage est désactivé. Le composite transmet le
+jeton aux enfants pendant un appel profilé : toute la trace est profilée.
+Une méthode qui se poursuit dans le pool de threads (orchestrateur asynchrone
+du composite) y emporte son profil : voir ``continue_in_thread``.
+Chaque appel produit ``PROFILE_DIR/<request_id>.<service>.<pid>.<n>.pstats``
+(ou ``.folded``, piles repliées, selon PROFILE_FORMAT) ; les profils d'une même
+trace se fusionnent avec ``tools/merge_profiles.py <request_id>``.
+"""
+
+import cProfile
+import functools
+import hmac
+import itertools
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs
+
+from common.deadline import PROFILE_TOKEN_HTTP_HEADER, call_context_header, http_header
+
+# --- Configuration --- #
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                                    "profiles"))
+PROFILE_FORMAT = os.getenv("PROFILE_FORMAT", "pstats").lower()  # pstats | collapsed | both
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+
+FORMATS = ("pstats", "collapsed", "both")
+MAX_STACK_DEPTH = 64
+# request_id fourni par l'appelant (CallContext, X-Request-Id) : seul ce format sert de nom de fichier
+_SAFE_REQUEST_ID = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+
+class _State:
+    """Réglages courants du processus (modifiés par l'opération d'administration)."""
+
+    def __init__(self):
+        self.service = None
+        self.logger = None
+        self.sample_rate = PROFILE_SAMPLE_RATE
+        self.pending = 0  # prochains appels à profiler
+        self.profiled = 0
+        self.lock = threading.Lock()
+        self.seq = itertools.count(1)
+
+
+_state = _State()
+_local = threading.local()
+
+
+def _token_ok(token: Optional[str]) -> bool:
+    return bool(PROFILE_ADMIN_TOKEN) and bool(token) and hmac.compare_digest(token, PROFILE_ADMIN_TOKEN)
+
+
+def _should_profile(ctx) -> Optional[str]:
+    """Request_id annoncé par l'appelant si l'appel doit être profilé ("" si inconnu), sinon None."""
+    if not PROFILE_ADMIN_TOKEN:
+        return None
+    header = call_context_header(ctx)
+    request_id = (header.request_id if header is not None else None) or http_header(ctx, "X-Request-Id") or ""
+    token = header.profile_token if header is not None else None
+    if _token_ok(token or http_header(ctx, PROFILE_TOKEN_HTTP_HEADER)):
+        return request_id
+    with _state.lock:
+        if _state.pending > 0:
+            _state.pending -= 1
+            return request_id
+    if _state.sample_rate > 0 and random.random() < _state.sample_rate:
+        return request_id
+    return None
+
+
+# --- Côté code métier --- #
+def tag_request(request_id: str):
+    """Associe le profil en cours dans ce thread à ``request_id`` (le composite le connaît après l'entrée)."""
+    active = getattr(_local, "active", None)
+    if active is not None:
+        active["request_id"] = request_id
+
+
+def profile_token() -> Optional[str]:
+    """Jeton à transmettre aux enfants si l'appel en cours est profilé (la trace entière l'est alors)."""
+    return PROFILE_ADMIN_TOKEN if getattr(_local, "active", None) is not None else None
+
+
+def continue_in_thread(fn: Callable) -> Callable:
+    """
+    Pour une méthode qui rend la main (Deferred) et dont le travail s'exécute dans
+    un autre thread : retire le profil en cours de ce thread et retourne ``fn``
+    enveloppée pour le reprendre, puis l'écrire, dans le thread qui l'exécute.
+    Sans profil en cours, ``fn`` est retournée telle quelle.
+
+    cProfile ne suit que son thread : un profil laissé actif dans le thread du
+    réacteur s'arrêterait au retour du Deferred, ou mêlerait les autres requêtes.
+    """
+    active = getattr(_local, "active", None)
+    if active is None:
+        return fn
+    active["profile"].disable()
+    _local.active = None
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        try:
+            active["profile"].enable()
+        except ValueError as e:  # un autre profileur est déjà actif dans ce thread
+            _state.logger.warning("[%s] Profiling unavailable: %s", _state.service, e)
+            return fn(*args, **kwargs)
+        _local.active = active
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            active["profile"].disable()
+            _local.active = None
+            _write(active)
+
+    return run
+
+
+# --- Piles repliées --- #
+def _label(func) -> str:
+    filename, line, name = func
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ":")
+
+
+def collapsed_stacks(stats: pstats.Stats, root: str = None) -> Dict[str, int]:
+    """
+    Piles repliées (format flamegraph.pl, microsecondes) reconstruites depuis le
+    graphe appelant -> appelé de cProfile : le temps d'une fonction est réparti
+    entre ses appelants au prorata du temps cumulé de chaque arc (approximation).
+    """
+    entries = stats.stats
+    callees: Dict[tuple, list] = {}
+    for func, (_cc, _nc, _tt, _ct, callers) in entries.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    roots = [f for f, v in entries.items() if not any(c in entries for c in v[4])]
+    folded: Dict[str, int] = {}
+
+    def walk(func, stack, scale):
+        _cc, _nc, tt, ct, _callers = entries[func]
+        path = stack + [_label(func)]
+        own = int(tt * scale * 1e6)
+        if own > 0:
+            key = ";".join(path)
+            folded[key] = folded.get(key, 0) + own
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_ct in callees.get(func, ()):
+            total = entries[callee][3]
+            share = scale * (edge_ct / total) if total > 0 else 0.0
+            if share * total >= 1e-6 and _label(callee) not in path:
+                walk(callee, path, share)
+
+    for func in roots:
+        walk(func, [root] if root else [], 1.0)
+    return folded
+
+
+def write_collapsed(folded: Dict[str, int], path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, us in sorted(folded.items()):
+            f.write(f"{stack} {us}\n")
+
+
+# --- Côté service (Spyne) --- #
+def _dump(service: str, active: dict):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    request_id = active["request_id"]
+    if not request_id or not _SAFE_REQUEST_ID.fullmatch(request_id):
+        # absent, ou pas un identifiant (ex. "../../ailleurs") : jamais utilisé dans un chemin
+        request_id = f"untagged-{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    base = os.path.join(PROFILE_DIR, f"{request_id}.{service}.{os.getpid()}.{next(_state.seq)}")
+    stats = pstats.Stats(active["profile"])
+    if PROFILE_FORMAT in ("pstats", "both"):
+        stats.dump_stats(base + ".pstats")
+    if PROFILE_FORMAT in ("collapsed", "both"):
+        write_collapsed(collapsed_stacks(stats, root=service), base + ".folded")
+    return base
+
+
+def _write(active: dict):
+    try:
+        path = _dump(_state.service, active)
+        with _state.lock:
+            _state.profiled += 1
+        _state.logger.info("[%s] Profile written: %s", _state.service, path)
+    except Exception as e:
+        _state.logger.error("[%s] Profile dump failed: %s", _state.service, e)
+
+
+def enable_profiling(service_name: str, logger, *apps):
+    """Enregistre sur chaque application le démarrage / l'arrêt du profilage autour des méthodes."""
+    _state.service = service_name
+    _state.logger = logger
+    if PROFILE_FORMAT not in FORMATS:
+        raise ValueError(f"PROFILE_FORMAT must be one of {FORMATS}")
+
+    def on_method_call(ctx):
+        request_id = _should_profile(ctx)
+        if request_id is None or getattr(_local, "active", None) is not None:
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:  # un autre profileur est déjà actif dans ce thread
+            logger.warning("[%s] Profiling unavailable: %s", service_name, e)
+            return
+        _local.active = {"profile": profile, "request_id": request_id}
+
+    def on_method_end(ctx):
+        active = getattr(_local, "active", None)
+        if active is None:
+            return
+        active["profile"].disable()
+        _local.active = None
+        _write(active)
+
+    for app in apps:
+        app.event_manager.add_listener("method_call", on_method_call)
+        app.event_manager.add_listener("method_return_object", on_method_end)
+        app.event_manager.add_listener("method_exception_object", on_method_end)
+
+
+def profiling_wsgi_app(environ, start_response):
+    """
+    Opération d'administration (jeton X-Profile-Token obligatoire) :
+    GET /profiling : réglages courants ;
+    POST /profiling?requests=N&sample_rate=F : profiler les N prochains appels / une fraction F.
+    """
+    token = environ.get("HTTP_" + PROFILE_TOKEN_HTTP_HEADER.upper().replace("-", "_"))
+    if not _token_ok(token):
+        start_response("403 Forbidden", [("Content-Type", "application/json")])
+        return [json.dumps({"status": "error", "message": "admin token required"}).encode("utf-8")]
+
+    if environ.get("REQUEST_METHOD") == "POST":
+        qs = parse_qs(environ.get("QUERY_STRING", ""))
+        try:
+            requests = int(qs["requests"][0]) if "requests" in qs else None
+            sample_rate = float(qs["sample_rate"][0]) if "sample_rate" in qs else None
+            if sample_rate is not None and not 0 <= sample_rate <= 1:
+                raise ValueError("sample_rate must be within [0, 1]")
+        except ValueError as e:
+            start_response("400 Bad Request", [("Content-Type", "application/json")])
+            return [json.dumps({"status": "error", "message": str(e)}).encode("utf-8")]
+        with _state.lock:
+            if requests is not None:
+                _state.pending = max(0, requests)
+            if sample_rate is not None:
+                _state.sample_rate = sample_rate
+
+    with _state.lock:
+        body = {"service": _state.service, "pending": _state.pending, "sample_rate": _state.sample_rate,
+                "profiled": _state.profiled, "format": PROFILE_FORMAT, "dir": PROFILE_DIR}
+    start_response("200 OK", [("Content-Type", "application/json")])
+    return [json.dumps(body).encode("utf-8")]
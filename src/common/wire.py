@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Réponses compactes sur le fil, communes aux cinq services.
+
+- JSON minifié (sans indentation ni espaces après les séparateurs) ;
+  RESPONSE_JSON_INDENT > 0 rétablit l'indentation (lecture humaine, débogage)
+- Niveau de détail demandé par l'appelant dans l'en-tête HTTP X-Response-Detail :
+  ``summary`` omet les sous-objets d'audit (détails du bureau de crédit, de
+  l'évaluation du bien, risk_details de la réponse du composite), ``full`` les
+  inclut ; sans en-tête, RESPONSE_DETAIL
+- Compression gzip négociée (Accept-Encoding) des réponses d'au moins
+  GZIP_MIN_BYTES octets ; GZIP_LEVEL=0 la désactive
+"""
+
+import gzip
+import json
+import os
+import re
+from typing import Dict, Iterable
+
+from common.deadline import http_header
+
+# --- Configuration --- #
+RESPONSE_JSON_INDENT = int(os.getenv("RESPONSE_JSON_INDENT", "0"))
+RESPONSE_DETAIL = os.getenv("RESPONSE_DETAIL", "full").lower()
+GZIP_MIN_BYTES = int(os.getenv("GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+
+DETAIL_HTTP_HEADER = "X-Response-Detail"
+DETAIL_LEVELS = ("summary", "full")
+_GZIP_TOKEN = re.compile(r"^\s*(gzip|\*)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$", re.IGNORECASE)
+
+
+def dumps(obj) -> str:
+    """Sérialisation JSON des réponses (minifiée par défaut)."""
+    if RESPONSE_JSON_INDENT > 0:
+        return json.dumps(obj, indent=RESPONSE_JSON_INDENT, ensure_ascii=False)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def detail_level(ctx) -> str:
+    """Niveau de détail demandé pour l'appel en cours (en-tête X-Response-Detail, sinon RESPONSE_DETAIL)."""
+    requested = (http_header(ctx, DETAIL_HTTP_HEADER) or "").strip().lower()
+    return requested if requested in DETAIL_LEVELS else RESPONSE_DETAIL
+
+
+def full_detail(ctx) -> bool:
+    return detail_level(ctx) == "full"
+
+
+# --- gzip --- #
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Vrai si l'en-tête Accept-Encoding autorise gzip (``gzip`` ou ``*`` avec q > 0)."""
+    for item in (accept_encoding or "").split(","):
+        m = _GZIP_TOKEN.match(item)
+        if m:
+            try:
+                return float(m.group(2) or 1) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def should_compress(accept_encoding: str, size: int) -> bool:
+    return GZIP_LEVEL > 0 and size >= GZIP_MIN_BYTES and accepts_gzip(accept_encoding)
+
+
+def compress(body: bytes) -> bytes:
+    # mtime fixe : deux réponses identiques restent identiques une fois compressées
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def decode_body(headers: Dict[str, str], payload: bytes) -> bytes:
+    """Corps d'une réponse reçue, décompressé si le serveur l'a envoyé en gzip."""
+    encoding = next((v for k, v in headers.items() if k.lower() == "content-encoding"), "")
+    return gzip.decompress(payload) if encoding.strip().lower() == "gzip" else payload
+
+
+def gzip_wsgi_app(app):
+    """
+    Intergiciel WSGI : compresse la réponse de ``app`` si le client accepte gzip.
+    La réponse est mise en mémoire avant envoi : à réserver aux réponses non
+    diffusées en flux (SOAP, JSON, WSDL).
+    """
+    if GZIP_LEVEL <= 0:
+        return app
+
+    def wrapped(environ, start_response):
+        accept_encoding = environ.get("HTTP_ACCEPT_ENCODING", "")
+        if not accepts_gzip(accept_encoding):
+            return app(environ, start_response)
+
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: chunks.append(data)
+
+        chunks = []
+        result: Iterable[bytes] = app(environ, capture)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        status, headers, exc_info = captured
+        body = b"".join(chunks)
+        if should_compress(accept_encoding, len(body)) and \
+                not any(k.lower() == "content-encoding" for k, _ in headers):
+            body = compress(body)
+            headers = [(k, v) for k, v in headers if k.lower() != "content-length"]
+            headers += [("Content-Encoding", "gzip"), ("Vary", "Accept-Encoding"),
+                        ("Content-Length", str(len(body)))]
+        start_response(status, headers, exc_info)
+        return [body]
+
+    return wrapped
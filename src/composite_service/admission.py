@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Contrôle d'admission du service composite:
+- Limite de requêtes en cours (ADMISSION_MAX_CONCURRENT) et file d'attente bornée
+  (ADMISSION_MAX_QUEUE, attente maximale ADMISSION_QUEUE_TIMEOUT)
+- Limite de débit par client (seau à jetons : ADMISSION_RATE_PER_CLIENT / ADMISSION_BURST_PER_CLIENT)
+- Rejet immédiat et structuré ("retry_later") au-delà des limites
+- Classes de priorité (interactive, batch, backfill) servies par partage pondéré
+- Budgets de concurrence par service enfant et par classe (DOWNSTREAM_BUDGETS)
+- Compteurs exposés pour les métriques (profondeur de file, rejets par motif)
+
+Les attentes (file d'admission, créneaux DOWNSTREAM) existent en deux formes :
+bloquante (``acquire`` / ``slot``, orchestrateur à threads) et par rappel
+(``enqueue`` + ``on_grant``, orchestrateur asynchrone, voir async_io.py) ;
+les deux partagent les mêmes compteurs et la même file.
+
+Avec l'orchestrateur à threads, le pool de threads Twisted (COMPOSITE_THREADS)
+doit rester plus grand que concurrence + file : il reste ainsi toujours des
+threads pour rejeter vite et pour servir getResult / listRequests.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+# --- Configuration --- #
+COMPOSITE_THREADS = int(os.getenv("COMPOSITE_THREADS", "32"))
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+ADMISSION_RATE_PER_CLIENT = float(os.getenv("ADMISSION_RATE_PER_CLIENT", "5"))
+ADMISSION_BURST_PER_CLIENT = float(os.getenv("ADMISSION_BURST_PER_CLIENT", "10"))
+MAX_TRACKED_CLIENTS = 10000
+
+# Classes de priorité et poids du partage pondéré
+PRIORITY_WEIGHTS = {"interactive": 8.0, "batch": 2.0, "backfill": 1.0}
+DEFAULT_PRIORITY = "interactive"
+# Classe imposée par clé d'API : "cle1:batch,cle2:backfill"
+PRIORITY_API_KEYS = dict(
+    item.split(":", 1) for item in os.getenv("PRIORITY_API_KEYS", "").split(",") if ":" in item
+)
+# Plafond des appels sans clé listée (en-tête absent ou clé inconnue) quand la table est configurée
+UNKEYED_PRIORITY = os.getenv("UNKEYED_PRIORITY", "backfill")
+if UNKEYED_PRIORITY not in PRIORITY_WEIGHTS:
+    raise ValueError(f"UNKEYED_PRIORITY must be one of {', '.join(PRIORITY_WEIGHTS)}")
+# Appels simultanés autorisés par service enfant et par classe (JSON, fusionné avec les défauts)
+DOWNSTREAM_BUDGETS = {
+    "ie": {"interactive": 8, "batch": 2, "backfill": 1},
+    "cc": {"interactive": 16, "batch": 4, "backfill": 2},
+    "pe": {"interactive": 16, "batch": 4, "backfill": 2},
+    "ds": {"interactive": 16, "batch": 4, "backfill": 2},
+}
+for _service, _per_class in json.loads(os.getenv("DOWNSTREAM_BUDGETS", "{}")).items():
+    DOWNSTREAM_BUDGETS.setdefault(_service, {}).update(_per_class)
+
+
+class Rejected(Exception):
+    """Requête refusée par l'admission ; ``retry_after`` en secondes."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def as_response(self) -> Dict:
+        return {"status": "retry_later", "reason": self.reason, "retry_after": round(self.retry_after, 2)}
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+
+class RateLimiter:
+    """Seau à jetons par client ; les clients inactifs les plus anciens sont oubliés."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, client_id: str) -> Tuple[bool, float]:
+        """Consomme un jeton. Retourne (accepté, secondes avant le prochain jeton)."""
+        if self.rate <= 0:
+            return True, 0.0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(client_id, None) or TokenBucket(self.burst, now)
+            self._buckets[client_id] = bucket
+            if len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return True, 0.0
+            return False, (1 - bucket.tokens) / self.rate
+
+
+class _Waiter:
+    """Demande en attente : réveillée par ``event`` (thread bloqué) ou par ``on_grant`` (rappel)."""
+    __slots__ = ("event", "granted", "on_grant")
+
+    def __init__(self, on_grant: Callable[[], None] = None):
+        self.event = threading.Event()
+        self.granted = False
+        self.on_grant = on_grant
+
+    def wake(self):
+        """Appelé hors verrou une fois ``granted`` posé."""
+        self.event.set()
+        if self.on_grant is not None:
+            self.on_grant()
+
+
+class AdmissionController:
+    """
+    File d'admission bornée avec limite de concurrence, ordonnancée par classe de priorité.
+
+    Quand une place se libère, la classe servie est choisie par partage pondéré
+    (stride scheduling) : chaque classe avance d'un pas 1/poids à chaque
+    admission et la classe en attente la moins avancée passe. interactive (8)
+    obtient ainsi 8 places pour 1 place backfill tant que les deux attendent,
+    sans jamais affamer complètement les classes de fond.
+    """
+
+    def __init__(self, max_concurrent: int = ADMISSION_MAX_CONCURRENT, max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT, limiter: RateLimiter = None,
+                 weights: Dict[str, float] = None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.limiter = limiter or RateLimiter(ADMISSION_RATE_PER_CLIENT, ADMISSION_BURST_PER_CLIENT)
+        self.weights = dict(weights or PRIORITY_WEIGHTS)
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[_Waiter]] = {c: deque() for c in self.weights}
+        self._pass = {c: 0.0 for c in self.weights}
+        self._vtime = 0.0
+        self._active = 0
+        self._admitted = Counter()
+        self._rejected = Counter()
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _grant(self, klass: str):
+        """Comptabilise une admission pour klass (appelé sous verrou)."""
+        self._vtime = self._pass[klass]
+        self._pass[klass] += 1.0 / self.weights[klass]
+        self._admitted[klass] += 1
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        ready = [c for c, q in self._queues.items() if q]
+        if not ready:
+            return None
+        klass = min(ready, key=lambda c: (self._pass[c], -self.weights[c]))
+        self._grant(klass)
+        return self._queues[klass].popleft()
+
+    def enqueue(self, client_id: str, klass: str = DEFAULT_PRIORITY,
+                on_grant: Callable[[], None] = None) -> Optional[_Waiter]:
+        """
+        Demande une place sans bloquer : None si elle est accordée tout de suite,
+        sinon le _Waiter mis en file (``on_grant`` sera appelé à l'attribution).
+        Lève Rejected au-delà de la limite de débit ou si la file est pleine.
+        """
+        allowed, retry_after = self.limiter.take(client_id)
+        if not allowed:
+            with self._lock:
+                self._rejected["rate_limited"] += 1
+            raise Rejected("rate_limited", retry_after)
+
+        with self._lock:
+            if self._active < self.max_concurrent and not self._queued():
+                self._pass[klass] = max(self._pass[klass], self._vtime)
+                self._grant(klass)
+                self._active += 1
+                return None
+            if self._queued() >= self.max_queue:
+                self._rejected["queue_full"] += 1
+                raise Rejected("queue_full", self.queue_timeout)
+            # Une classe qui revient après une pause ne récupère pas le retard accumulé
+            if not self._queues[klass]:
+                self._pass[klass] = max(self._pass[klass], self._vtime)
+            waiter = _Waiter(on_grant)
+            self._queues[klass].append(waiter)
+        return waiter
+
+    def abandon(self, waiter: _Waiter, klass: str) -> bool:
+        """Retire un waiter arrivé au bout de son attente ; False si la place lui a été attribuée entre-temps."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._queues[klass].remove(waiter)
+            self._rejected["queue_timeout"] += 1
+        return True
+
+    def wait_limit(self, timeout: float = None) -> float:
+        """Attente maximale en file : queue_timeout, ou ``timeout`` s'il est plus court."""
+        return self.queue_timeout if timeout is None else min(self.queue_timeout, timeout)
+
+    def acquire(self, client_id: str, klass: str = DEFAULT_PRIORITY, timeout: float = None):
+        """Attend une place (au plus ``wait_limit(timeout)``) ou lève Rejected."""
+        waiter = self.enqueue(client_id, klass)
+        if waiter is None or waiter.event.wait(self.wait_limit(timeout)):
+            return
+        if self.abandon(waiter, klass):
+            raise Rejected("queue_timeout", self.queue_timeout)
+
+    def release(self):
+        with self._lock:
+            waiter = self._next_waiter()
+            if waiter is None:
+                self._active -= 1
+                return
+            # La place est transmise directement : _active ne change pas
+            waiter.granted = True
+        waiter.wake()
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                "active": self._active,
+                "queue_depth": self._queued(),
+                "queue_depth_by_class": {c: len(q) for c, q in self._queues.items()},
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "admitted_total": sum(self._admitted.values()),
+                "admitted_by_class": dict(self._admitted),
+                "rejected_total": sum(self._rejected.values()),
+                "rejected_by_reason": dict(self._rejected),
+                "downstream": DOWNSTREAM.metrics(),
+            }
+
+
+class DownstreamBudgets:
+    """
+    Budgets de concurrence par service enfant et par classe : un lot de fond
+    ne peut occuper qu'une partie des appels simultanés vers IE (lent, LLM),
+    le reste demeurant disponible pour le trafic interactif.
+    Un créneau libéré est transmis au plus ancien demandeur en attente (FIFO).
+    """
+
+    def __init__(self, budgets: Dict[str, Dict[str, int]]):
+        self._budgets = budgets
+        self._lock = threading.Lock()
+        self._in_use = Counter()
+        self._waiters: Dict[Tuple[str, str], Deque[_Waiter]] = {
+            (service, klass): deque() for service, per_class in budgets.items() for klass in per_class
+        }
+
+    def enqueue(self, service: str, klass: str = DEFAULT_PRIORITY,
+                on_grant: Callable[[], None] = None) -> Optional[_Waiter]:
+        """Réserve un appel sans bloquer : None si accordé (ou sans budget), sinon le _Waiter mis en file."""
+        key = (service, klass)
+        if key not in self._waiters:
+            return None
+        with self._lock:
+            if self._in_use[key] < self._budgets[service][klass] and not self._waiters[key]:
+                self._in_use[key] += 1
+                return None
+            waiter = _Waiter(on_grant)
+            self._waiters[key].append(waiter)
+        return waiter
+
+    def abandon(self, waiter: _Waiter, service: str, klass: str = DEFAULT_PRIORITY) -> bool:
+        """Retire un waiter expiré ; False si le créneau lui a été transmis entre-temps."""
+        with self._lock:
+            if waiter.granted:
+                return False
+            self._waiters[(service, klass)].remove(waiter)
+        return True
+
+    def release(self, service: str, klass: str = DEFAULT_PRIORITY):
+        key = (service, klass)
+        if key not in self._waiters:
+            return
+        with self._lock:
+            if not self._waiters[key]:
+                self._in_use[key] -= 1
+                return
+            waiter = self._waiters[key].popleft()
+            waiter.granted = True
+        waiter.wake()
+
+    @contextmanager
+    def slot(self, service: str, klass: str = DEFAULT_PRIORITY, timeout: float = None):
+        """Réserve un appel vers ``service`` ; lève TimeoutError si aucun n'est libéré dans ``timeout``."""
+        waiter = self.enqueue(service, klass)
+        if waiter is not None and not waiter.event.wait(timeout) and self.abandon(waiter, service, klass):
+            raise TimeoutError(f"No {klass} budget left for {service}")
+        try:
+            yield
+        finally:
+            self.release(service, klass)
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {
+                service: {klass: {"in_use": self._in_use[(service, klass)], "limit": limit,
+                                  "waiting": len(self._waiters[(service, klass)])}
+                          for klass, limit in per_class.items()}
+                for service, per_class in self._budgets.items()
+            }
+
+
+DOWNSTREAM = DownstreamBudgets(DOWNSTREAM_BUDGETS)
+
+
+def priority_of(ctx, requested: str = None) -> str:
+    """
+    Classe de la requête. La table des clés d'API fixe un plafond : un paramètre
+    explicite peut seulement abaisser la classe, une demande plus prioritaire
+    que le plafond est ramenée à celui-ci. Sans clé listée, le plafond est
+    UNKEYED_PRIORITY (omettre l'en-tête ne fait pas dépasser le plafond de sa
+    clé) ; sans table configurée, interactive.
+    """
+    env = getattr(ctx.transport, "req_env", None) or {}
+    if not PRIORITY_API_KEYS:
+        ceiling = DEFAULT_PRIORITY
+    else:
+        ceiling = PRIORITY_API_KEYS.get(env.get("HTTP_X_API_KEY"))
+        if ceiling not in PRIORITY_WEIGHTS:
+            ceiling = UNKEYED_PRIORITY
+    if not requested:
+        return ceiling
+    if requested not in PRIORITY_WEIGHTS:
+        raise ValueError(f"Unknown priority '{requested}' (expected one of {', '.join(PRIORITY_WEIGHTS)})")
+    return min(requested, ceiling, key=PRIORITY_WEIGHTS.__getitem__)
+
+
+def client_id_of(ctx) -> str:
+    """
+    Identité du client : en-tête X-Api-Key si la clé figure dans PRIORITY_API_KEYS,
+    sinon adresse IP (une clé inventée à chaque appel n'ouvre pas un seau neuf).
+    """
+    env = getattr(ctx.transport, "req_env", None) or {}
+    api_key = env.get("HTTP_X_API_KEY")
+    if api_key in PRIORITY_API_KEYS:
+        return api_key
+    return env.get("REMOTE_ADDR") or "unknown"
+
+
+def metrics_wsgi_app_for(collect):
+    """Point d'entrée HTTP GET /metrics (JSON) ; ``collect`` retourne le dict de métriques."""
+    def metrics_wsgi_app(environ, start_response):
+        start_response("200 OK", [("Content-Type", "application/json")])
+        return [json.dumps(collect()).encode("utf-8")]
+    return metrics_wsgi_app
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Archives compressées des requêtes terminées:
+- Segments append-only partitionnés par date : archive/YYYY-MM-DD.ndjson.gz
+  (chaque compaction ajoute un membre gzip ; un lecteur gzip les enchaîne)
+- Petit index des segments (archive/segments.json) : date -> fichier, nombre d'enregistrements
+- Recherche d'un request_id : la date est lue dans l'identifiant (REQ_YYYYMMDD...),
+  un seul segment est décompressé
+
+La compaction elle-même (sortie du magasin chaud) est dans utils.compact_db :
+    python composite_service/archive.py --max-age-days 30
+"""
+
+import gzip
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), "archive")
+SEGMENT_INDEX_PATH = os.path.join(ARCHIVE_DIR, "segments.json")
+
+_lock = threading.Lock()
+
+
+def partition_of(request_id: str, rec: Dict[str, Any]) -> str:
+    """Date de partition (YYYY-MM-DD) : celle de l'identifiant, sinon celle du timestamp."""
+    parts = request_id.split("_")
+    if len(parts) >= 2 and len(parts[1]) >= 8 and parts[1][:8].isdigit():
+        d = parts[1]
+        return f"{d[0:4]}-{d[4:6]}-{d[6:8]}"
+    return (rec.get("timestamp") or datetime.utcnow().isoformat())[:10]
+
+
+def read_segment_index() -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(SEGMENT_INDEX_PATH):
+        return {}
+    with open(SEGMENT_INDEX_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_segment_index(index: Dict[str, Dict[str, Any]]):
+    tmp = SEGMENT_INDEX_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, SEGMENT_INDEX_PATH)
+
+
+def append_records(records: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+    """Ajoute des (request_id, enregistrement) aux segments de leur date. Retourne le nombre écrit."""
+    by_partition: Dict[str, list] = {}
+    for request_id, rec in records:
+        by_partition.setdefault(partition_of(request_id, rec), []).append((request_id, rec))
+    if not by_partition:
+        return 0
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    written = 0
+    with _lock:
+        index = read_segment_index()
+        for day, items in sorted(by_partition.items()):
+            filename = f"{day}.ndjson.gz"
+            with open(os.path.join(ARCHIVE_DIR, filename), "ab") as raw:
+                # Un nouveau membre gzip par compaction : les membres précédents ne sont jamais réécrits
+                with gzip.GzipFile(fileobj=raw, mode="ab") as gz:
+                    for request_id, rec in items:
+                        line = json.dumps({"request_id": request_id, **rec}, ensure_ascii=False)
+                        gz.write(line.encode("utf-8") + b"\n")
+                raw.flush()
+                os.fsync(raw.fileno())
+            entry = index.setdefault(day, {"file": filename, "count": 0})
+            entry["count"] += len(items)
+            written += len(items)
+        _write_segment_index(index)
+    return written
+
+
+def iter_segment(day: str) -> Iterator[Dict[str, Any]]:
+    """Itère paresseusement les enregistrements d'un segment."""
+    entry = read_segment_index().get(day)
+    if not entry:
+        return
+    with gzip.open(os.path.join(ARCHIVE_DIR, entry["file"]), "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_archived(date_from: str = None, date_to: str = None) -> Iterator[Dict[str, Any]]:
+    """Itère les enregistrements archivés, segment par segment, dans l'ordre des dates."""
+    for day in sorted(read_segment_index()):
+        if date_from and day < date_from[:10]:
+            continue
+        if date_to and day > date_to[:10]:
+            continue
+        yield from iter_segment(day)
+
+
+def find_archived(request_id: str) -> Optional[Dict[str, Any]]:
+    """Cherche un enregistrement archivé : seul le segment de sa date est décompressé."""
+    for rec in iter_segment(partition_of(request_id, {})):
+        if rec.get("request_id") == request_id:
+            rec.pop("request_id")
+            return rec
+    return None
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    try:
+        from composite_service.utils import compact_db, RETENTION_DAYS
+    except ModuleNotFoundError:
+        sys.path.append(os.path.dirname(__file__))
+        from utils import compact_db, RETENTION_DAYS
+
+    parser = argparse.ArgumentParser(description="Compaction du magasin de requêtes vers les archives")
+    parser.add_argument("--max-age-days", type=float, default=RETENTION_DAYS,
+                        help="âge minimal (depuis la dernière mise à jour) des requêtes terminées à archiver")
+    args = parser.parse_args()
+    moved = compact_db(args.max_age_days)
+    print(f"✅ {moved} requête(s) archivée(s) dans {ARCHIVE_DIR}")
@@ -0,0 +1,382 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Entrées/sorties non bloquantes de l'orchestrateur asynchrone du composite (réacteur Twisted):
+- AsyncChannel : appels IE/CC/PE/DS par twisted.web.client.Agent sur un pool de
+  connexions persistantes ; l'enveloppe SOAP (ou le document JSON) est construite
+  directement, sans client suds ni thread bloqué pendant l'attente de l'enfant
+- Attentes d'admission, de créneau DOWNSTREAM et de soumission identique en cours
+  exposées comme Deferred (mêmes files et compteurs que le chemin à threads)
+- SoapResource : point d'entrée SOAP servi dans le thread du réacteur, où une
+  méthode Spyne peut retourner un Deferred (spyne.server.twisted n'est pas
+  importable avec la version de Twisted du projet) ; le WSDL reste servi par
+  WsgiApplication dans le pool de threads
+- run_reactor : comme spyne.util.wsgi_wrapper.run_twisted, mais accepte aussi des Resource
+
+Les réponses des enfants sont demandées en gzip (ContentDecoderAgent) ; celles
+de SoapResource sont compressées si le client l'accepte (voir common/wire.py).
+
+Une demande en vol ne coûte qu'un générateur inlineCallbacks et quelques
+Deferred : des milliers de demandes peuvent attendre les enfants sans thread.
+Seules les opérations à paramètres chaînes (Unicode) sont prises en charge ;
+les opérations typées restent sur suds (SoapChannel), dans le pool de threads.
+"""
+
+import io
+import json
+import logging
+import os
+import sys
+from collections import Counter
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+from xml.sax.saxutils import escape
+
+from lxml import etree
+from spyne.auxproc import process_contexts
+from spyne.const.http import HTTP_200
+from spyne.error import Fault, InternalError
+from spyne.server.wsgi import WsgiApplication, WsgiMethodContext
+from twisted.internet import defer, reactor
+from twisted.web.client import (
+    Agent, ContentDecoderAgent, FileBodyProducer, GzipDecoder, HTTPConnectionPool, readBody
+)
+from twisted.web.http_headers import Headers
+from twisted.web.resource import IResource, Resource
+from twisted.web.server import NOT_DONE_YET, Site
+from twisted.web.wsgi import WSGIResource
+
+try:
+    from common.bindings import JSON_PATH_SUFFIX
+    from common.deadline import budget_headers, call_context_xml
+    from common.wire import DETAIL_HTTP_HEADER, compress, gzip_wsgi_app, should_compress
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.bindings import JSON_PATH_SUFFIX
+    from common.deadline import budget_headers, call_context_xml
+    from common.wire import DETAIL_HTTP_HEADER, compress, gzip_wsgi_app, should_compress
+
+try:
+    from composite_service.admission import Rejected
+    from composite_service.clients import INTERNAL_PROTOCOL, INTERNAL_RESPONSE_DETAIL, NAMESPACES, SERVICES
+    from composite_service.transport import (
+        HTTP_CONNECT_TIMEOUT, HTTP_POOL_IDLE_SECONDS, HTTP_POOL_SIZE, HTTP_READ_TIMEOUT
+    )
+except ModuleNotFoundError:
+    from admission import Rejected
+    from clients import INTERNAL_PROTOCOL, INTERNAL_RESPONSE_DETAIL, NAMESPACES, SERVICES
+    from transport import HTTP_CONNECT_TIMEOUT, HTTP_POOL_IDLE_SECONDS, HTTP_POOL_SIZE, HTTP_READ_TIMEOUT
+
+logger = logging.getLogger("composite")
+
+SOAP_ENV_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+
+
+# --- Client HTTP non bloquant --- #
+_agent: Optional[ContentDecoderAgent] = None
+_stats = Counter()
+
+
+def _get_agent() -> ContentDecoderAgent:
+    """
+    Agent partagé (thread du réacteur uniquement) : connexions persistantes réutilisées
+    par hôte, réponses demandées en gzip et décompressées à la lecture.
+    """
+    global _agent
+    if _agent is None:
+        pool = HTTPConnectionPool(reactor, persistent=True)
+        pool.maxPersistentPerHost = HTTP_POOL_SIZE
+        pool.cachedConnectionTimeout = HTTP_POOL_IDLE_SECONDS
+        _agent = ContentDecoderAgent(Agent(reactor, connectTimeout=HTTP_CONNECT_TIMEOUT, pool=pool),
+                                     [(b"gzip", GzipDecoder)])
+    return _agent
+
+
+def soap_envelope(tns: str, operation: str, params: Dict[str, str], header_xml: str = "") -> bytes:
+    """Enveloppe SOAP 1.1 d'un appel à paramètres chaînes (même forme que celle envoyée par suds)."""
+    args = "".join(f"<tns:{name}>{escape(value)}</tns:{name}>" for name, value in params.items() if value is not None)
+    return (f'<?xml version="1.0" encoding="UTF-8"?>'
+            f'<soap:Envelope xmlns:soap="{SOAP_ENV_NS}" xmlns:tns="{tns}">'
+            f'<soap:Header>{header_xml}</soap:Header>'
+            f'<soap:Body><tns:{operation}>{args}</tns:{operation}></soap:Body>'
+            f'</soap:Envelope>').encode("utf-8")
+
+
+def soap_result(payload: bytes, tns: str, operation: str) -> Optional[str]:
+    """Valeur ``<operation>Result`` de la réponse ; un fault SOAP lève RuntimeError (même message que suds)."""
+    body = etree.fromstring(payload).find(f"{{{SOAP_ENV_NS}}}Body")
+    if body is None:
+        raise RuntimeError(f"Invalid SOAP response for {operation}")
+    fault = body.find(f"{{{SOAP_ENV_NS}}}Fault")
+    if fault is not None:
+        raise RuntimeError(f"Server raised fault: '{fault.findtext('faultstring')}'")
+    result = body.find(f"{{{tns}}}{operation}Response/{{{tns}}}{operation}Result")
+    return result.text if result is not None else None
+
+
+class AsyncChannel:
+    """Appel d'un enfant sans bloquer de thread ; ``call`` retourne un Deferred du résultat."""
+
+    def __init__(self, name: str, protocol: str = None):
+        self.name = name
+        self.protocol = protocol or INTERNAL_PROTOCOL
+        base, path = SERVICES[name]
+        suffix = JSON_PATH_SUFFIX if self.protocol == "json" else ""
+        self.url = f"{base}/{path}{suffix}".encode("ascii")
+        self.tns = NAMESPACES[name]
+
+    def _request(self, operation: str, deadline, request_id: str, profile_token: str, params: Dict[str, str]):
+        if self.protocol == "json":
+            headers = {"Content-Type": "application/json; charset=utf-8", DETAIL_HTTP_HEADER: INTERNAL_RESPONSE_DETAIL}
+            if deadline is not None:
+                headers.update(budget_headers(deadline, request_id, profile_token))
+            return headers, json.dumps({operation: params}, ensure_ascii=False).encode("utf-8")
+        header_xml = call_context_xml(deadline, request_id, profile_token) if deadline is not None else ""
+        headers = {"Content-Type": "text/xml; charset=utf-8", "SOAPAction": f'"{operation}"',
+                   DETAIL_HTTP_HEADER: INTERNAL_RESPONSE_DETAIL}
+        return headers, soap_envelope(self.tns, operation, params, header_xml)
+
+    @defer.inlineCallbacks
+    def call(self, operation: str, deadline=None, request_id: str = None, profile_token: str = None, **params):
+        if deadline is not None:
+            deadline.check(self.name)
+        headers, body = self._request(operation, deadline, request_id, profile_token, params)
+        timeout = deadline.remaining() if deadline is not None else HTTP_READ_TIMEOUT
+
+        d = _get_agent().request(b"POST", self.url, Headers({k: [v] for k, v in headers.items()}),
+                                 FileBodyProducer(io.BytesIO(body)))
+        d.addCallback(lambda response: readBody(response).addCallback(lambda payload: (response.code, payload)))
+        # Le délai annule la requête en cours : la connexion est fermée, pas remise au pool
+        d.addTimeout(max(timeout, 0.001), reactor)
+        _stats["requests"] += 1
+        _stats["in_flight"] += 1
+        try:
+            status, payload = yield d
+        finally:
+            _stats["in_flight"] -= 1
+
+        if self.protocol == "json":
+            if status != 200:
+                raise RuntimeError(f"{self.name}.{operation} failed: HTTP {status} {payload[:200]!r}")
+            return json.loads(payload)
+        if status not in (200, 500):  # 500 : fault SOAP, lu dans le corps
+            raise RuntimeError(f"{self.name}.{operation} failed: HTTP {status} {payload[:200]!r}")
+        return soap_result(payload, self.tns, operation)
+
+
+_channels: Dict[tuple, AsyncChannel] = {}
+
+
+def get_async_channel(name: str, protocol: str = None) -> AsyncChannel:
+    """Canal asynchrone vers ``name`` (sans état par appel : partagé par toutes les requêtes)."""
+    key = (name, protocol or INTERNAL_PROTOCOL)
+    if key not in _channels:
+        _channels[key] = AsyncChannel(*key)
+    return _channels[key]
+
+
+def channel_stats() -> Dict[str, int]:
+    return {"requests": _stats["requests"], "in_flight": _stats["in_flight"]}
+
+
+# --- Attentes sans thread --- #
+class _Grant:
+    """Place demandée à une file d'attente (admission ou DOWNSTREAM), attendue par un Deferred."""
+
+    def __init__(self):
+        self.deferred = defer.Deferred()
+        self.timer = None
+
+    def on_grant(self):
+        # Peut être appelé depuis un thread du pool (libération par le chemin typé)
+        reactor.callFromThread(self._fire)
+
+    def _fire(self):
+        if self.timer is not None and self.timer.active():
+            self.timer.cancel()
+        self.deferred.callback(None)
+
+
+def _wait_grant(enqueue: Callable, abandon: Callable, timeout: float, timeout_error: Callable[[], Exception]):
+    """
+    Deferred qui se déclenche quand la place est attribuée, ou échoue avec
+    ``timeout_error()`` après ``timeout`` secondes. Les refus immédiats
+    (file pleine, débit) sont levés directement par ``enqueue``.
+    """
+    grant = _Grant()
+    waiter = enqueue(grant.on_grant)
+    if waiter is None:
+        return defer.succeed(None)
+
+    def expire():
+        if abandon(waiter):
+            grant.deferred.errback(timeout_error())
+
+    grant.timer = reactor.callLater(timeout, expire)
+    return grant.deferred
+
+
+def admit(controller, client_id: str, klass: str, timeout: float = None):
+    """Équivalent asynchrone de ``AdmissionController.acquire``."""
+    return _wait_grant(lambda on_grant: controller.enqueue(client_id, klass, on_grant),
+                       lambda waiter: controller.abandon(waiter, klass),
+                       controller.wait_limit(timeout),
+                       lambda: Rejected("queue_timeout", controller.queue_timeout))
+
+
+def downstream_slot(budgets, service: str, klass: str, timeout: float):
+    """Équivalent asynchrone de ``DownstreamBudgets.slot`` ; l'appelant libère par ``budgets.release``."""
+    return _wait_grant(lambda on_grant: budgets.enqueue(service, klass, on_grant),
+                       lambda waiter: budgets.abandon(waiter, service, klass),
+                       timeout,
+                       lambda: TimeoutError(f"No {klass} budget left for {service}"))
+
+
+def follow(future: Future):
+    """Deferred du résultat d'un Future (soumission identique déjà en cours, voir InFlight.join)."""
+    d = defer.Deferred()
+
+    def done(f: Future):
+        error = f.exception()
+        if error is not None:
+            reactor.callFromThread(d.errback, error)
+        else:
+            reactor.callFromThread(d.callback, f.result())
+
+    future.add_done_callback(done)
+    return d
+
+
+# --- Côté serveur --- #
+def _environ(request) -> Dict[str, str]:
+    """Environnement de type WSGI de la requête Twisted (lu par client_id_of, http_header, ...)."""
+    host = request.getHost()
+    env = {
+        "REQUEST_METHOD": request.method.decode("ascii"),
+        "PATH_INFO": request.path.decode("utf-8", "replace"),
+        "QUERY_STRING": request.uri.partition(b"?")[2].decode("latin-1"),
+        "REMOTE_ADDR": getattr(request.getClientAddress(), "host", ""),
+        "SERVER_NAME": getattr(host, "host", ""),
+        "SERVER_PORT": str(getattr(host, "port", "")),
+        "wsgi.url_scheme": "https" if request.isSecure() else "http",
+    }
+    for name, values in request.requestHeaders.getAllRawHeaders():
+        key = name.decode("latin-1").upper().replace("-", "_")
+        value = ",".join(v.decode("latin-1") for v in values)
+        env[key if key in ("CONTENT_TYPE", "CONTENT_LENGTH") else "HTTP_" + key] = value
+    return env
+
+
+def _charset(request) -> Optional[str]:
+    content_type = (request.getHeader(b"content-type") or b"").decode("latin-1")
+    for part in content_type.split(";")[1:]:
+        name, _, value = part.strip().partition("=")
+        if name.lower() == "charset":
+            return value.strip('"') or None
+    return None
+
+
+class SoapResource(Resource):
+    """
+    Application Spyne servie dans le thread du réacteur : une méthode peut
+    retourner un Deferred, la réponse est alors sérialisée à sa résolution.
+    Les méthodes bloquantes doivent se déporter elles-mêmes (deferToThread).
+    """
+    isLeaf = True
+
+    def __init__(self, app):
+        super().__init__()
+        self.spyne = WsgiApplication(app)
+        self._wsdl = WSGIResource(reactor, reactor.getThreadPool(), gzip_wsgi_app(self.spyne))
+
+    def render_GET(self, request):
+        return self._wsdl.render(request)
+
+    def render_POST(self, request):
+        initial_ctx = WsgiMethodContext(self.spyne, _environ(request), self.spyne.app.out_protocol.mime_type)
+        initial_ctx.in_string = [request.content.read()]
+        contexts = self.spyne.generate_contexts(initial_ctx, _charset(request))
+        p_ctx, others = contexts[0], contexts[1:]
+        p_ctx.active = True
+
+        if p_ctx.in_error:
+            return self._respond(request, p_ctx, others, p_ctx.in_error)
+        self.spyne.get_in_object(p_ctx)
+        if p_ctx.in_error:
+            return self._respond(request, p_ctx, others, p_ctx.in_error)
+        self.spyne.get_out_object(p_ctx)
+        if p_ctx.out_error:
+            return self._respond(request, p_ctx, others, p_ctx.out_error)
+
+        result = p_ctx.out_object[0] if p_ctx.out_object else None
+        if not isinstance(result, defer.Deferred):
+            return self._respond(request, p_ctx, others)
+
+        lost = []
+        request.notifyFinish().addErrback(lambda _: lost.append(True))
+
+        def done(value):
+            p_ctx.out_object = [value]
+            return self._respond(request, p_ctx, others)
+
+        def failed(failure):
+            if isinstance(failure.value, Fault):
+                return self._respond(request, p_ctx, others, failure.value)
+            logger.error("[Composite] Deferred method failed: %s", failure.getTraceback())
+            return self._respond(request, p_ctx, others, InternalError(failure.value))
+
+        def write(body):
+            if not lost:  # le client a pu se déconnecter pendant le traitement
+                request.write(body)
+                request.finish()
+
+        result.addCallbacks(done, failed).addCallback(write).addErrback(
+            lambda f: logger.error("[Composite] Response write failed: %s", f.getTraceback()))
+        return NOT_DONE_YET
+
+    def _respond(self, request, p_ctx, others, error=None) -> bytes:
+        """Sérialise le résultat (ou ``error``), pose code et en-têtes HTTP et retourne le corps."""
+        transport = p_ctx.transport
+        if error is not None:
+            p_ctx.out_error = error
+            if transport.resp_code is None:
+                transport.resp_code = p_ctx.out_protocol.fault_to_http_response_code(error)
+        elif transport.resp_code is None:
+            transport.resp_code = HTTP_200
+        try:
+            self.spyne.get_out_string(p_ctx)
+        except Exception as e:
+            if error is not None:
+                raise
+            logger.exception(e)
+            p_ctx.out_string = None
+            return self._respond(request, p_ctx, others, Fault("Server", str(e)))
+
+        body = b"".join(s if isinstance(s, bytes) else s.encode("utf-8") for s in p_ctx.out_string)
+        request.setResponseCode(int(transport.resp_code[:3]))
+        for name, value in transport.resp_headers.items():
+            request.setHeader(name, value)
+        if should_compress((request.getHeader(b"accept-encoding") or b"").decode("latin-1"), len(body)):
+            body = compress(body)
+            request.setHeader("Content-Encoding", "gzip")
+            request.setHeader("Vary", "Accept-Encoding")
+        request.setHeader("Content-Length", str(len(body)))
+        try:
+            process_contexts(self.spyne, others, p_ctx, error=error)
+        except Exception as e:
+            logger.exception(e)
+        p_ctx.close()
+        return body
+
+
+def run_reactor(endpoints, port: int, interface: str = "0.0.0.0"):
+    """
+    Sert les couples (application, url) comme ``run_twisted`` : les Resource
+    (SoapResource) sont montées telles quelles, les applications WSGI dans le pool de threads.
+    """
+    root = Resource()
+    for app, url in endpoints:
+        root.putChild(url, app if IResource.providedBy(app) else WSGIResource(reactor, reactor.getThreadPool(), app))
+    reactor.listenTCP(port, Site(root), interface=interface)
+    return reactor.run()
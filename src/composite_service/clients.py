@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Canaux d'appel du composite vers les services enfants:
+- "soap" : client suds sur le point d'entrée SOAP validé (comportement historique)
+- "json" : POST d'un document JSON sur le point d'entrée <Nom>Json, sans
+           enveloppe XML ni validation de schéma
+
+Le protocole interne se choisit avec LOAN_INTERNAL_PROTOCOL ; les clients
+externes continuent d'utiliser le point d'entrée SOAP du composite.
+Les deux canaux passent par les pools keep-alive de transport.py.
+
+``call(..., deadline=, request_id=)`` transmet le budget restant à l'enfant
+(en-tête SOAP CallContext ou en-têtes HTTP) et l'utilise comme délai de lecture ;
+pendant un appel profilé, le jeton de profilage suit le même chemin.
+Chaque appel demande le niveau de détail INTERNAL_RESPONSE_DETAIL (en-tête
+X-Response-Detail) : le composite n'utilise pas les sous-objets d'audit des enfants.
+"""
+
+import json
+import os
+import sys
+import threading
+from urllib.parse import urlsplit
+
+from suds.client import Client
+from suds.sax.parser import Parser
+
+try:
+    from common.bindings import JSON_PATH_SUFFIX
+    from common.deadline import budget_headers, call_context_xml
+    from common.profiling import profile_token
+    from common.wire import DETAIL_HTTP_HEADER
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.bindings import JSON_PATH_SUFFIX
+    from common.deadline import budget_headers, call_context_xml
+    from common.profiling import profile_token
+    from common.wire import DETAIL_HTTP_HEADER
+
+try:
+    from composite_service.transport import KeepAliveTransport, get_pool
+except ModuleNotFoundError:
+    from transport import KeepAliveTransport, get_pool
+
+# --- Configuration --- #
+INTERNAL_PROTOCOL = os.getenv("LOAN_INTERNAL_PROTOCOL", "soap").lower()
+INTERNAL_RESPONSE_DETAIL = os.getenv("INTERNAL_RESPONSE_DETAIL", "summary").lower()
+
+# Services enfants (attendus en local) : nom court -> (url de base, chemin)
+SERVICES = {
+    "ie": ("http://127.0.0.1:8001", "InformationExtractionService"),
+    "cc": ("http://127.0.0.1:8002", "CreditCheckService"),
+    "pe": ("http://127.0.0.1:8003", "PropertyEvaluationService"),
+    "ds": ("http://127.0.0.1:8004", "DecisionService"),
+}
+# Namespace (tns) des applications Spyne enfants
+NAMESPACES = {
+    "ie": "loan.services.information",
+    "cc": "loan.services.credit",
+    "pe": "loan.services.property",
+    "ds": "loan.services.decision",
+}
+
+
+def wsdl_url(name: str) -> str:
+    base, path = SERVICES[name]
+    return f"{base}/{path}?wsdl"
+
+
+class SoapChannel:
+    """Appel via suds (enveloppe SOAP, validation lxml côté service)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.transport = KeepAliveTransport()
+        self.client = Client(wsdl_url(name), transport=self.transport,
+                             headers={DETAIL_HTTP_HEADER: INTERNAL_RESPONSE_DETAIL})
+
+    def call(self, operation: str, deadline=None, request_id: str = None, **params):
+        if deadline is None:
+            self.client.set_options(soapheaders=())
+            self.transport.timeout = None
+        else:
+            deadline.check(self.name)
+            header = Parser().parse(string=call_context_xml(deadline, request_id, profile_token()).encode("utf-8")).root()
+            self.client.set_options(soapheaders=header)
+            self.transport.timeout = deadline.remaining()
+        return getattr(self.client.service, operation)(**params)
+
+
+class JsonChannel:
+    """Appel via le document JSON de Spyne sur HTTP POST."""
+
+    def __init__(self, name: str):
+        self.name = name
+        base, path = SERVICES[name]
+        parts = urlsplit(base)
+        self.pool = get_pool(parts.hostname, parts.port)
+        self.path = f"/{path}{JSON_PATH_SUFFIX}"
+
+    def call(self, operation: str, deadline=None, request_id: str = None, **params):
+        body = json.dumps({operation: params}, ensure_ascii=False).encode("utf-8")
+        headers = {"Content-Type": "application/json; charset=utf-8", DETAIL_HTTP_HEADER: INTERNAL_RESPONSE_DETAIL}
+        timeout = None
+        if deadline is not None:
+            deadline.check(self.name)
+            headers.update(budget_headers(deadline, request_id, profile_token()))
+            timeout = deadline.remaining()
+        status, _headers, payload = self.pool.request("POST", self.path, body, headers, timeout=timeout)
+        if status != 200:
+            raise RuntimeError(f"{self.name}.{operation} failed: HTTP {status} {payload[:200]!r}")
+        return json.loads(payload)
+
+
+_CHANNEL_TYPES = {"soap": SoapChannel, "json": JsonChannel}
+_local = threading.local()
+
+
+def get_channel(name: str, protocol: str = None):
+    """Retourne le canal vers ``name``, mis en cache par thread (les clients suds ne sont pas thread-safe)."""
+    protocol = protocol or INTERNAL_PROTOCOL
+    channels = getattr(_local, "channels", None)
+    if channels is None:
+        channels = _local.channels = {}
+    key = (name, protocol)
+    if key not in channels:
+        channels[key] = _CHANNEL_TYPES[protocol](name)
+    return channels[key]
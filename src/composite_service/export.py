@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Export en flux des décisions pour l'analyse (NDJSON ou CSV):
+- Itération paresseuse : segments d'archive un par un, puis requêtes non archivées
+  lues par pages de l'index SQLite (statut, dates, email et décision y sont : toutes
+  les répliques, sans charger database.json ni le journal)
+- Filtres par date (from/to) et statut (processing, done, approved, rejected, error)
+- risk_details aplati en colonnes risk_*
+
+CLI :
+    python composite_service/export.py --format csv --from 2025-11-01 --status rejected -o rejets.csv
+HTTP (service composite) :
+    GET /export?format=ndjson&from=2025-11-01&to=2025-11-30&status=approved
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+from typing import Any, Dict, Iterator, Tuple
+from urllib.parse import parse_qs
+
+try:
+    from composite_service.archive import iter_archived
+    from composite_service.index import iter_indexed, outcome_of, STATUSES, OUTCOMES
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(__file__))
+    from archive import iter_archived
+    from index import iter_indexed, outcome_of, STATUSES, OUTCOMES
+
+RISK_FIELDS = (
+    "credit_score", "property_value", "loan_to_value", "debt_to_income",
+    "monthly_savings", "employment_stable", "risk_score", "default_probability",
+    "monthly_payment", "loan_term_months",
+)
+COLUMNS = (
+    "request_id", "status", "outcome", "timestamp", "last_update", "email",
+    "approved", "interest_rate", "loan_amount", "message", "reasons", "degraded",
+) + tuple(f"risk_{k}" for k in RISK_FIELDS)
+
+FORMATS = ("ndjson", "csv")
+
+
+def _matches(rec: Dict[str, Any], date_from: str, date_to: str, status: str) -> bool:
+    ts = rec.get("timestamp", "")
+    if date_from and ts < date_from:
+        return False
+    if date_to and ts[:len(date_to)] > date_to:
+        return False
+    if status:
+        if status in OUTCOMES:
+            return outcome_of(rec.get("result")) == status
+        return rec.get("status") == status
+    return True
+
+
+def iter_records(date_from: str = None, date_to: str = None, status: str = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Itère (request_id, enregistrement) : archives d'abord (plus anciennes), puis index."""
+    if status and status not in STATUSES + OUTCOMES:
+        raise ValueError(f"Unknown status '{status}' (expected one of {STATUSES + OUTCOMES})")
+    for rec in iter_archived(date_from, date_to):
+        if _matches(rec, date_from, date_to, status):
+            yield rec.pop("request_id"), rec
+    # Requêtes non archivées de toutes les répliques, filtrées par l'index lui-même
+    yield from iter_indexed(status, date_from, date_to)
+
+
+def flatten(request_id: str, rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Une ligne plate par décision (le texte original n'est pas exporté)."""
+    decision = rec.get("result") or {}
+    risk = decision.get("risk_details") or {}
+    row = {
+        "request_id": request_id,
+        "status": rec.get("status"),
+        "outcome": outcome_of(decision),
+        "timestamp": rec.get("timestamp"),
+        "last_update": rec.get("last_update"),
+        "email": rec.get("email"),
+        "approved": decision.get("approved"),
+        "interest_rate": decision.get("interest_rate"),
+        "loan_amount": decision.get("loan_amount"),
+        "message": decision.get("message"),
+        "reasons": " | ".join(decision.get("reasons") or []),
+        "degraded": bool(decision.get("degraded")),
+    }
+    for k in RISK_FIELDS:
+        row[f"risk_{k}"] = risk.get(k)
+    return row
+
+
+def iter_export(fmt: str = "ndjson", **filters) -> Iterator[str]:
+    """Produit l'export morceau par morceau (une ligne à la fois, mémoire constante)."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}' (expected one of {FORMATS})")
+    rows = (flatten(request_id, rec) for request_id, rec in iter_records(**filters))
+
+    if fmt == "ndjson":
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False) + "\n"
+        return
+
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def export_wsgi_app(environ, start_response):
+    """Point d'entrée HTTP GET /export, réponse transmise en flux (chunked)."""
+    query = {k: v[0] for k, v in parse_qs(environ.get("QUERY_STRING", "")).items()}
+    fmt = query.get("format", "ndjson")
+    filters = {"date_from": query.get("from"), "date_to": query.get("to"), "status": query.get("status")}
+    try:
+        chunks = iter_export(fmt, **filters)
+        first = next(chunks, "")
+    except ValueError as e:
+        start_response("400 Bad Request", [("Content-Type", "application/json")])
+        return [json.dumps({"status": "error", "message": str(e)}).encode("utf-8")]
+
+    content_type = "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+    start_response("200 OK", [("Content-Type", f"{content_type}; charset=utf-8")])
+
+    def body():
+        yield first.encode("utf-8")
+        for chunk in chunks:
+            yield chunk.encode("utf-8")
+    return body()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export en flux des décisions (NDJSON ou CSV)")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--from", dest="date_from", help="date/heure de début (YYYY-MM-DD ou ISO)")
+    parser.add_argument("--to", dest="date_to", help="date/heure de fin, incluse")
+    parser.add_argument("--status", choices=STATUSES + OUTCOMES)
+    parser.add_argument("-o", "--output", help="fichier de sortie (stdout par défaut)")
+    args = parser.parse_args()
+
+    out = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        for chunk in iter_export(args.format, date_from=args.date_from, date_to=args.date_to, status=args.status):
+            out.write(chunk)
+    finally:
+        if out is not sys.stdout:
+            out.close()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cache de repli (stale-while-revalidate) pour Credit Check et Property Evaluation:
+- Chaque réponse réussie de CC (clé : identité du demandeur) et de PE (clé :
+  adresse + description normalisées) est conservée, avec l'entrée qui l'a produite
+- Si l'appel échoue ou dépasse son budget, la dernière réponse connue est servie
+  tant qu'elle a moins de FALLBACK_MAX_AGE_SECONDS ; la décision est alors marquée dégradée
+- Un thread rafraîchit en arrière-plan les entrées proches de l'expiration
+  (moins de FALLBACK_REFRESH_MARGIN_SECONDS restantes) en rappelant le service,
+  seulement si elles ont été servies depuis leur dernier rafraîchissement :
+  une entrée que personne ne lit expire, sans charge de fond sur les enfants
+- Taille bornée (FALLBACK_CACHE_SIZE par service), éviction LRU
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from composite_service.idempotency import normalize_text
+except ModuleNotFoundError:
+    from idempotency import normalize_text
+
+# --- Configuration --- #
+FALLBACK_CACHE_SIZE = int(os.getenv("FALLBACK_CACHE_SIZE", "1000"))
+FALLBACK_MAX_AGE_SECONDS = float(os.getenv("FALLBACK_MAX_AGE_SECONDS", "3600"))
+FALLBACK_REFRESH_MARGIN_SECONDS = float(os.getenv("FALLBACK_REFRESH_MARGIN_SECONDS", "600"))
+FALLBACK_REFRESH_INTERVAL_SECONDS = float(os.getenv("FALLBACK_REFRESH_INTERVAL_SECONDS", "60"))
+FALLBACK_REFRESH_BATCH = int(os.getenv("FALLBACK_REFRESH_BATCH", "50"))
+
+logger = logging.getLogger("composite")
+
+
+def digest(*parts) -> str:
+    text = "\x1f".join(normalize_text(str(p or "")).casefold() for p in parts)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def applicant_key(application: Dict[str, Any]) -> str:
+    """Identité du demandeur pour CC : nom, prénom, email, téléphone."""
+    return digest(application.get("nom"), application.get("prenom"),
+                   application.get("email"), application.get("telephone"))
+
+
+def property_key(application: Dict[str, Any]) -> str:
+    """Bien évalué par PE : adresse et description normalisées."""
+    return digest(application.get("adresse"), application.get("description"))
+
+
+class _Entry:
+    __slots__ = ("value", "payload", "stored_at", "refreshing", "read")
+
+    def __init__(self, value: Dict[str, Any], payload: str, stored_at: float):
+        self.value = value
+        self.payload = payload
+        self.stored_at = stored_at
+        self.refreshing = False
+        self.read = False  # servie depuis sa mise en cache
+
+
+class FallbackCache:
+    """
+    Dernières réponses réussies d'un service enfant.
+    ``loader(payload)`` rappelle le service pour rafraîchir une entrée (retourne le dict résultat).
+    """
+
+    def __init__(self, name: str, loader: Callable[[str], Dict[str, Any]], size: int = FALLBACK_CACHE_SIZE,
+                 max_age: float = FALLBACK_MAX_AGE_SECONDS, refresh_margin: float = FALLBACK_REFRESH_MARGIN_SECONDS):
+        self.name = name
+        self.loader = loader
+        self.size = size
+        self.max_age = max_age
+        self.refresh_margin = refresh_margin
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshed = 0
+
+    def put(self, key: str, value: Dict[str, Any], payload: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = _Entry(value, payload, time.monotonic())
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def get_stale(self, key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Dernière valeur connue et son âge (secondes), si elle n'a pas expiré."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry.stored_at
+                if age <= self.max_age:
+                    self._entries.move_to_end(key)
+                    entry.read = True
+                    self.hits += 1
+                    return entry.value, age
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def _due_for_refresh(self, limit: int) -> List[Tuple[str, _Entry]]:
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                age = now - entry.stored_at
+                if age > self.max_age:
+                    del self._entries[key]
+                elif entry.read and age >= self.max_age - self.refresh_margin and not entry.refreshing:
+                    entry.refreshing = True
+                    due.append((key, entry))
+                    if len(due) >= limit:
+                        break
+        return due
+
+    def refresh_due(self, limit: int = FALLBACK_REFRESH_BATCH) -> int:
+        """Rafraîchit les entrées lues proches de l'expiration ; retourne le nombre d'entrées mises à jour."""
+        done = 0
+        for key, entry in self._due_for_refresh(limit):
+            try:
+                value = self.loader(entry.payload)
+            except Exception as e:
+                logger.warning("[Fallback] %s refresh failed: %s", self.name, e)
+                entry.refreshing = False
+                continue
+            self.put(key, value, entry.payload)
+            done += 1
+        self.refreshed += done
+        return done
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "refreshed": self.refreshed}
+
+
+def start_refresh_job(caches, interval: float = FALLBACK_REFRESH_INTERVAL_SECONDS):
+    """Thread de fond qui rafraîchit périodiquement les entrées lues proches de l'expiration."""
+    if interval <= 0:
+        return None
+
+    def loop():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            for cache in caches:
+                try:
+                    cache.refresh_due()
+                except Exception as e:
+                    logger.error("[Fallback] %s refresh job error: %s", cache.name, e)
+
+    thread = threading.Thread(target=loop, name="fallback-refresh", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Verrous de fichier exclusifs entre processus, portables :
+- fcntl.flock sous Linux / macOS
+- msvcrt.locking sous Windows (verrou du premier octet)
+
+Les verrous Windows sont impératifs (les autres processus ne peuvent plus lire
+la plage verrouillée) : on verrouille toujours un fichier ``.lock`` dédié, jamais
+le fichier de données lui-même.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+_RETRY_SECONDS = 0.05
+
+
+def lock_exclusive(f, blocking: bool = True):
+    """Verrou exclusif sur le fichier ouvert ``f`` ; lève BlockingIOError s'il est déjà pris (non bloquant)."""
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        return
+    fd = f.fileno()
+    while True:
+        os.lseek(fd, 0, os.SEEK_SET)  # msvcrt verrouille à partir de la position courante
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            if not blocking:
+                raise BlockingIOError(f"{getattr(f, 'name', fd)} is locked by another process")
+            time.sleep(_RETRY_SECONDS)
+
+
+def unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        return
+    fd = f.fileno()
+    os.lseek(fd, 0, os.SEEK_SET)
+    msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def locked(path: str):
+    """Section critique entre processus, sérialisée par le fichier ``path`` (créé au besoin)."""
+    with open(path, "a") as f:
+        lock_exclusive(f)
+        try:
+            yield
+        finally:
+            unlock(f)
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cache mémoire des enregistrements récents pour getResult / get_request:
+- Alimenté en écriture directe par create_request et save_decision, et à la lecture
+- Enregistrements compacts : objet à slots, statut interné, décision gardée
+  sous forme de JSON encodé (une chaîne au lieu d'un dict imbriqué)
+- Éviction LRU au-delà de HOT_CACHE_SIZE entrées
+- Plusieurs répliques du composite partagent database.json et l'index : un
+  enregistrement "done" ne change plus et se sert directement ; un
+  enregistrement "processing" est revalidé par une lecture ponctuelle de
+  l'index (status, last_update) et rechargé s'il a changé ailleurs
+"""
+
+import json
+import os
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+HOT_CACHE_SIZE = int(os.getenv("HOT_CACHE_SIZE", "10000"))
+
+_STATUS_DONE = sys.intern("done")
+
+
+class RequestRecord:
+    __slots__ = ("text", "status", "timestamp", "last_update", "result_json", "email", "_response")
+
+    def __init__(self, rec: Dict[str, Any]):
+        self.text = rec.get("text")
+        self.status = sys.intern(rec.get("status") or "unknown")
+        self.timestamp = rec.get("timestamp")
+        self.last_update = rec.get("last_update")
+        result = rec.get("result")
+        self.result_json = None if result is None else json.dumps(result, ensure_ascii=False)
+        self.email = rec.get("email")
+        self._response = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Même forme que l'enregistrement de database.json."""
+        rec = {
+            "text": self.text,
+            "status": self.status,
+            "timestamp": self.timestamp,
+            "last_update": self.last_update,
+            "result": None if self.result_json is None else json.loads(self.result_json),
+        }
+        if self.email is not None:
+            rec["email"] = self.email
+        return rec
+
+    def response_json(self) -> str:
+        """Réponse JSON de getResult ; calculée une seule fois pour un enregistrement terminé."""
+        if self._response is not None:
+            return self._response
+        response = json.dumps(self.to_dict(), ensure_ascii=False)
+        if self.status is _STATUS_DONE:
+            self._response = response
+        return response
+
+
+class HotCache:
+    """
+    LRU des RequestRecord. ``validate(request_id)`` retourne (status, last_update)
+    depuis le magasin partagé, ou None ; il n'est appelé que pour les enregistrements non terminés.
+    """
+
+    def __init__(self, validate: Callable[[str], Optional[Tuple[str, str]]], size: int = HOT_CACHE_SIZE):
+        self.validate = validate
+        self.size = size
+        self._records: "OrderedDict[str, RequestRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def put(self, request_id: str, rec: Dict[str, Any]) -> RequestRecord:
+        record = RequestRecord(rec)
+        with self._lock:
+            self._records[request_id] = record
+            self._records.move_to_end(request_id)
+            while len(self._records) > self.size:
+                self._records.popitem(last=False)
+        return record
+
+    def get(self, request_id: str) -> Optional[RequestRecord]:
+        with self._lock:
+            record = self._records.get(request_id)
+            if record is not None:
+                self._records.move_to_end(request_id)
+        if record is None:
+            self.misses += 1
+            return None
+        if record.status is not _STATUS_DONE:
+            # Une autre réplique a pu terminer la requête : comparaison avec l'index partagé
+            current = self.validate(request_id)
+            if current is None or current[0] != record.status or current[1] != record.last_update:
+                self.stale += 1
+                self.discard(request_id)
+                return None
+        self.hits += 1
+        return record
+
+    def discard(self, request_id: str):
+        with self._lock:
+            self._records.pop(request_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._records), "hits": self.hits, "misses": self.misses, "stale": self.stale}
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Idempotence des soumissions:
+- Clé fournie par le client, ou empreinte SHA-256 du texte normalisé
+- Fenêtre de déduplication (IDEMPOTENCY_WINDOW_SECONDS) partagée via l'index
+- Reprise d'une clé dont la requête est restée "processing" au-delà de
+  IDEMPOTENCY_STALE_SECONDS (composite arrêté en cours d'évaluation)
+- Regroupement des soumissions identiques concurrentes dans ce processus :
+  une seule évaluation, les autres appels attendent et reçoivent sa réponse
+  (``run`` bloque le thread ; l'orchestrateur asynchrone utilise ``join`` / ``finish``)
+"""
+
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import Callable, Tuple
+
+IDEMPOTENCY_WINDOW_SECONDS = int(os.getenv("IDEMPOTENCY_WINDOW_SECONDS", "3600"))
+# Doit dépasser l'échéance la plus longue d'une requête (REQUEST_DEADLINE_MS, deadline_ms)
+IDEMPOTENCY_STALE_SECONDS = float(os.getenv("IDEMPOTENCY_STALE_SECONDS", "60"))
+
+
+def normalize_text(text: str) -> str:
+    t = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", t).strip()
+
+
+def idempotency_key(request_text: str, client_key: str = None) -> str:
+    """Clé client si fournie, sinon empreinte stable du texte normalisé."""
+    if client_key:
+        return f"client:{client_key}"
+    return "sha256:" + hashlib.sha256(normalize_text(request_text).encode("utf-8")).hexdigest()
+
+
+def window_start(now: datetime = None) -> str:
+    now = now or datetime.utcnow()
+    return (now - timedelta(seconds=IDEMPOTENCY_WINDOW_SECONDS)).isoformat()
+
+
+def stale_start(now: datetime = None) -> str:
+    """Réservations antérieures : reprises si leur requête n'est pas terminée."""
+    now = now or datetime.utcnow()
+    return (now - timedelta(seconds=IDEMPOTENCY_STALE_SECONDS)).isoformat()
+
+
+class InFlight:
+    """Exécute ``fn`` une seule fois par clé tant qu'un appel identique est en cours."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def join(self, key: str) -> Tuple[Future, bool]:
+        """Future de l'appel en cours pour ``key`` et True si l'appelant doit l'exécuter (meneur)."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                return future, False
+            future = self._flights[key] = Future()
+            return future, True
+
+    def finish(self, key: str, future: Future, result: str = None, error: BaseException = None):
+        """Publie le résultat du meneur aux appels en attente et libère la clé."""
+        with self._lock:
+            self._flights.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def run(self, key: str, fn: Callable[[], str]) -> str:
+        future, leader = self.join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
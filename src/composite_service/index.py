@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Index secondaires des requêtes (SQLite), maintenus à chaque écriture:
+- (status, date), (outcome, date), (email, date), (date)
+- Pagination par curseur (keyset) : coût constant quelle que soit la profondeur
+- Clés d'idempotence des soumissions (fenêtre de déduplication)
+
+database.json (+ journal, voir journal.py) reste la source des enregistrements complets ; l'index
+contient les colonnes filtrables et la dernière décision (JSON), ce qui permet à
+une réplique de servir une requête modifiée par une autre avant son point de
+contrôle. Les lignes des requêtes archivées restent listées mais sont marquées
+(archived) : leur enregistrement se lit dans les archives. Il peut être reconstruit à tout moment :
+    python composite_service/index.py --rebuild
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    from composite_service.archive import iter_archived
+    from composite_service.journal import JOURNAL_PATH, load_state
+except ModuleNotFoundError:
+    from archive import iter_archived
+    from journal import JOURNAL_PATH, load_state
+
+INDEX_PATH = os.path.join(os.path.dirname(__file__), "requests_index.sqlite")
+
+# Statuts de cycle de vie et issues de décision acceptés par query_requests
+STATUSES = ("processing", "done")
+OUTCOMES = ("approved", "rejected", "error")
+
+MAX_PAGE_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS requests (
+    request_id  TEXT PRIMARY KEY,
+    status      TEXT NOT NULL,
+    outcome     TEXT,
+    email       TEXT,
+    created_at  TEXT NOT NULL,
+    last_update TEXT NOT NULL,
+    result      TEXT,
+    archived    INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_requests_created ON requests (created_at, request_id);
+CREATE INDEX IF NOT EXISTS idx_requests_status ON requests (status, created_at, request_id);
+CREATE INDEX IF NOT EXISTS idx_requests_outcome ON requests (outcome, created_at, request_id);
+CREATE INDEX IF NOT EXISTS idx_requests_email ON requests (email, created_at, request_id);
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key         TEXT PRIMARY KEY,
+    request_id  TEXT NOT NULL,
+    created_at  TEXT NOT NULL
+);
+"""
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Connexion SQLite par thread (WAL : lecteurs et écrivain ne se bloquent pas)."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        is_new = not os.path.exists(INDEX_PATH)
+        conn = sqlite3.connect(INDEX_PATH, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(requests)")}
+        if "result" not in columns:
+            # Index créé avant la colonne de décision : reconstruit pour la remplir
+            conn.execute("ALTER TABLE requests ADD COLUMN result TEXT")
+            is_new = True
+        if "archived" not in columns:
+            # Index créé avant ce marquage : les requêtes déjà archivées sont marquées
+            with conn:
+                conn.execute("ALTER TABLE requests ADD COLUMN archived INTEGER NOT NULL DEFAULT 0")
+                conn.executemany("UPDATE requests SET archived = 1 WHERE request_id = ?",
+                                 ((rec["request_id"],) for rec in iter_archived()))
+        _local.conn = conn
+        if is_new:
+            rebuild_index()
+    return conn
+
+
+def outcome_of(decision: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Déduit l'issue (approved / rejected / error) d'une décision enregistrée."""
+    if not decision:
+        return None
+    if str(decision.get("message", "")).startswith("Internal error"):
+        return "error"
+    return "approved" if decision.get("approved") else "rejected"
+
+
+_UPSERT = """
+INSERT INTO requests (request_id, status, outcome, email, created_at, last_update, result)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (request_id) DO UPDATE SET
+    status = excluded.status,
+    outcome = COALESCE(excluded.outcome, requests.outcome),
+    email = COALESCE(excluded.email, requests.email),
+    last_update = excluded.last_update,
+    result = COALESCE(excluded.result, requests.result)
+"""
+
+
+def _result_json(decision: Optional[Dict[str, Any]]) -> Optional[str]:
+    return None if decision is None else json.dumps(decision, ensure_ascii=False)
+
+
+def index_request(request_id: str, status: str, created_at: str, last_update: str,
+                  outcome: str = None, email: str = None, result: Dict[str, Any] = None):
+    """Insère ou met à jour la ligne d'index d'une requête (les champs absents sont conservés)."""
+    index_requests([(request_id, status, outcome, email, created_at, last_update, _result_json(result))])
+
+
+def index_requests(rows: List[Tuple]):
+    """
+    Comme ``index_request`` pour un lot de lignes
+    (request_id, status, outcome, email, created_at, last_update, décision JSON), en une seule transaction.
+    """
+    conn = _connect()
+    with conn:
+        conn.executemany(_UPSERT, rows)
+
+
+def request_state(request_id: str) -> Optional[Tuple[str, str]]:
+    """(status, last_update) d'une requête, lecture ponctuelle par clé primaire."""
+    row = _connect().execute(
+        "SELECT status, last_update FROM requests WHERE request_id = ?", (request_id,)
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def _indexed_record(status: str, created_at: str, last_update: str, email: str, result: str) -> Dict[str, Any]:
+    rec = {"status": status, "timestamp": created_at, "last_update": last_update,
+           "result": None if result is None else json.loads(result)}
+    if email is not None:
+        rec["email"] = email
+    return rec
+
+
+def indexed_request(request_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Champs de la requête connus de l'index (status, timestamp, last_update, email, result) ;
+    None si elle est inconnue ou archivée.
+    """
+    row = _connect().execute(
+        "SELECT status, created_at, last_update, email, result FROM requests WHERE request_id = ? AND NOT archived",
+        (request_id,),
+    ).fetchone()
+    return _indexed_record(*row) if row is not None else None
+
+
+def mark_archived(request_ids: Iterable[str]):
+    """Marque les lignes des requêtes déplacées vers les archives (toujours listées, plus exportées d'ici)."""
+    conn = _connect()
+    with conn:
+        conn.executemany("UPDATE requests SET archived = 1 WHERE request_id = ?",
+                         ((request_id,) for request_id in request_ids))
+
+
+def claim_idempotency_key(key: str, request_id: str, created_at: str, window_start: str,
+                          stale_start: str = None) -> str:
+    """
+    Associe ``key`` à ``request_id`` sauf si une association plus récente que
+    ``window_start`` existe déjà. Une association antérieure à ``stale_start``
+    dont la requête n'est pas terminée (composite arrêté en cours d'évaluation)
+    est reprise. Retourne le request_id propriétaire de la clé (celui passé en
+    argument si la réservation a réussi). Atomique entre répliques.
+    """
+    conn = _connect()
+    with conn:
+        conn.execute(
+            """
+            INSERT INTO idempotency_keys (key, request_id, created_at) VALUES (?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                request_id = excluded.request_id,
+                created_at = excluded.created_at
+            WHERE idempotency_keys.created_at < ?
+               OR (idempotency_keys.created_at < ? AND NOT EXISTS (
+                   SELECT 1 FROM requests
+                   WHERE requests.request_id = idempotency_keys.request_id AND requests.status = 'done'))
+            """,
+            (key, request_id, created_at, window_start, stale_start or ""),
+        )
+        row = conn.execute("SELECT request_id FROM idempotency_keys WHERE key = ?", (key,)).fetchone()
+    return row[0]
+
+
+def release_idempotency_key(key: str, request_id: str):
+    """Libère la clé (ex. après une erreur) pour qu'un nouvel essai relance l'évaluation."""
+    conn = _connect()
+    with conn:
+        conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND request_id = ?", (key, request_id))
+
+
+def encode_cursor(created_at: str, request_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{request_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    created_at, request_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+    return created_at, request_id
+
+
+def _filters(status: str = None, date_from: str = None, date_to: str = None,
+             email: str = None) -> Tuple[List[str], List[Any]]:
+    """Clauses WHERE (et paramètres) communes aux listes de requêtes."""
+    clauses, params = [], []
+    if status:
+        if status in OUTCOMES:
+            clauses.append("outcome = ?")
+        elif status in STATUSES:
+            clauses.append("status = ?")
+        else:
+            raise ValueError(f"Unknown status '{status}' (expected one of {STATUSES + OUTCOMES})")
+        params.append(status)
+    if email:
+        clauses.append("email = ?")
+        params.append(email)
+    if date_from:
+        clauses.append("created_at >= ?")
+        params.append(date_from)
+    if date_to:
+        clauses.append("created_at <= ?")
+        params.append(date_to)
+    return clauses, params
+
+
+def query_requests(status: str = None, date_from: str = None, date_to: str = None,
+                   email: str = None, cursor: str = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Liste les requêtes, les plus récentes d'abord.
+    ``status`` accepte un statut (processing, done) ou une issue (approved, rejected, error).
+    ``date_from`` / ``date_to`` : date (YYYY-MM-DD, bornes incluses) ou datetime ISO.
+    Retourne (lignes, curseur_suivant) ; le curseur est None sur la dernière page.
+    """
+    limit = max(1, min(int(limit or 50), MAX_PAGE_SIZE))
+    if date_to and len(date_to) == 10:
+        date_to += "T23:59:59.999999"
+    clauses, params = _filters(status, date_from, date_to, email)
+    if cursor:
+        clauses.append("(created_at, request_id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    rows = _connect().execute(
+        f"""
+        SELECT request_id, status, outcome, email, created_at, last_update
+        FROM requests {where}
+        ORDER BY created_at DESC, request_id DESC
+        LIMIT ?
+        """,
+        params + [limit + 1],
+    ).fetchall()
+
+    items = [
+        {"request_id": r[0], "status": r[1], "outcome": r[2], "email": r[3], "timestamp": r[4], "last_update": r[5]}
+        for r in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last["timestamp"], last["request_id"])
+    return items, next_cursor
+
+
+def iter_indexed(status: str = None, date_from: str = None, date_to: str = None,
+                 page_size: int = MAX_PAGE_SIZE) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    (request_id, champs de l'index) des requêtes filtrées non archivées, les plus
+    anciennes d'abord, lus page par page (keyset) : mémoire constante quelle que
+    soit la taille de l'index, et requêtes de toutes les répliques.
+    ``date_to`` est une borne incluse par préfixe (une date couvre toute la journée).
+    """
+    clauses, params = _filters(status, date_from, date_to and date_to + "\uffff")
+    clauses.append("NOT archived")
+    after = None
+    while True:
+        page_clauses, page_params = list(clauses), list(params)
+        if after is not None:
+            page_clauses.append("(created_at, request_id) > (?, ?)")
+            page_params.extend(after)
+        where = f"WHERE {' AND '.join(page_clauses)}" if page_clauses else ""
+        rows = _connect().execute(
+            f"""
+            SELECT request_id, status, created_at, last_update, email, result FROM requests {where}
+            ORDER BY created_at, request_id
+            LIMIT ?
+            """,
+            page_params + [page_size],
+        ).fetchall()
+        for row in rows:
+            yield row[0], _indexed_record(*row[1:])
+        if len(rows) < page_size:
+            return
+        after = (rows[-1][2], rows[-1][0])
+
+
+def rebuild_index(db_path: str = None, journal_path: str = None):
+    """Reconstruit l'index depuis database.json et le journal non consolidé (migration ou réparation)."""
+    db_path = db_path or os.path.join(os.path.dirname(__file__), "database.json")
+    journal_path = journal_path or JOURNAL_PATH
+    if not os.path.exists(db_path) and not os.path.exists(journal_path):
+        return
+    requests = load_state(db_path, journal_path)
+
+    conn = _connect()
+    with conn:
+        for request_id, rec in requests.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO requests (request_id, status, outcome, email, created_at, last_update, result)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    request_id,
+                    rec.get("status", "processing"),
+                    outcome_of(rec.get("result")),
+                    rec.get("email"),
+                    rec.get("timestamp", ""),
+                    rec.get("last_update", rec.get("timestamp", "")),
+                    _result_json(rec.get("result")),
+                ),
+            )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintenance de l'index des requêtes")
+    parser.add_argument("--rebuild", action="store_true", help="reconstruire l'index depuis database.json")
+    args = parser.parse_args()
+    if args.rebuild:
+        rebuild_index()
+        print(f"✅ Index reconstruit : {INDEX_PATH}")
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Magasin des requêtes avec journal en écriture différée (write-behind):
+- L'état courant vit en mémoire ; database.json n'en est que l'instantané (snapshot)
+- Chaque modification est appliquée en mémoire puis mise en file : le thread
+  appelant retourne immédiatement
+- Un thread écrivain unique ajoute les modifications au journal (une ligne JSON
+  chacune) et les valide par lot : un seul fsync par fenêtre JOURNAL_COMMIT_WINDOW_MS
+- Point de contrôle (checkpoint) : l'écrivain fusionne les enregistrements modifiés
+  dans database.json (verrou de fichier, autres répliques préservées) puis vide le journal
+- Reprise : à l'ouverture, le journal laissé par un crash est rejoué sur
+  l'instantané (opérations idempotentes, dernière ligne tronquée ignorée) puis
+  consolidé par un point de contrôle
+
+Un journal n'a qu'un propriétaire (verrou exclusif sur <journal>.lock, voir
+file_lock.py : fcntl, ou msvcrt sous Windows) : chaque réplique du
+composite a son propre JOURNAL_PATH. Les lecteurs hors processus (export)
+utilisent ``load_state``. Une modification acquittée mais pas encore validée
+(au plus une fenêtre de validation) peut être perdue en cas de crash.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+
+try:
+    from composite_service.file_lock import lock_exclusive, locked
+except ModuleNotFoundError:
+    from file_lock import lock_exclusive, locked
+
+JOURNAL_PATH = os.getenv("JOURNAL_PATH", os.path.join(os.path.dirname(__file__), "database.journal"))
+JOURNAL_COMMIT_WINDOW_MS = float(os.getenv("JOURNAL_COMMIT_WINDOW_MS", "5"))
+JOURNAL_MAX_BATCH = int(os.getenv("JOURNAL_MAX_BATCH", "512"))
+CHECKPOINT_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_INTERVAL_SECONDS", "60"))
+
+logger = logging.getLogger("composite")
+
+Entry = Dict[str, Any]
+
+
+# --- Opérations --- #
+def apply_entry(requests: Dict[str, Dict[str, Any]], entry: Entry):
+    """Applique une opération du journal (idempotente : rejouable après un point de contrôle)."""
+    op = entry["op"]
+    if op == "put":
+        requests.setdefault(entry["id"], {}).update(entry["fields"])
+    elif op == "delete":
+        for request_id in entry["ids"]:
+            requests.pop(request_id, None)
+    else:
+        raise ValueError(f"Unknown journal op '{op}'")
+
+
+def read_snapshot(snapshot_path: str) -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(snapshot_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("requests", {})
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        logger.error("[Journal] Unreadable snapshot %s: %s", snapshot_path, e)
+        return {}
+
+
+def read_journal(journal_path: str) -> Iterator[Entry]:
+    """Opérations validées du journal, dans l'ordre ; une dernière ligne incomplète est ignorée."""
+    try:
+        f = open(journal_path, "r", encoding="utf-8")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            if not line.endswith("\n"):
+                logger.warning("[Journal] Ignoring truncated last entry in %s", journal_path)
+                return
+            yield json.loads(line)
+
+
+def load_state(snapshot_path: str, journal_path: str) -> Dict[str, Dict[str, Any]]:
+    """État courant en lecture seule : instantané + journal, sans toucher aux fichiers."""
+    requests = read_snapshot(snapshot_path)
+    for entry in read_journal(journal_path):
+        apply_entry(requests, entry)
+    return requests
+
+
+class JournalLocked(RuntimeError):
+    """Le journal appartient déjà à un autre processus."""
+
+
+class _Marker:
+    """Élément de contrôle de la file : attente de validation ou point de contrôle."""
+    __slots__ = ("done", "checkpoint", "ok")
+
+    def __init__(self, checkpoint: bool = False):
+        self.done = threading.Event()
+        self.checkpoint = checkpoint
+        self.ok = True
+
+
+class RequestStore:
+    """
+    État des requêtes en mémoire, persisté par un écrivain unique.
+    ``on_commit(entries)`` est appelé par l'écrivain après chaque fsync (mise à jour de l'index par lot).
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str,
+                 on_commit: Callable[[List[Entry]], None] = None,
+                 commit_window_ms: float = JOURNAL_COMMIT_WINDOW_MS, max_batch: int = JOURNAL_MAX_BATCH):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.on_commit = on_commit
+        self.commit_window = commit_window_ms / 1000.0
+        self.max_batch = max_batch
+        # Verrou de propriété gardé ouvert pendant toute la vie du processus
+        self._owner = open(journal_path + ".lock", "a")
+        try:
+            lock_exclusive(self._owner, blocking=False)
+        except BlockingIOError:
+            self._owner.close()
+            raise JournalLocked(f"{journal_path} is owned by another process (set a distinct JOURNAL_PATH)")
+        self._journal = open(journal_path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._dirty = set()
+        self._deleted = set()
+        self._queue: "queue.Queue" = queue.Queue()
+        self.requests = read_snapshot(snapshot_path)
+        recovered = self._recover()
+        self.batches = 0
+        self.entries = 0
+        self._writer = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._writer.start()
+        if recovered:
+            logger.info("[Journal] Recovered %s entries from %s", recovered, journal_path)
+        if os.path.getsize(journal_path):
+            # Consolide aussi une éventuelle ligne tronquée avant tout nouvel ajout
+            self.checkpoint()
+
+    def _recover(self) -> int:
+        """Rejoue le journal d'un processus précédent ; les enregistrements touchés seront consolidés."""
+        count = 0
+        for entry in read_journal(self.journal_path):
+            apply_entry(self.requests, entry)
+            if entry["op"] == "put":
+                self._dirty.add(entry["id"])
+                self._deleted.discard(entry["id"])
+            else:
+                self._dirty.difference_update(entry["ids"])
+                self._deleted.update(entry["ids"])
+            count += 1
+        return count
+
+    # --- Côté threads de requête --- #
+    def put(self, request_id: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Fusionne ``fields`` dans l'enregistrement et retourne une copie de l'enregistrement résultant."""
+        entry = {"op": "put", "id": request_id, "fields": fields}
+        with self._lock:
+            apply_entry(self.requests, entry)
+            self._dirty.add(request_id)
+            self._deleted.discard(request_id)
+            rec = dict(self.requests[request_id])
+        self._queue.put(entry)
+        return rec
+
+    def delete(self, request_ids: Iterable[str]):
+        entry = {"op": "delete", "ids": list(request_ids)}
+        with self._lock:
+            apply_entry(self.requests, entry)
+            self._dirty.difference_update(entry["ids"])
+            self._deleted.update(entry["ids"])
+        self._queue.put(entry)
+
+    def get(self, request_id: str):
+        with self._lock:
+            rec = self.requests.get(request_id)
+            return dict(rec) if rec is not None else None
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return [(request_id, dict(rec)) for request_id, rec in self.requests.items()]
+
+    def flush(self, timeout: float = None) -> bool:
+        """Attend que tout ce qui a été soumis jusqu'ici soit validé sur disque (False : délai dépassé ou échec)."""
+        marker = _Marker()
+        self._queue.put(marker)
+        return marker.done.wait(timeout) and marker.ok
+
+    def checkpoint(self, timeout: float = None) -> bool:
+        """Demande un point de contrôle à l'écrivain et attend qu'il soit fait (False : délai dépassé ou échec)."""
+        marker = _Marker(checkpoint=True)
+        self._queue.put(marker)
+        return marker.done.wait(timeout) and marker.ok
+
+    # --- Thread écrivain --- #
+    def _next_batch(self) -> Tuple[List[Entry], List[_Marker]]:
+        entries, markers = [], []
+        item = self._queue.get()
+        deadline = time.monotonic() + self.commit_window
+        while True:
+            if isinstance(item, _Marker):
+                markers.append(item)
+                if item.checkpoint:
+                    break
+            else:
+                entries.append(item)
+            if len(entries) >= self.max_batch:
+                break
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+        return entries, markers
+
+    def _run(self):
+        while True:
+            entries, markers = self._next_batch()
+            try:
+                if entries:
+                    self._journal.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+                    self._journal.flush()
+                    os.fsync(self._journal.fileno())
+                    self.batches += 1
+                    self.entries += len(entries)
+                    if self.on_commit:
+                        self.on_commit(entries)
+            except Exception as e:
+                logger.error("[Journal] Writer error: %s", e, exc_info=True)
+                for marker in markers:
+                    marker.ok = False
+            if any(m.checkpoint for m in markers):
+                try:
+                    self._write_checkpoint()
+                except Exception as e:
+                    logger.error("[Journal] Checkpoint failed: %s", e, exc_info=True)
+                    for marker in markers:
+                        if marker.checkpoint:
+                            marker.ok = False
+            for marker in markers:
+                marker.done.set()
+
+    def _write_checkpoint(self):
+        with self._lock:
+            dirty = {request_id: dict(self.requests[request_id]) for request_id in self._dirty}
+            deleted = set(self._deleted)
+            self._dirty.clear()
+            self._deleted.clear()
+
+        try:
+            # Verrou de fichier : les autres répliques fusionnent aussi dans database.json
+            with locked(self.snapshot_path + ".lock"):
+                on_disk = read_snapshot(self.snapshot_path)
+                on_disk.update(dirty)
+                for request_id in deleted:
+                    on_disk.pop(request_id, None)
+                tmp = self.snapshot_path + ".tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"requests": on_disk}, f, indent=2, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.snapshot_path)
+        except BaseException:
+            # Rien n'a été consolidé : les ids repassent à consolider, le journal est gardé.
+            # Une modification faite entre-temps (put ou delete) reste prioritaire.
+            with self._lock:
+                self._dirty.update(set(dirty) - self._deleted)
+                self._deleted.update(deleted - self._dirty)
+            raise
+
+        # Tout le journal est désormais dans l'instantané
+        self._journal.truncate(0)
+        self._journal.seek(0)
+        logger.info("[Journal] Checkpoint: %s record(s) merged, %s removed", len(dirty), len(deleted))
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": self._queue.qsize(), "batches": self.batches, "entries": self.entries,
+                "dirty": len(self._dirty) + len(self._deleted)}
+
+
+def start_checkpoint_job(store: RequestStore, interval: float = CHECKPOINT_INTERVAL_SECONDS):
+    """Thread de fond qui demande périodiquement un point de contrôle (None si désactivé)."""
+    if interval <= 0:
+        return None
+
+    def loop():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            if store.stats()["dirty"]:
+                store.checkpoint()
+
+    thread = threading.Thread(target=loop, name="checkpoint", daemon=True)
+    thread.start()
+    return thread
@@ -6,8 +6,9 @@ from spyne.util.wsgi_wrapper import run_twisted
 from suds.client import Client
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import sys, logging, json, os, io
-from spyne import Application, rpc, ServiceBase, Unicode
+import sys, logging, json, os, io, functools
+from datetime import datetime
+from spyne import Application, rpc, ServiceBase, Unicode, Integer
 from spyne.protocol.soap import Soap11
 from spyne.server.wsgi import WsgiApplication
 from spyne.util.wsgi_wrapper import run_twisted
@@ -20,113 +21,694 @@ if sys.platform == "win32":
 # Import utilitaires (robuste pour exécution en package ou directe)
 try:
     from composite_service.utils import (
-        new_request_id, create_request, save_decision, get_request, notify
+        new_request_id, create_request, save_decision, get_request, get_request_json,
+        start_compaction_job, get_store, HOT_CACHE
     )
 except ModuleNotFoundError:
     sys.path.append(os.path.dirname(__file__))
-    from utils import new_request_id, create_request, save_decision, get_request, notify
+    from utils import (
+        new_request_id, create_request, save_decision, get_request, get_request_json,
+        start_compaction_job, get_store, HOT_CACHE
+    )
+
+try:
+    from composite_service.index import query_requests, claim_idempotency_key, release_idempotency_key
+    from composite_service.idempotency import (
+        InFlight, idempotency_key as make_idempotency_key, stale_start, window_start
+    )
+except ModuleNotFoundError:
+    from index import query_requests, claim_idempotency_key, release_idempotency_key
+    from idempotency import InFlight, idempotency_key as make_idempotency_key, stale_start, window_start
+
+try:
+    from composite_service.export import export_wsgi_app
+    from composite_service.fallback_cache import FallbackCache, applicant_key, property_key, start_refresh_job
+    from composite_service.journal import start_checkpoint_job
+    from composite_service.stage_memo import StageMemo, ExtractionMemo, credit_key
+except ModuleNotFoundError:
+    from export import export_wsgi_app
+    from fallback_cache import FallbackCache, applicant_key, property_key, start_refresh_job
+    from journal import start_checkpoint_job
+    from stage_memo import StageMemo, ExtractionMemo, credit_key
+
+try:
+    from common.log_setup import setup_logging, log_payload
+    from common.models import LoanResponse, Decision, to_model
+    from common.deadline import Deadline, DeadlineExceeded, deadline_from_ctx
+    from common.profiling import enable_profiling, profiling_wsgi_app, tag_request, profile_token, continue_in_thread
+    from common.wire import dumps, detail_level, gzip_wsgi_app
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.log_setup import setup_logging, log_payload
+    from common.models import LoanResponse, Decision, to_model
+    from common.deadline import Deadline, DeadlineExceeded, deadline_from_ctx
+    from common.profiling import enable_profiling, profiling_wsgi_app, tag_request, profile_token, continue_in_thread
+    from common.wire import dumps, detail_level, gzip_wsgi_app
+
+try:
+    from composite_service.clients import get_channel
+    from composite_service.transport import pool_stats
+    from composite_service.admission import (
+        AdmissionController, Rejected, DOWNSTREAM, client_id_of, priority_of, metrics_wsgi_app_for,
+        COMPOSITE_THREADS
+    )
+    from composite_service.async_io import (
+        SoapResource, admit, channel_stats, downstream_slot, follow, get_async_channel, run_reactor
+    )
+except ModuleNotFoundError:
+    from clients import get_channel
+    from transport import pool_stats
+    from admission import (
+        AdmissionController, Rejected, DOWNSTREAM, client_id_of, priority_of, metrics_wsgi_app_for,
+        COMPOSITE_THREADS
+    )
+    from async_io import SoapResource, admit, channel_stats, downstream_slot, follow, get_async_channel, run_reactor
+
+from twisted.internet.defer import inlineCallbacks
+from twisted.internet.threads import deferToThread
+
+logger = setup_logging("composite")
+
+# --- Configuration --- #
+# Échéance globale par défaut d'une soumission (le client peut en demander une autre)
+REQUEST_DEADLINE_MS = int(os.getenv("REQUEST_DEADLINE_MS", "30000"))
+# Part du temps restant accordée à chaque étape, dans l'ordre du pipeline
+STAGE_BUDGET_WEIGHTS = tuple(
+    (stage, float(weight)) for stage, weight in
+    (item.split(":") for item in os.getenv("STAGE_BUDGET_WEIGHTS", "ie:5,cc:1.5,pe:1.5,ds:2").split(","))
+)
+# async : submitRequest attend les enfants sans occuper de thread (réacteur Twisted) ;
+# threads : un thread du pool par soumission pendant toute l'orchestration (historique)
+COMPOSITE_ORCHESTRATOR = os.getenv("COMPOSITE_ORCHESTRATOR", "async").lower()
+ASYNC_ORCHESTRATOR = COMPOSITE_ORCHESTRATOR == "async"
+
+
+def _suds_to_dict(obj):
+    """Convertit récursivement une réponse suds (objets, tableaux) en types Python."""
+    if isinstance(obj, list):
+        return [_suds_to_dict(v) for v in obj]
+    if not hasattr(obj, "__keylist__"):
+        return obj
+    fields = Client.dict(obj)
+    # Les Array(...) Spyne arrivent comme un objet "xxxArray" à une seule clé
+    if obj.__class__.__name__.endswith("Array") and len(fields) == 1:
+        return _suds_to_dict(next(iter(fields.values())))
+    return {k: _suds_to_dict(v) for k, v in fields.items() if v is not None}
+
+
+def _client_decision(decision, detail: str):
+    """Décision renvoyée au client : sans risk_details (audit) en mode summary ; l'enregistrement reste complet."""
+    if detail == "full" or not isinstance(decision, dict):
+        return decision
+    return {k: v for k, v in decision.items() if k != "risk_details"}
+
+
+def _duplicate_response(request_id: str, detail: str = "full") -> str:
+    """Réponse pour une soumission déjà connue : décision existante, ou statut en cours."""
+    rec = get_request(request_id) or {}
+    if rec.get("status") == "done":
+        return dumps({
+            "status": "done",
+            "request_id": request_id,
+            "decision": _client_decision(rec.get("result"), detail),
+            "duplicate": True
+        })
+    return dumps({"status": "processing", "request_id": request_id, "duplicate": True})
+
+
+def _request_deadline(ctx, deadline_ms) -> Deadline:
+    """Échéance de la soumission : paramètre, sinon en-tête X-Request-Budget-Ms, sinon REQUEST_DEADLINE_MS."""
+    if deadline_ms:
+        return Deadline.after_ms(deadline_ms)
+    return deadline_from_ctx(ctx) or Deadline.after_ms(REQUEST_DEADLINE_MS)
+
+
+def _stage_budget(stage: str, deadline: Deadline) -> Deadline:
+    """Part de l'étape ``stage`` dans le temps restant (selon STAGE_BUDGET_WEIGHTS)."""
+    names = [name for name, _ in STAGE_BUDGET_WEIGHTS]
+    remaining = STAGE_BUDGET_WEIGHTS[names.index(stage):] if stage in names else ()
+    weight = remaining[0][1] if remaining else 0
+    return deadline.share(weight, sum(w for _, w in remaining)) if weight else deadline
+
+
+def _call_stage(channel, stage: str, operation: str, deadline: Deadline, priority: str, request_id: str, **params):
+    """
+    Appelle ``operation`` sur l'enfant dans le budget de l'étape ``stage``.
+    Le budget est la part de l'étape dans le temps restant ; il sert d'attente
+    maximale pour un créneau DOWNSTREAM, de délai de lecture, et il est transmis à l'enfant.
+    """
+    budget = _stage_budget(stage, deadline)
+    try:
+        with DOWNSTREAM.slot(stage, priority, timeout=budget.remaining()):
+            return channel.call(operation, deadline=budget, request_id=request_id, **params)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        # Délai de lecture, créneau non obtenu ou fault de l'enfant hors délai
+        if budget.expired():
+            raise DeadlineExceeded(stage) from e
+        raise
+
+
+def _refresh_loader(service: str, operation: str):
+    """
+    Rappel d'un enfant pour le rafraîchissement du cache de repli (classe backfill).
+    Comme pour une étape, l'échéance borne l'attente du créneau DOWNSTREAM et l'appel :
+    un enfant saturé ne bloque pas le thread de rafraîchissement.
+    """
+    def load(payload: str) -> dict:
+        budget = Deadline.after_ms(REQUEST_DEADLINE_MS)
+        with DOWNSTREAM.slot(service, "backfill", timeout=budget.remaining()):
+            return json.loads(get_channel(service).call(operation, deadline=budget, data=payload))
+    return load
+
+
+# Dernières réponses connues de CC et PE, servies si l'enfant est indisponible
+_fallback = {
+    "cc": FallbackCache("cc", _refresh_loader("cc", "check_credit")),
+    "pe": FallbackCache("pe", _refresh_loader("pe", "evaluate_property")),
+}
+_FALLBACK_KEYS = {"cc": applicant_key, "pe": property_key}
+
+
+def _with_fallback(stage: str, application: dict, payload: str, call, degraded: list, request_id: str) -> dict:
+    """
+    Exécute ``call`` (résultat dict de CC ou PE) et met la réponse en cache.
+    En cas d'échec ou de dépassement du budget, sert la dernière réponse connue
+    pour ce demandeur / ce bien et ajoute ``stage`` à ``degraded``.
+    """
+    cache = _fallback[stage]
+    key = _FALLBACK_KEYS[stage](application)
+    try:
+        result = call()
+        if result.get("status") == "error":
+            raise RuntimeError(result.get("message", f"{stage} error"))
+    except Exception as e:
+        return _serve_stale(stage, key, e, degraded, request_id)
+    cache.put(key, result, payload)
+    return result
+
+
+def _serve_stale(stage: str, key: str, error: Exception, degraded: list, request_id: str) -> dict:
+    """Dernière réponse connue pour ``key`` (étape marquée dégradée) ; relance ``error`` s'il n'y en a pas."""
+    stale = _fallback[stage].get_stale(key)
+    if stale is None:
+        raise error
+    value, age = stale
+    logger.warning("[Composite] %s unavailable for %s (%s), using cached result (%.0fs old)",
+                   stage, request_id, error, age)
+    degraded.append(stage)
+    return value
+
+
+def _mark_degraded(decision: dict, degraded: list):
+    if degraded:
+        decision["degraded"] = True
+        decision["degraded_stages"] = degraded
+
+
+# Sorties d'IE, CC et PE par entrée : une demande modifiée ne recalcule que les étapes touchées
+_memo = {
+    "ie": ExtractionMemo("ie"),
+    "cc": StageMemo("cc", credit_key),
+    "pe": StageMemo("pe", property_key),
+}
+
+
+def _memoized(stage: str, inputs, call, reused: list, degraded: list = ()) -> dict:
+    """
+    Sortie de ``stage`` déjà calculée pour ces entrées (``stage`` ajouté à ``reused``),
+    sinon ``call()`` ; une sortie servie par le cache de repli n'est pas retenue.
+    """
+    cached = _memo[stage].get(inputs)
+    if cached is not None:
+        reused.append(stage)
+        return cached
+    result = call()
+    if stage not in degraded:
+        _memo[stage].put(inputs, result)
+    return result
+
+
+def _mark_reused(decision: dict, reused: list):
+    if reused:
+        decision["stages_reused"] = reused
+
+
+def _timeout_response(request_id: str, key: str, e: DeadlineExceeded) -> str:
+    logger.warning("[Composite] Request %s timed out during %s", request_id, e.stage)
+    try:
+        release_idempotency_key(key, request_id)
+        save_decision(request_id, {"approved": False, "message": e.faultstring})
+    except Exception:
+        pass
+    return dumps({"status": "timeout", "request_id": request_id, "stage": e.stage, "message": e.faultstring})
+
+
+def _process_request(request_text: str, key: str, priority: str, deadline: Deadline, detail: str = "full") -> str:
+    """
+    Traite synchroniquement la demande entière et retourne la décision finale.
+    - Crée request_id (ou réutilise celui d'une soumission identique récente)
+    - Sauvegarde l'enregistrement initial (status=processing)
+    - Appelle IE -> CC -> PE -> DS, chaque appel dans le budget de sa classe de priorité
+      et dans la part de l'échéance attribuée à son étape
+    - Enregistre la décision, notifie, et retourne la décision + request_id
+    - Échéance dépassée : réponse {"status": "timeout", "stage": ...} sans attendre l'enfant
+    """
+    try:
+        # Générer l'identifiant et réserver la clé d'idempotence
+        request_id = new_request_id(request_text)
+        owner = claim_idempotency_key(key, request_id, datetime.utcnow().isoformat(), window_start(), stale_start())
+        if owner != request_id:
+            logger.info("[Composite] Duplicate submission, reusing request %s", owner)
+            return _duplicate_response(owner, detail)
+
+        create_request(request_id, request_text)
+        tag_request(request_id)
+        logger.info("[Composite] Start processing request %s", request_id)
+
+        # Canaux vers les services enfants (SOAP ou JSON selon LOAN_INTERNAL_PROTOCOL)
+        # (CC et PE sont obtenus dans l'appel protégé par le cache de repli : la
+        # création d'un canal SOAP lit le WSDL et échoue si le service est arrêté)
+        ie = get_channel("ie")
+        ds = get_channel("ds")
+
+        # 1) Information Extraction (parsed sera dict) ; réutilisée si le texte n'a pas changé
+        reused = []
+        parsed = _memoized("ie", request_text, lambda: json.loads(
+            _call_stage(ie, "ie", "extract_information", deadline, priority, request_id, text=request_text)
+        ), reused)
+        extracted_json = dumps(parsed)
+        log_payload(logger, "[Composite] IE output", parsed, request_id=request_id)
+
+        # 2) Credit Check: envoie JSON string (extracted_json) ; repli sur le cache si indisponible
+        degraded = []
+        cc_result = _memoized("cc", parsed, lambda: _with_fallback("cc", parsed, extracted_json, lambda: json.loads(
+            _call_stage(get_channel("cc"), "cc", "check_credit", deadline, priority, request_id, data=extracted_json)
+        ), degraded, request_id), reused, degraded)
+        log_payload(logger, "[Composite] CC output", cc_result, request_id=request_id)
+
+        # 3) Property Evaluation: envoie JSON string (extracted_json) ; même repli
+        pe_result = _memoized("pe", parsed, lambda: _with_fallback("pe", parsed, extracted_json, lambda: json.loads(
+            _call_stage(get_channel("pe"), "pe", "evaluate_property", deadline, priority, request_id, data=extracted_json)
+        ), degraded, request_id), reused, degraded)
+        log_payload(logger, "[Composite] PE output", pe_result, request_id=request_id)
+
+        # 4) Decision: construit l'entrée attendue par DecisionService
+        decision_input = _decision_input(parsed, cc_result, pe_result)
+        decision_json = _call_stage(ds, "ds", "make_decision", deadline, priority, request_id, data=dumps(decision_input))
+        decision = json.loads(decision_json)
+        _mark_degraded(decision, degraded)
+        _mark_reused(decision, reused)
+        log_payload(logger, "[Composite] Decision output", decision, request_id=request_id)
+
+        # Enregistrer et notifier ; retour complet synchronique
+        return _finish_request(request_id, decision, parsed, detail)
+
+    except DeadlineExceeded as e:
+        return _timeout_response(request_id, key, e)
+
+    except Exception as e:
+        return _error_response(key, request_id if 'request_id' in locals() else None, e)
 
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# URLs des services enfants (attendus en local)
-IE_URL = "http://127.0.0.1:8001/InformationExtractionService?wsdl"
-CC_URL = "http://127.0.0.1:8002/CreditCheckService?wsdl"
-PE_URL = "http://127.0.0.1:8003/PropertyEvaluationService?wsdl"
-DS_URL = "http://127.0.0.1:8004/DecisionService?wsdl"
+def _decision_input(parsed: dict, cc_result: dict, pe_result: dict) -> dict:
+    """Entrée attendue par DecisionService."""
+    return {
+        "credit_score": cc_result.get("credit_score", 0),
+        "property_value": pe_result.get("property_value", 0),
+        "loan_amount": float(parsed.get("montant_pret", 0)),
+        # optional: forward income/expenses for better risk calculation
+        "revenu_mensuel": parsed.get("revenu_mensuel", 0),
+        "depenses_mensuelles": parsed.get("depenses_mensuelles", 0),
+        "emploi_stable": parsed.get("emploi_stable", True),
+        # embed raw sub-results for auditing
+        "credit_check": cc_result,
+        "property_evaluation": pe_result
+    }
+
+
+def _finish_request(request_id: str, decision: dict, parsed: dict, detail: str = "full") -> str:
+    """Enregistre la décision (save_decision notifie le demandeur : SMTP, bloquant) et retourne la réponse finale."""
+    email = parsed.get("email") or None
+    save_decision(request_id, decision, to_email=email, email=email)
+
+    return dumps({
+        "status": "done",
+        "request_id": request_id,
+        "decision": _client_decision(decision, detail)
+    })
+
+
+def _error_response(key: str, request_id, e: Exception) -> str:
+    logger.error("[Composite] Error processing request: %s", e, exc_info=e)
+    # Save minimal error result
+    error_result = {
+        "approved": False,
+        "message": f"Internal error: {str(e)}"
+    }
+    try:
+        # Try to save decision anyway with a request_id if present
+        if request_id is not None:
+            release_idempotency_key(key, request_id)
+            save_decision(request_id, error_result)
+    except Exception:
+        pass
+    return dumps({"status": "error", "message": str(e)})
+
+
+# --- Orchestrateur asynchrone --- #
+@inlineCallbacks
+def _call_stage_async(stage: str, operation: str, deadline: Deadline, priority: str, request_id: str,
+                      token: str = None, **params):
+    """Comme _call_stage, mais le créneau DOWNSTREAM et l'appel à l'enfant sont attendus sans thread."""
+    budget = _stage_budget(stage, deadline)
+    try:
+        yield downstream_slot(DOWNSTREAM, stage, priority, budget.remaining())
+        try:
+            result = yield get_async_channel(stage).call(operation, deadline=budget, request_id=request_id,
+                                                         profile_token=token, **params)
+        finally:
+            DOWNSTREAM.release(stage, priority)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        if budget.expired():
+            raise DeadlineExceeded(stage) from e
+        raise
+    return result
+
+
+@inlineCallbacks
+def _with_fallback_async(stage: str, application: dict, payload: str, call, degraded: list, request_id: str):
+    """Comme _with_fallback, pour un ``call`` qui retourne un Deferred."""
+    key = _FALLBACK_KEYS[stage](application)
+    try:
+        result = yield call()
+        if result.get("status") == "error":
+            raise RuntimeError(result.get("message", f"{stage} error"))
+    except Exception as e:
+        return _serve_stale(stage, key, e, degraded, request_id)
+    _fallback[stage].put(key, result, payload)
+    return result
+
+
+@inlineCallbacks
+def _memoized_async(stage: str, inputs, call, reused: list, degraded: list = ()):
+    """Comme _memoized, pour un ``call`` qui retourne un Deferred."""
+    cached = _memo[stage].get(inputs)
+    if cached is not None:
+        reused.append(stage)
+        return cached
+    result = yield call()
+    if stage not in degraded:
+        _memo[stage].put(inputs, result)
+    return result
+
+
+@inlineCallbacks
+def _process_request_async(request_text: str, key: str, priority: str, deadline: Deadline, token: str = None,
+                           detail: str = "full"):
+    """
+    Même traitement et même réponse que _process_request, sans bloquer de thread :
+    IE -> CC -> PE -> DS passent par AsyncChannel ; seuls la réservation de la clé
+    d'idempotence (SQLite) et l'enregistrement / la notification (SMTP) passent par
+    le pool de threads, le temps de ces opérations.
+    """
+    request_id = None
+    try:
+        request_id = new_request_id(request_text)
+        tag_request(request_id)
+        owner = yield deferToThread(claim_idempotency_key, key, request_id, datetime.utcnow().isoformat(),
+                                    window_start(), stale_start())
+        if owner != request_id:
+            logger.info("[Composite] Duplicate submission, reusing request %s", owner)
+            return (yield deferToThread(_duplicate_response, owner, detail))
+
+        create_request(request_id, request_text)
+        logger.info("[Composite] Start processing request %s", request_id)
+        stage = functools.partial(_call_stage_async, deadline=deadline, priority=priority, request_id=request_id,
+                                  token=token)
+
+        reused = []
+        parsed = yield _memoized_async("ie", request_text, lambda: stage(
+            "ie", "extract_information", text=request_text).addCallback(json.loads), reused)
+        extracted_json = dumps(parsed)
+        log_payload(logger, "[Composite] IE output", parsed, request_id=request_id)
+
+        degraded = []
+        cc_result = yield _memoized_async(
+            "cc", parsed, lambda: _with_fallback_async("cc", parsed, extracted_json, lambda: stage(
+                "cc", "check_credit", data=extracted_json).addCallback(json.loads), degraded, request_id),
+            reused, degraded)
+        log_payload(logger, "[Composite] CC output", cc_result, request_id=request_id)
+
+        pe_result = yield _memoized_async(
+            "pe", parsed, lambda: _with_fallback_async("pe", parsed, extracted_json, lambda: stage(
+                "pe", "evaluate_property", data=extracted_json).addCallback(json.loads), degraded, request_id),
+            reused, degraded)
+        log_payload(logger, "[Composite] PE output", pe_result, request_id=request_id)
+
+        decision_json = yield stage("ds", "make_decision", data=dumps(_decision_input(parsed, cc_result, pe_result)))
+        decision = json.loads(decision_json)
+        _mark_degraded(decision, degraded)
+        _mark_reused(decision, reused)
+        log_payload(logger, "[Composite] Decision output", decision, request_id=request_id)
+
+        return (yield deferToThread(_finish_request, request_id, decision, parsed, detail))
+
+    except DeadlineExceeded as e:
+        return (yield deferToThread(_timeout_response, request_id, key, e))
+
+    except Exception as e:
+        return (yield deferToThread(_error_response, key, request_id, e))
+
+
+
+# Soumissions identiques en cours dans ce processus
+_inflight = InFlight()
+
+# Admission : concurrence bornée, file bornée, débit par client
+_admission = AdmissionController()
+
+
+def _admit(ctx, priority: str, deadline: Deadline):
+    """Réserve une place de traitement ; en cas de refus, pose Retry-After et relance Rejected."""
+    try:
+        _admission.acquire(client_id_of(ctx), priority, timeout=deadline.remaining())
+    except Rejected as r:
+        _on_rejected(ctx, r)
+        raise
+
+
+def _on_rejected(ctx, r: Rejected):
+    logger.warning("[Composite] Admission rejected (%s) for %s", r.reason, client_id_of(ctx))
+    headers = getattr(ctx.transport, "resp_headers", None)
+    if headers is not None:
+        headers["Retry-After"] = str(max(1, int(r.retry_after + 0.999)))
+
+
+@inlineCallbacks
+def _submit_async(ctx, request_text, idempotency_key, priority, deadline_ms):
+    """submitRequest avec l'orchestrateur asynchrone : admission, déduplication et traitement sans thread."""
+    deadline = _request_deadline(ctx, deadline_ms)
+    detail = detail_level(ctx)
+    try:
+        priority = priority_of(ctx, priority)
+        yield admit(_admission, client_id_of(ctx), priority, deadline.remaining())
+    except ValueError as e:
+        return dumps({"status": "error", "message": str(e)})
+    except Rejected as r:
+        _on_rejected(ctx, r)
+        return dumps(r.as_response())
+    try:
+        key = make_idempotency_key(request_text, idempotency_key)
+        future, leader = _inflight.join(key)
+        if not leader:
+            return (yield follow(future))
+        try:
+            result = yield _process_request_async(request_text, key, priority, deadline, detail=detail)
+        except BaseException as e:
+            _inflight.finish(key, future, error=e)
+            raise
+        _inflight.finish(key, future, result)
+        return result
+    finally:
+        _admission.release()
+
+
+def _submit_threaded(ctx, request_text, idempotency_key, priority, deadline_ms):
+    """submitRequest avec l'orchestrateur à threads (bloquant : appels suds)."""
+    deadline = _request_deadline(ctx, deadline_ms)
+    try:
+        priority = priority_of(ctx, priority)
+        _admit(ctx, priority, deadline)
+    except ValueError as e:
+        return dumps({"status": "error", "message": str(e)})
+    except Rejected as r:
+        return dumps(r.as_response())
+    try:
+        key = make_idempotency_key(request_text, idempotency_key)
+        detail = detail_level(ctx)
+        return _inflight.run(key, lambda: _process_request(request_text, key, priority, deadline, detail))
+    finally:
+        _admission.release()
+
+
+def _off_reactor(fn, *args):
+    """
+    Avec l'orchestrateur asynchrone, les méthodes bloquantes s'exécutent dans le pool
+    de threads ; un appel profilé y poursuit son profil (continue_in_thread).
+    """
+    return deferToThread(continue_in_thread(fn), *args) if ASYNC_ORCHESTRATOR else fn(*args)
+
+
+def _metrics() -> dict:
+    """Métriques exposées par getMetrics et GET /metrics."""
+    return {
+        **_admission.metrics(),
+        "connections": pool_stats(),
+        "fallback_cache": {name: cache.stats() for name, cache in _fallback.items()},
+        "stage_memo": {name: memo.stats() for name, memo in _memo.items()},
+        "hot_cache": HOT_CACHE.stats(),
+        "journal": get_store().stats(),
+        "orchestrator": COMPOSITE_ORCHESTRATOR,
+        **({"async_http": channel_stats()} if ASYNC_ORCHESTRATOR else {}),
+    }
+
+
+def _submit_typed(ctx, request_text, priority, deadline_ms):
+    """Traitement de submitRequestTyped (bloquant : appels suds)."""
+    deadline = _request_deadline(ctx, deadline_ms)
+    try:
+        priority = priority_of(ctx, priority)
+        _admit(ctx, priority, deadline)
+    except ValueError as e:
+        return LoanResponse(status="error", message=str(e))
+    except Rejected as r:
+        return LoanResponse(status="retry_later", message=f"{r.reason}; retry after {r.retry_after:.1f}s")
+    try:
+        request_id = new_request_id(request_text)
+        create_request(request_id, request_text)
+        tag_request(request_id)
+        logger.info("[Composite] Start processing typed request %s", request_id)
+
+        # Les opérations typées passent toujours par SOAP (objets suds)
+        ie = get_channel("ie", "soap")
+        ds = get_channel("ds", "soap")
+
+        # L'objet suds retourné par IE est relayé tel quel à CC et PE (même namespace)
+        stage = functools.partial(_call_stage, deadline=deadline, priority=priority, request_id=request_id)
+        extracted = stage(ie, "ie", "extract_information_typed", text=request_text)
+        application = _suds_to_dict(extracted)
+        payload = dumps(application)
+        degraded = []
+        cc_result = _with_fallback("cc", application, payload, lambda: _suds_to_dict(
+            stage(get_channel("cc", "soap"), "cc", "check_credit_typed", application=extracted)
+        ), degraded, request_id)
+        pe_result = _with_fallback("pe", application, payload, lambda: _suds_to_dict(
+            stage(get_channel("pe", "soap"), "pe", "evaluate_property_typed", application=extracted)
+        ), degraded, request_id)
+
+        emploi_stable = getattr(extracted, "emploi_stable", None)
+        decision_input = {
+            "credit_score": cc_result.get("credit_score") or 0,
+            "property_value": pe_result.get("property_value") or 0,
+            "loan_amount": float(extracted.montant_pret or 0),
+            "revenu_mensuel": extracted.revenu_mensuel or 0,
+            "depenses_mensuelles": extracted.depenses_mensuelles or 0,
+            "emploi_stable": True if emploi_stable is None else emploi_stable.lower() == "oui",
+        }
+        decision = _suds_to_dict(stage(ds, "ds", "make_decision_typed", data=decision_input))
+        _mark_degraded(decision, degraded)
+        log_payload(logger, "[Composite] Decision output", decision, request_id=request_id)
+
+        email = getattr(extracted, "email", None) or None
+        save_decision(request_id, decision, to_email=email, email=email)
+
+        return LoanResponse(status="done", request_id=request_id, decision=to_model(Decision, decision))
+
+    except DeadlineExceeded as e:
+        logger.warning("[Composite] Typed request %s timed out during %s", request_id, e.stage)
+        try:
+            save_decision(request_id, {"approved": False, "message": e.faultstring})
+        except Exception:
+            pass
+        return LoanResponse(status="timeout", request_id=request_id, message=e.faultstring)
+
+    except Exception as e:
+        logger.error("[Composite] Error processing typed request: %s", e, exc_info=True)
+        try:
+            if 'request_id' in locals():
+                save_decision(request_id, {"approved": False, "message": f"Internal error: {str(e)}"})
+        except Exception:
+            pass
+        return LoanResponse(status="error", message=str(e))
+    finally:
+        _admission.release()
+
+
+def _get_result(request_id: str) -> str:
+    response = get_request_json(request_id)
+    if response is None:
+        return dumps({"status": "error", "message": f"No request found for {request_id}"})
+    return response
+
+
+def _list_requests(status, date_from, date_to, email, cursor, limit) -> str:
+    try:
+        items, next_cursor = query_requests(status, date_from, date_to, email, cursor, limit or 50)
+    except ValueError as e:
+        return dumps({"status": "error", "message": str(e)})
+    return dumps({"status": "ok", "items": items, "next_cursor": next_cursor})
 
 
 class LoanEvaluationComposite(ServiceBase):
-    @rpc(Unicode, _returns=Unicode)
-    def submitRequest(ctx, request_text):
+    @rpc(Unicode, Unicode, Unicode, Integer, _returns=Unicode)
+    def submitRequest(ctx, request_text, idempotency_key, priority, deadline_ms):
         """
-        Traite synchroniquement la demande entière et retourne la décision finale.
-        - Crée request_id
-        - Sauvegarde l'enregistrement initial (status=processing)
-        - Appelle IE -> CC -> PE -> DS
-        - Enregistre la décision, notifie, et retourne la décision + request_id
+        Soumet une demande. ``idempotency_key`` (optionnelle) identifie la soumission ;
+        à défaut, l'empreinte du texte normalisé est utilisée. Une soumission répétée
+        dans la fenêtre de déduplication retourne le request_id et la décision existants.
+        ``priority`` (optionnelle) : interactive | batch | backfill ; à défaut, la classe
+        associée à la clé d'API (PRIORITY_API_KEYS), UNKEYED_PRIORITY sans clé listée.
+        ``deadline_ms`` (optionnelle) : échéance globale ; à défaut REQUEST_DEADLINE_MS.
+        En-tête HTTP ``X-Response-Detail: summary`` : décision sans risk_details.
+        Un appel profilé passe par l'orchestrateur à threads : le profil couvre alors
+        tout le traitement de la demande, et elle seule.
         """
-        try:
-            # Générer et créer l'enregistrement
-            request_id = new_request_id(request_text)
-            create_request(request_id, request_text)
-            logging.info(f"[Composite] Start processing request {request_id}")
-
-            # Instancier clients SOAP
-            ie = Client(IE_URL)
-            cc = Client(CC_URL)
-            pe = Client(PE_URL)
-            ds = Client(DS_URL)
-
-            # 1) Information Extraction (renvoie JSON string)
-            extracted_json = ie.service.extract_information(request_text)
-            # parsed sera dict
-            parsed = json.loads(extracted_json)
-            logging.info(f"[Composite] IE output: {parsed}")
-
-            # 2) Credit Check: envoie JSON string (extracted_json)
-            cc_response_json = cc.service.check_credit(extracted_json)
-            cc_result = json.loads(cc_response_json)
-            logging.info(f"[Composite] CC output: {cc_result}")
-
-            # 3) Property Evaluation: envoie JSON string (extracted_json)
-            pe_response_json = pe.service.evaluate_property(extracted_json)
-            pe_result = json.loads(pe_response_json)
-            logging.info(f"[Composite] PE output: {pe_result}")
-
-            # 4) Decision: construit l'entrée attendue par DecisionService
-            decision_input = {
-                "credit_score": cc_result.get("credit_score", 0),
-                "property_value": pe_result.get("property_value", 0),
-                "loan_amount": float(parsed.get("montant_pret", 0)),
-                # optional: forward income/expenses for better risk calculation
-                "revenu_mensuel": parsed.get("revenu_mensuel", 0),
-                "depenses_mensuelles": parsed.get("depenses_mensuelles", 0),
-                "emploi_stable": parsed.get("emploi_stable", True),
-                # embed raw sub-results for auditing
-                "credit_check": cc_result,
-                "property_evaluation": pe_result
-            }
-            decision_json = ds.service.make_decision(json.dumps(decision_input))
-            decision = json.loads(decision_json)
-            logging.info(f"[Composite] Decision output: {decision}")
-
-            # Enregistrer et notifier
-            save_decision(request_id, decision)
-
-            # Message simple pour notification: Approved ou Rejected (use decision["message"] if present)
-            notif_msg = decision.get("message", "Result ready")
-            notify(request_id, parsed.get("email", "unknown@email.com"), notif_msg)
-
-            # Retour complet synchronique
-            return json.dumps({
-                "status": "done",
-                "request_id": request_id,
-                "decision": decision
-            }, ensure_ascii=False)
-
-        except Exception as e:
-            logging.error(f"[Composite] Error processing request: {e}", exc_info=True)
-            # Save minimal error result
-            error_result = {
-                "approved": False,
-                "message": f"Internal error: {str(e)}"
-            }
-            try:
-                # Try to save decision anyway with a request_id if present
-                if 'request_id' in locals():
-                    save_decision(request_id, error_result)
-                    notify(request_id, "unknown", error_result["message"])
-            except Exception:
-                pass
-            return json.dumps({"status": "error", "message": str(e)})
+        if ASYNC_ORCHESTRATOR and profile_token() is None:
+            return _submit_async(ctx, request_text, idempotency_key, priority, deadline_ms)
+        return _off_reactor(_submit_threaded, ctx, request_text, idempotency_key, priority, deadline_ms)
+
+    @rpc(Unicode, Unicode, Integer, _returns=LoanResponse)
+    def submitRequestTyped(ctx, request_text, priority, deadline_ms):
+        """
+        Variante typée de submitRequest : mêmes étapes, mais chaque saut
+        IE -> CC/PE -> DS échange des ComplexModel au lieu de JSON dans une chaîne.
+        """
+        return _off_reactor(_submit_typed, ctx, request_text, priority, deadline_ms)
 
     @rpc(Unicode, _returns=Unicode)
     def getResult(ctx, request_id):
         """Récupère l'enregistrement sauvegardé pour request_id (status + result)."""
-        rec = get_request(request_id)
-        if not rec:
-            return json.dumps({"status": "error", "message": f"No request found for {request_id}"})
-        return json.dumps(rec, ensure_ascii=False)
+        return _off_reactor(_get_result, request_id)
+
+    @rpc(Unicode, Unicode, Unicode, Unicode, Unicode, Integer, _returns=Unicode,
+         _in_variable_names={"date_from": "from", "date_to": "to"})
+    def listRequests(ctx, status, date_from, date_to, email, cursor, limit):
+        """
+        Liste les requêtes depuis les index secondaires (sans charger database.json).
+        - status : processing | done | approved | rejected | error
+        - from / to : date YYYY-MM-DD (incluse) ou datetime ISO
+        - cursor : valeur "next_cursor" de la page précédente
+        """
+        return _off_reactor(_list_requests, status, date_from, date_to, email, cursor, limit)
+
+    @rpc(_returns=Unicode)
+    def getMetrics(ctx):
+        """Métriques d'admission (requêtes actives, file, rejets) et des pools de connexions."""
+        return dumps(_metrics())
 
 
 # --- Application SOAP --- #
@@ -136,8 +718,25 @@ app = Application(
     in_protocol=Soap11(validator='lxml'),
     out_protocol=Soap11()
 )
+enable_profiling("composite", logger, app)
 
 
 if __name__ == '__main__':
-    logging.info("[Composite] Running on port 8000")
-    sys.exit(run_twisted([(WsgiApplication(app), b'LoanEvaluationService')], 8000))
+    logger.info("[Composite] Running on port 8000")
+    # Ouvre le magasin (rejeu du journal après un crash) avant d'accepter des requêtes
+    start_checkpoint_job(get_store())
+    start_compaction_job()
+    start_refresh_job(list(_fallback.values()))
+    # Orchestrateur à threads : le pool doit dépasser concurrence + file pour que les
+    # rejets restent immédiats ; orchestrateur asynchrone : il ne sert qu'aux tâches bloquantes
+    from twisted.internet import reactor
+    reactor.suggestThreadPoolSize(COMPOSITE_THREADS)
+    logger.info("[Composite] Orchestrator: %s", COMPOSITE_ORCHESTRATOR)
+    soap_endpoint = SoapResource(app) if ASYNC_ORCHESTRATOR else gzip_wsgi_app(WsgiApplication(app))
+    serve = run_reactor if ASYNC_ORCHESTRATOR else run_twisted
+    sys.exit(serve([
+        (soap_endpoint, b'LoanEvaluationService'),
+        (export_wsgi_app, b'export'),  # export NDJSON/CSV en flux
+        (metrics_wsgi_app_for(_metrics), b'metrics'),
+        (profiling_wsgi_app, b'profiling'),
+    ], 8000))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mémoïsation par étape pour la réévaluation incrémentale des demandes modifiées :
+- Chaque réponse réussie d'IE, CC et PE est conservée, indexée par les seules
+  entrées dont l'étape dépend :
+    IE : texte de la demande (normalisé) ;
+    CC : identité et situation financière (nom, prénom, email, téléphone, âge,
+         emploi, revenu, dépenses, montant — le score tient compte du ratio montant / revenu) ;
+    PE : adresse et description du bien
+- Une demande renvoyée avec seulement le montant modifié réutilise l'extraction :
+  la clé IE masque la clause « Montant ... : <nombre> », et le montant est relu
+  dans le nouveau texte. Ce n'est fait que si le montant extrait par IE était
+  exactement celui de la clause (sinon la clé est le texte complet)
+- Les réponses servies depuis le cache de repli (étape dégradée) ne sont pas conservées
+- Taille bornée (STAGE_MEMO_SIZE par étape), éviction LRU, durée de vie
+  STAGE_MEMO_TTL_SECONDS (0 désactive la mémoïsation)
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    from composite_service.idempotency import normalize_text
+    from composite_service.fallback_cache import digest
+except ModuleNotFoundError:
+    from idempotency import normalize_text
+    from fallback_cache import digest
+
+# --- Configuration --- #
+STAGE_MEMO_SIZE = int(os.getenv("STAGE_MEMO_SIZE", "1000"))
+STAGE_MEMO_TTL_SECONDS = float(os.getenv("STAGE_MEMO_TTL_SECONDS", "1800"))
+
+# Clause du montant demandé ("Montant du Prêt Demandé : 200 000 €", "Montant demandé: 150000")
+_AMOUNT_CLAUSE = re.compile(r"(montant[^:\n\d]{0,40}[:\-]?\s*)(\d[\d .,]*\d|\d)", re.IGNORECASE)
+_NON_NUMERIC = re.compile(r"[^\d,.\-]")
+AMOUNT_PLACEHOLDER = "<montant>"
+
+
+def _amount_clause(text: str) -> Optional[Tuple[str, float]]:
+    """(texte normalisé avec le montant masqué, montant) si le texte contient une seule clause de montant."""
+    normalized = normalize_text(text)
+    matches = list(_AMOUNT_CLAUSE.finditer(normalized))
+    if len(matches) != 1:
+        return None
+    # même conversion que l'extraction (normalize_fields) : séparateurs retirés, virgule décimale
+    digits = _NON_NUMERIC.sub("", matches[0].group(2)).replace(",", ".")
+    try:
+        amount = float(digits)
+    except ValueError:
+        return None
+    m = matches[0]
+    return normalized[:m.start(2)] + AMOUNT_PLACEHOLDER + normalized[m.end(2):], amount
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()[:32]
+
+
+def credit_key(application: Dict[str, Any]) -> str:
+    """Entrées de CC : identité et situation financière."""
+    return digest(*(application.get(k) for k in (
+        "nom", "prenom", "email", "telephone", "age", "emploi_stable",
+        "revenu_mensuel", "depenses_mensuelles", "montant_pret",
+    )))
+
+
+class StageMemo:
+    """
+    Dernières sorties réussies d'une étape ; ``key(inputs)`` réduit l'entrée de
+    l'étape aux champs dont elle dépend. ``get`` retourne None si absente ou expirée.
+    """
+
+    def __init__(self, name: str, key: Callable[[Any], str], size: int = STAGE_MEMO_SIZE,
+                 ttl: float = STAGE_MEMO_TTL_SECONDS):
+        self.name = name
+        self.key = key
+        self.size = size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.size > 0
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def _count(self, value) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def get(self, inputs) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        return self._count(self._lookup(self.key(inputs)))
+
+    def put(self, inputs, value: Dict[str, Any]):
+        if self.enabled:
+            self._store(self.key(inputs), value)
+
+    def _store(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.monotonic())
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class ExtractionMemo(StageMemo):
+    """Mémo d'IE indexé par le texte : une demande qui ne diffère que par le montant réutilise l'extraction."""
+
+    def __init__(self, name: str = "ie", **kwargs):
+        super().__init__(name, text_key, **kwargs)
+
+    def get(self, text: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        clause = _amount_clause(text)
+        value = self._lookup("amount:" + text_key(clause[0])) if clause is not None else None
+        if value is not None:
+            value = {**value, "montant_pret": clause[1]}
+        else:
+            value = self._lookup(text_key(text))
+        return self._count(value)
+
+    def put(self, text: str, value: Dict[str, Any]):
+        if not self.enabled:
+            return
+        clause = _amount_clause(text)
+        try:
+            explained = clause is not None and float(value.get("montant_pret") or 0) == clause[1]
+        except (TypeError, ValueError):
+            explained = False
+        self._store("amount:" + text_key(clause[0]) if explained else text_key(text), value)
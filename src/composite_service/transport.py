@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Transport HTTP keep-alive du composite vers les services enfants:
+- Un pool de connexions persistantes par hôte (HTTP_POOL_SIZE connexions au plus)
+- Les connexions inactives depuis HTTP_POOL_IDLE_SECONDS sont fermées
+- Délais séparés de connexion (HTTP_CONNECT_TIMEOUT) et de lecture (HTTP_READ_TIMEOUT)
+- Une connexion inactive que le serveur a fermée entre-temps est détectée avant
+  l'envoi et remplacée par une neuve. Après une erreur de connexion, la requête
+  n'est rejouée (une fois) que si elle est idempotente (GET...) et partait d'une
+  connexion réutilisée : un appel SOAP (POST) déjà reçu par l'enfant n'est jamais rejoué
+- Les réponses sont demandées en gzip (Accept-Encoding) et décompressées à la réception
+
+``KeepAliveTransport`` branche ce pool sous suds ; le canal JSON l'utilise directement.
+"""
+
+import http.client
+import io
+import os
+import select
+import sys
+import threading
+import time
+from typing import Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from suds.transport import Reply, Transport, TransportError
+
+try:
+    from common.wire import decode_body
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.wire import decode_body
+
+# --- Configuration --- #
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+HTTP_POOL_IDLE_SECONDS = float(os.getenv("HTTP_POOL_IDLE_SECONDS", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+
+# Erreurs typiques d'une connexion keep-alive fermée côté serveur
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError,
+                 BrokenPipeError, ConnectionAbortedError)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+def _is_dropped(conn: http.client.HTTPConnection) -> bool:
+    """Vrai si la connexion inactive est lisible : fermée par le serveur (EOF) ou dans un état inattendu."""
+    if conn.sock is None:
+        return True
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class PoolExhausted(RuntimeError):
+    """Aucune connexion libérée vers l'hôte dans le délai de connexion."""
+
+
+class ConnectionPool:
+    """Connexions HTTP/1.1 persistantes vers un hôte, réutilisées en LIFO."""
+
+    def __init__(self, host: str, port: int, size: int = HTTP_POOL_SIZE, idle_seconds: float = HTTP_POOL_IDLE_SECONDS,
+                 connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT):
+        self.host, self.port = host, port
+        self.idle_seconds = idle_seconds
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle: List[Tuple[http.client.HTTPConnection, float]] = []
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.connect_timeout)
+        conn.connect()
+        conn.sock.settimeout(self.read_timeout)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _take_idle(self):
+        """Retourne une connexion inactive encore fraîche et ouverte (ou None) ; ferme les périmées."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [c for c, t in self._idle if now - t > self.idle_seconds]
+            self._idle = [(c, t) for c, t in self._idle if now - t <= self.idle_seconds]
+        for c in expired:
+            c.close()
+        while True:
+            with self._lock:
+                conn = self._idle.pop()[0] if self._idle else None
+            if conn is None or not _is_dropped(conn):
+                return conn
+            conn.close()
+
+    def _put_back(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+
+    def request(self, method: str, path: str, body: bytes = None, headers: Dict[str, str] = None,
+                timeout: float = None, idempotent: bool = None) -> Tuple[int, Dict[str, str], bytes]:
+        """
+        Exécute une requête et retourne (status, en-têtes, corps décompressé).
+        ``timeout`` remplace le délai de lecture. ``idempotent`` (par défaut : selon
+        la méthode) autorise un nouvel essai après une erreur sur une connexion réutilisée.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        headers = dict(headers or {})
+        if not any(k.lower() == "accept-encoding" for k in headers):
+            headers["Accept-Encoding"] = "gzip"
+        if not self._slots.acquire(timeout=self.connect_timeout):
+            raise PoolExhausted(f"No free connection to {self.host}:{self.port}")
+        try:
+            conn = self._take_idle()
+            reused = conn is not None
+            while True:
+                if conn is None:
+                    conn = self._new_connection()
+                try:
+                    conn.sock.settimeout(self.read_timeout if timeout is None else max(timeout, 0.001))
+                    conn.request(method, path, body, headers)
+                    response = conn.getresponse()
+                    payload = response.read()
+                    break
+                except _STALE_ERRORS:
+                    conn.close()
+                    if not (reused and idempotent):
+                        raise
+                    # Connexion réutilisée fermée par le serveur, requête rejouable : un seul nouvel essai
+                    conn, reused = None, False
+                except BaseException:
+                    conn.close()
+                    raise
+            if response.will_close:
+                conn.close()
+            else:
+                if reused:
+                    self.reused += 1
+                self._put_back(conn)
+            response_headers = dict(response.getheaders())
+            return response.status, response_headers, decode_body(response_headers, payload)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"idle": len(self._idle), "created": self.created, "reused": self.reused}
+
+
+_pools: Dict[Tuple[str, int], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(host: str, port: int) -> ConnectionPool:
+    """Pool partagé par tous les threads du processus pour (host, port)."""
+    key = (host, port)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(host, port)
+        return _pools[key]
+
+
+def pool_stats() -> Dict[str, Dict[str, int]]:
+    with _pools_lock:
+        return {f"{h}:{p}": pool.stats() for (h, p), pool in _pools.items()}
+
+
+def _split(url: str) -> Tuple[ConnectionPool, str]:
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    return get_pool(parts.hostname, parts.port or 80), path
+
+
+class KeepAliveTransport(Transport):
+    """
+    Transport suds au-dessus des pools keep-alive (HTTP seulement).
+    ``timeout`` (secondes), fixé par le canal avant un appel, remplace le délai de lecture.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.timeout = None
+
+    def open(self, request):
+        pool, path = _split(request.url)
+        status, _headers, payload = pool.request("GET", path, headers=request.headers)
+        if status != 200:
+            raise TransportError(f"HTTP {status}", status, io.BytesIO(payload))
+        return io.BytesIO(payload)
+
+    def send(self, request):
+        pool, path = _split(request.url)
+        status, headers, payload = pool.request("POST", path, request.message, request.headers, timeout=self.timeout)
+        if status in (202, 204):
+            return None
+        if status != 200:
+            # suds lit le corps (fault SOAP) depuis error.fp
+            raise TransportError(f"HTTP {status}", status, io.BytesIO(payload))
+        return Reply(200, headers, payload)
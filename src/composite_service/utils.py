@@ -3,81 +3,181 @@
 
 """
 Utilitaires du service composite (simplifié pour exécution synchrone):
-- Gestion de la base de données JSON
+- Gestion de la base de données JSON (état en mémoire + journal, voir journal.py)
 - Génération d'identifiants avec timestamp
 - Notifications par email automatiquement après décision
+- Maintien des index secondaires (voir index.py) à chaque validation du journal
+- Rétention : compaction des requêtes terminées anciennes vers les archives (voir archive.py)
+- Cache mémoire des enregistrements récents pour les lectures (voir hot_cache.py)
 """
 
+import atexit
 import json
+import logging
 import os
-from datetime import datetime
-from typing import Dict, Any
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+try:
+    from composite_service.index import index_requests, indexed_request, mark_archived, outcome_of, request_state
+    from composite_service.archive import append_records, find_archived
+    from composite_service.hot_cache import HotCache
+    from composite_service.journal import JOURNAL_PATH, RequestStore, load_state
+except ModuleNotFoundError:
+    from index import index_requests, indexed_request, mark_archived, outcome_of, request_state
+    from archive import append_records, find_archived
+    from hot_cache import HotCache
+    from journal import JOURNAL_PATH, RequestStore, load_state
+
 # --- Configuration Email --- #
 SENDER_EMAIL = "zinebfellati09@gmail.com"      # <-- ton email
 SENDER_PASSWORD = "fpgw aynq crqe vpdd"       # <-- mot de passe d'application Gmail
 RECIPIENT_EMAIL = "zinebfellati09@gmail.com"  # destinataire par défaut
 
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
+# Serveur SMTP : Gmail par défaut ; le puits local de tools/stand_ins.py pour les tests hors ligne
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "10"))
 
 # --- Chemins fichiers --- #
 DB_PATH = os.path.join(os.path.dirname(__file__), "database.json")
 LOG_PATH = os.path.join(os.path.dirname(__file__), "notifications.log")
 
+# --- Rétention --- #
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "30"))
+COMPACTION_INTERVAL_SECONDS = int(os.getenv("COMPACTION_INTERVAL_SECONDS", "3600"))  # 0 = désactivé
 
-# --- Base JSON --- #
-def ensure_db():
-    if not os.path.exists(DB_PATH):
-        with open(DB_PATH, "w", encoding="utf-8") as f:
-            json.dump({"requests": {}}, f, indent=2, ensure_ascii=False)
+# Enregistrements récents (écriture directe), revalidés par l'index tant qu'ils ne sont pas terminés
+HOT_CACHE = HotCache(request_state)
 
+_store = None
+_store_lock = threading.Lock()
 
-def read_db() -> Dict[str, Any]:
-    ensure_db()
-    try:
-        with open(DB_PATH, "r", encoding="utf-8") as f:
-            db = json.load(f)
-            if "requests" not in db:
-                db["requests"] = {}
-            return db
-    except (json.JSONDecodeError, FileNotFoundError):
-        write_db({"requests": {}})
-        return {"requests": {}}
 
+# --- Base JSON --- #
+def _index_entries(entries):
+    """Met à jour l'index pour un lot validé du journal (appelé par le thread écrivain)."""
+    rows = []
+    for entry in entries:
+        if entry["op"] != "put":
+            continue
+        fields = entry["fields"]
+        outcome = outcome_of(fields["result"]) if "result" in fields else None
+        result = json.dumps(fields["result"], ensure_ascii=False) if fields.get("result") is not None else None
+        rows.append((entry["id"], fields["status"], outcome, fields.get("email"),
+                     fields.get("timestamp", fields["last_update"]), fields["last_update"], result))
+    if rows:
+        index_requests(rows)
+
+
+def get_store() -> RequestStore:
+    """Magasin des requêtes de ce processus ; ouvert (et récupéré après crash) au premier appel."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = RequestStore(DB_PATH, JOURNAL_PATH, on_commit=_index_entries)
+            atexit.register(_store.flush, 5)
+        return _store
 
-def write_db(db: Dict[str, Any]):
-    ensure_db()
-    with open(DB_PATH, "w", encoding="utf-8") as f:
-        json.dump(db, f, indent=2, ensure_ascii=False)
+
+def read_db() -> Dict[str, Any]:
+    """Vue de la base ; hors du processus propriétaire du journal, lecture seule instantané + journal."""
+    if _store is not None:
+        return {"requests": dict(_store.items())}
+    return {"requests": load_state(DB_PATH, JOURNAL_PATH)}
 
 
 # --- Lifecycle helpers --- #
-def new_request_id(request_text: str) -> str:
+def new_request_id(request_text: str = None) -> str:
+    """Identifiant horodaté + 48 bits aléatoires : sans collision même à haut débit."""
     now = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    short_hash = abs(hash(request_text)) % 10000
-    return f"REQ_{now}_{short_hash}"
+    return f"REQ_{now}_{uuid.uuid4().hex[:12]}"
 
 
 def create_request(request_id: str, text: str):
-    db = read_db()
-    db["requests"].setdefault(request_id, {})
-    db["requests"][request_id].update({
+    now = datetime.utcnow().isoformat()
+    rec = get_store().put(request_id, {
         "text": text,
         "status": "processing",
-        "timestamp": datetime.utcnow().isoformat(),
-        "last_update": datetime.utcnow().isoformat(),
+        "timestamp": now,
+        "last_update": now,
         "result": None
     })
-    write_db(db)
+    HOT_CACHE.put(request_id, rec)
+
+
+def _load_record(request_id: str):
+    """Lit l'enregistrement (cache, puis magasin, puis archives) ; None si inconnu."""
+    record = HOT_CACHE.get(request_id)
+    if record is not None:
+        return record
+    rec = get_store().get(request_id)
+    indexed = None if rec is not None and rec.get("status") == "done" else indexed_request(request_id)
+    if indexed is not None and (rec is None or indexed["last_update"] > rec.get("last_update", "")):
+        # Modifié par une autre réplique (pas forcément encore consolidé dans database.json) :
+        # statut et décision viennent de l'index, le texte de notre copie s'il y en a une
+        rec = {"text": None, **(rec or {}), **indexed}
+    if rec is None:
+        rec = find_archived(request_id)
+    return HOT_CACHE.put(request_id, rec) if rec is not None else None
 
 
 def get_request(request_id: str) -> Dict[str, Any]:
-    db = read_db()
-    return db.get("requests", {}).get(request_id)
+    record = _load_record(request_id)
+    return record.to_dict() if record is not None else None
+
+
+def get_request_json(request_id: str) -> str:
+    """Enregistrement encodé en JSON (réponse de getResult), None si inconnu."""
+    record = _load_record(request_id)
+    return record.response_json() if record is not None else None
+
+
+# --- Rétention / compaction --- #
+def compact_db(max_age_days: float = None) -> int:
+    """Déplace les requêtes terminées plus anciennes que ``max_age_days`` vers les archives."""
+    if max_age_days is None:
+        max_age_days = RETENTION_DAYS
+    cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).isoformat()
+    store = get_store()
+    expired = [
+        (request_id, rec) for request_id, rec in store.items()
+        if rec.get("status") == "done" and rec.get("last_update", "") < cutoff
+    ]
+    if not expired:
+        return 0
+    # Archiver d'abord (fsync), marquer l'index (l'export lit les archives), puis retirer du magasin chaud
+    append_records(expired)
+    mark_archived(request_id for request_id, _ in expired)
+    store.delete(request_id for request_id, _ in expired)
+    return len(expired)
+
+
+def start_compaction_job(interval_seconds: int = None) -> threading.Thread:
+    """Lance la compaction périodique dans un thread de fond (None si désactivée)."""
+    interval = COMPACTION_INTERVAL_SECONDS if interval_seconds is None else interval_seconds
+    if interval <= 0:
+        return None
+
+    def loop():
+        stop = threading.Event()
+        while not stop.wait(interval):
+            try:
+                moved = compact_db()
+                if moved:
+                    logging.getLogger("composite").info("[Compaction] %s request(s) archived", moved)
+            except Exception as e:
+                logging.getLogger("composite").error("[Compaction] Error: %s", e)
+
+    thread = threading.Thread(target=loop, name="compaction", daemon=True)
+    thread.start()
+    return thread
 
 
 # --- Notifications --- #
@@ -124,8 +224,9 @@ Décision (résumé) :
 """
         msg.attach(MIMEText(body, "plain", "utf-8"))
 
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
+        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS) as server:
+            if SMTP_STARTTLS:
+                server.starttls()
             server.login(SENDER_EMAIL, SENDER_PASSWORD)
             server.send_message(msg)
 
@@ -137,15 +238,17 @@ Décision (résumé) :
 
 
 # --- Save decision et notification automatique --- #
-def save_decision(request_id: str, decision: Dict[str, Any], to_email: str = None):
-    db = read_db()
-    db["requests"].setdefault(request_id, {})
-    db["requests"][request_id].update({
+def save_decision(request_id: str, decision: Dict[str, Any], to_email: str = None, email: str = None):
+    """Enregistre la décision ; ``email`` (email du demandeur) est stocké et indexé, ``to_email`` sert à la notification."""
+    fields = {
         "result": decision,
         "status": "done",
         "last_update": datetime.utcnow().isoformat()
-    })
-    write_db(db)
+    }
+    if email:
+        fields["email"] = email
+    rec = get_store().put(request_id, fields)
+    HOT_CACHE.put(request_id, rec)
 
     # Envoi automatique de l'email après décision
     notify(request_id, "La décision finale a été prise pour votre demande.", to_email)
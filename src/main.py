@@ -3,27 +3,58 @@ import subprocess
 import time
 import signal
 import sys
+import urllib.request
 
 # --- CONFIG --- #
+# (name, script, port, readiness path: answers 200 once the service can respond)
 SERVICES = [
-    ("Information Extraction", "services/information_extraction.py", 8001),
-    ("Credit Check", "services/credit_check.py", 8002),
-    ("Property Evaluation", "services/property_evaluation.py", 8003),
-    ("Decision Service", "services/decision_service.py", 8004),
-    ("Composite Service", "composite_service/service_composite.py", 8000),
+    ("Information Extraction", "services/information_extraction.py", 8001, "/ready"),
+    ("Credit Check", "services/credit_check.py", 8002, "/CreditCheckService?wsdl"),
+    ("Property Evaluation", "services/property_evaluation.py", 8003, "/PropertyEvaluationService?wsdl"),
+    ("Decision Service", "services/decision_service.py", 8004, "/DecisionService?wsdl"),
+    ("Composite Service", "composite_service/service_composite.py", 8000, "/LoanEvaluationService?wsdl"),
 ]
+READY_TIMEOUT_SECONDS = float(os.getenv("READY_TIMEOUT_SECONDS", "30"))
+READY_POLL_SECONDS = 0.1
+
+# STAND_INS=1: also start the local Gemini / SMTP stand-ins and point the services at them
+STAND_INS = os.getenv("STAND_INS", "0") == "1"
+STAND_IN_SERVICE = ("Stand-ins", "tools/stand_ins.py", int(os.getenv("LLM_STAND_IN_PORT", "8010")), "/ready")
+STAND_IN_ENV = {
+    "GEMINI_BACKEND": "stand-in",
+    "GEMINI_STAND_IN_URL": f"http://127.0.0.1:{STAND_IN_SERVICE[2]}",
+    "SMTP_SERVER": "127.0.0.1",
+    "SMTP_PORT": os.getenv("SMTP_STAND_IN_PORT", "8025"),
+    "SMTP_STARTTLS": "0",
+}
 
 PYTHON = sys.executable  # uses current environment's Python
 PROCESSES = []
 
 
-def run_service(name, script, port):
-    """Start one service as a detached subprocess."""
+def wait_ready(proc, port, path, started):
+    """Poll the readiness URL until it answers 200; returns the time to ready (seconds) or None."""
+    url = f"http://127.0.0.1:{port}{path}"
+    deadline = started + READY_TIMEOUT_SECONDS
+    while time.monotonic() < deadline and proc.poll() is None:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.monotonic() - started
+        except OSError:
+            pass  # port not open yet, or 503 while warming up
+        time.sleep(READY_POLL_SECONDS)
+    return None
+
+
+def run_service(name, script, port, ready_path):
+    """Start one service as a detached subprocess and wait until it is ready."""
     print(f"🚀 Starting {name} on port {port}...")
     log_dir = os.path.join(os.path.dirname(__file__), "logs")
     os.makedirs(log_dir, exist_ok=True)
     log_file = os.path.join(log_dir, f"{name.replace(' ', '_').lower()}.log")
 
+    started = time.monotonic()
     with open(log_file, "w", encoding="utf-8") as f:
         # Start without piping stdout/stderr to prevent blocking
         proc = subprocess.Popen(
@@ -34,10 +65,12 @@ def run_service(name, script, port):
         )
 
     PROCESSES.append((name, proc))
-    time.sleep(1)
+    ready_after = wait_ready(proc, port, ready_path, started)
 
-    if proc.poll() is None:
-        print(f"✅ {name} running (PID: {proc.pid}) → logs in {log_file}")
+    if ready_after is not None:
+        print(f"✅ {name} ready in {ready_after:.2f}s (PID: {proc.pid}) → logs in {log_file}")
+    elif proc.poll() is None:
+        print(f"⚠️ {name} running (PID: {proc.pid}) but not ready after {READY_TIMEOUT_SECONDS:.0f}s → {log_file}")
     else:
         print(f"❌ Failed to start {name}")
     return proc
@@ -48,13 +81,18 @@ def start_all():
     base_path = os.path.dirname(os.path.abspath(__file__))
     os.chdir(base_path)
 
-    for name, script, port in SERVICES:
+    services = SERVICES
+    if STAND_INS:
+        for key, value in STAND_IN_ENV.items():
+            os.environ.setdefault(key, value)  # inherited by the service processes
+        services = [STAND_IN_SERVICE] + SERVICES
+
+    for name, script, port, ready_path in services:
         script_path = os.path.join(base_path, script)
         if not os.path.exists(script_path):
             print(f"⚠️ Warning: script not found -> {script_path}")
             continue
-        run_service(name, script_path, port)
-        time.sleep(2)
+        run_service(name, script_path, port, ready_path)
 
     print("\n🌐 All services started successfully!\n")
     print("🧩 Composite service is available at:")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Prêt amortissable à mensualités constantes (annuités).
+
+- Mensualité = capital × facteur d'annuité, facteur = r / (1 - (1 + r)^-n)
+  avec r le taux mensuel et n le nombre de mensualités
+- Les facteurs sont précalculés sur une grille taux × durée : taux annuels de 0
+  à ANNUITY_MAX_RATE % par pas de 0,01 point (la tarification au risque arrondit
+  au centième, donc tout taux produit par la politique tombe sur la grille),
+  durées de LOAN_TERM_GRID_MONTHS ; la table d'une durée hors grille est
+  calculée à sa première utilisation. Par requête : une lecture de table
+- Un taux hors grille (plus fin que le centième, ou au-delà du maximum) est
+  calculé directement
+- Le tableau d'amortissement est produit à la demande, ligne par ligne
+"""
+
+import os
+import threading
+from array import array
+from typing import Dict, Iterator, List, Sequence
+
+DEFAULT_LOAN_TERM_MONTHS = int(os.getenv("DEFAULT_LOAN_TERM_MONTHS", "240"))
+ANNUITY_MAX_RATE = float(os.getenv("ANNUITY_MAX_RATE", "30"))
+LOAN_TERM_GRID_MONTHS = tuple(sorted({*range(60, 361, 60), DEFAULT_LOAN_TERM_MONTHS}))
+MAX_LOAN_TERM_MONTHS = 600
+
+RATE_STEPS_PER_POINT = 100  # pas de la grille : 0,01 point de taux annuel
+
+
+def annuity_factor(annual_rate: float, term_months: int) -> float:
+    """Mensualité pour un capital de 1 (taux annuel en %)."""
+    r = annual_rate / 1200.0
+    if r == 0:
+        return 1.0 / term_months
+    return r / (1.0 - (1.0 + r) ** -term_months)
+
+
+def _build_table(term_months: int) -> array:
+    steps = int(round(ANNUITY_MAX_RATE * RATE_STEPS_PER_POINT))
+    return array("d", (annuity_factor(i / RATE_STEPS_PER_POINT, term_months) for i in range(steps + 1)))
+
+
+_tables: Dict[int, array] = {term: _build_table(term) for term in LOAN_TERM_GRID_MONTHS}
+_tables_lock = threading.Lock()
+
+
+def check_term(term_months) -> int:
+    term = int(term_months)
+    if not 1 <= term <= MAX_LOAN_TERM_MONTHS:
+        raise ValueError(f"loan term must be between 1 and {MAX_LOAN_TERM_MONTHS} months, got {term_months}")
+    return term
+
+
+def factor_table(term_months: int) -> array:
+    """Facteurs d'annuité de la durée, indexés par taux × RATE_STEPS_PER_POINT."""
+    table = _tables.get(term_months)
+    if table is None:
+        with _tables_lock:
+            table = _tables.get(term_months)
+            if table is None:
+                table = _tables[term_months] = _build_table(check_term(term_months))
+    return table
+
+
+def _lookup(table: array, annual_rate: float, term_months: int) -> float:
+    position = annual_rate * RATE_STEPS_PER_POINT
+    index = int(round(position))
+    if 0 <= index < len(table) and abs(position - index) < 1e-6:
+        return table[index]
+    return annuity_factor(annual_rate, term_months)
+
+
+def payment_factor(annual_rate: float, term_months: int) -> float:
+    return _lookup(factor_table(term_months), annual_rate, term_months)
+
+
+def monthly_payment(principal: float, annual_rate: float, term_months: int = DEFAULT_LOAN_TERM_MONTHS) -> float:
+    return principal * payment_factor(annual_rate, term_months) if principal > 0 else 0.0
+
+
+def monthly_payments(principals: Sequence[float], annual_rates: Sequence[float],
+                     terms: Sequence[int]) -> List[float]:
+    """monthly_payment sur des colonnes (même longueur) : une lecture de table par ligne."""
+    tables = {term: factor_table(term) for term in set(terms)}
+    return [principal * _lookup(tables[term], rate, term) if principal > 0 else 0.0
+            for principal, rate, term in zip(principals, annual_rates, terms)]
+
+
+def amortization_summary(principal: float, annual_rate: float, term_months: int) -> Dict[str, float]:
+    payment = monthly_payment(principal, annual_rate, term_months)
+    total = payment * term_months
+    return {
+        "term_months": term_months,
+        "monthly_payment": round(payment, 2),
+        "total_paid": round(total, 2),
+        "total_interest": round(total - principal, 2) if principal > 0 else 0.0,
+    }
+
+
+def amortization_schedule(principal: float, annual_rate: float, term_months: int) -> Iterator[Dict[str, float]]:
+    """Tableau d'amortissement, une ligne par mensualité (générateur : rien n'est calculé d'avance)."""
+    if principal <= 0:
+        return
+    r = annual_rate / 1200.0
+    payment = monthly_payment(principal, annual_rate, term_months)
+    balance = principal
+    for month in range(1, term_months + 1):
+        interest = balance * r
+        # la dernière mensualité solde exactement le capital restant
+        amortized = balance if month == term_months else payment - interest
+        balance -= amortized
+        yield {
+            "month": month,
+            "payment": round(amortized + interest, 2),
+            "principal": round(amortized, 2),
+            "interest": round(interest, 2),
+            "balance": round(max(balance, 0.0), 2),
+        }
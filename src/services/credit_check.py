@@ -1,10 +1,27 @@
-import sys, logging, json, random
+import sys, os, logging, json, random
 from spyne import Application, rpc, ServiceBase, Unicode
+from spyne.error import Fault
 from spyne.protocol.soap import Soap11
-from spyne.server.wsgi import WsgiApplication
 from spyne.util.wsgi_wrapper import run_twisted
 
-logging.basicConfig(level=logging.INFO)
+# Import utilitaires partagés (robuste pour exécution en package ou directe)
+try:
+    from common.log_setup import setup_logging, log_payload
+    from common.bindings import json_application, wsgi_endpoints
+    from common.models import ExtractedApplication, CreditResult, CreditBureau, to_model, to_dict
+    from common.deadline import enforce_deadlines
+    from common.profiling import enable_profiling, profiling_wsgi_app
+    from common.wire import dumps, full_detail
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.log_setup import setup_logging, log_payload
+    from common.bindings import json_application, wsgi_endpoints
+    from common.models import ExtractedApplication, CreditResult, CreditBureau, to_model, to_dict
+    from common.deadline import enforce_deadlines
+    from common.profiling import enable_profiling, profiling_wsgi_app
+    from common.wire import dumps, full_detail
+
+logger = setup_logging("credit_check")
 
 
 # ---------------------------------------------------------------------
@@ -87,13 +104,14 @@ class CreditCheckService(ServiceBase):
         try:
             parsed = json.loads(data)
         except Exception as e:
-            return json.dumps({"status": "error", "message": f"Invalid JSON: {e}"})
+            return dumps({"status": "error", "message": f"Invalid JSON: {e}"})
 
         try:
             score, bureau_data = compute_credit_score(parsed)
-            result = {
-                "credit_score": score,
-                "details": {
+            result = {"credit_score": score}
+            if full_detail(ctx):
+                # Sous-objet d'audit : entrées reprises et rapport du bureau de crédit
+                result["details"] = {
                     "revenu_mensuel": parsed.get("revenu_mensuel"),
                     "depenses_mensuelles": parsed.get("depenses_mensuelles"),
                     "montant_pret": parsed.get("montant_pret"),
@@ -103,12 +121,24 @@ class CreditCheckService(ServiceBase):
                     "emploi_stable": parsed.get("emploi_stable"),
                     "credit_bureau": bureau_data
                 }
-            }
-            logging.info(f"[CreditCheck] Calculated score: {score} for {parsed.get('nom')}")
-            return json.dumps(result, indent=2, ensure_ascii=False)
+            logger.info("[CreditCheck] Calculated score: %s for %s", score, parsed.get("nom"))
+            log_payload(logger, "[CreditCheck] Result", result)
+            return dumps(result)
         except Exception as e:
-            logging.error(f"[CreditCheck] Error: {e}")
-            return json.dumps({"status": "error", "message": str(e)})
+            logger.error("[CreditCheck] Error: %s", e)
+            return dumps({"status": "error", "message": str(e)})
+
+    @rpc(ExtractedApplication, _returns=CreditResult)
+    def check_credit_typed(ctx, application):
+        """Variante typée de check_credit : ExtractedApplication -> CreditResult."""
+        try:
+            score, bureau_data = compute_credit_score(to_dict(application))
+        except Exception as e:
+            logger.error("[CreditCheck] Error: %s", e)
+            raise Fault(faultcode="Server", faultstring=str(e))
+        logger.info("[CreditCheck] Calculated score: %s for %s", score, application.nom)
+        log_payload(logger, "[CreditCheck] Result", {"credit_score": score, "credit_bureau": bureau_data})
+        return CreditResult(credit_score=score, credit_bureau=to_model(CreditBureau, bureau_data))
 
 
 # ---------------------------------------------------------------------
@@ -121,5 +151,11 @@ app = Application(
     out_protocol=Soap11()
 )
 
+# Liaison JSON/HTTP pour les appels internes (sans validation de schéma)
+json_app = json_application([CreditCheckService], tns='loan.services.credit')
+enforce_deadlines("CreditCheck", logger, app, json_app)
+enable_profiling("credit_check", logger, app, json_app)
+
 if __name__ == '__main__':
-    sys.exit(run_twisted([(WsgiApplication(app), b'CreditCheckService')], 8002))
+    endpoints = wsgi_endpoints(app, json_app, 'CreditCheckService') + [(profiling_wsgi_app, b'profiling')]
+    sys.exit(run_twisted(endpoints, 8002))
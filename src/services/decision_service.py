@@ -1,22 +1,44 @@
-import sys, logging, json, random
+import sys, os, logging, json
 from spyne import Application, rpc, ServiceBase, Unicode
+from spyne.error import Fault
 from spyne.protocol.soap import Soap11
-from spyne.server.wsgi import WsgiApplication
 from spyne.util.wsgi_wrapper import run_twisted
 
-logging.basicConfig(level=logging.INFO)
+# Import utilitaires partagés (robuste pour exécution en package ou directe)
+try:
+    from common.log_setup import setup_logging, log_payload
+    from common.bindings import json_application, wsgi_endpoints
+    from common.models import DecisionInput, Decision, RiskDetails, Amortization, to_model, to_dict
+    from common.deadline import enforce_deadlines
+    from common.profiling import enable_profiling, profiling_wsgi_app
+    from common.wire import dumps
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.log_setup import setup_logging, log_payload
+    from common.bindings import json_application, wsgi_endpoints
+    from common.models import DecisionInput, Decision, RiskDetails, Amortization, to_model, to_dict
+    from common.deadline import enforce_deadlines
+    from common.profiling import enable_profiling, profiling_wsgi_app
+    from common.wire import dumps
+
+try:
+    from services.policy_engine import PolicyStore
+    from services.amortization import (DEFAULT_LOAN_TERM_MONTHS, check_term, monthly_payments,
+                                       amortization_summary, amortization_schedule)
+except ModuleNotFoundError:
+    from policy_engine import PolicyStore
+    from amortization import (DEFAULT_LOAN_TERM_MONTHS, check_term, monthly_payments,
+                              amortization_summary, amortization_schedule)
+
+logger = setup_logging("decision_service")
 
 
 # ---------------------------------------------------------------------
-# Institutional Policy Parameters (Balanced for Realistic Outcomes)
+# Institutional Policy (rules file, compiled and hot-reloaded)
 # ---------------------------------------------------------------------
 
-POLICY = {
-    "min_credit_score": 40,           # Slightly lower threshold
-    "max_loan_to_value": 0.9,         # Slightly higher tolerance
-    "max_debt_to_income": 0.5,        # Allow higher ratio for realistic middle-class loans
-    "base_interest_rate": 3.0,        # %
-}
+# Thresholds, base rate and messages live in policy_rules.json (POLICY_RULES_PATH)
+POLICIES = PolicyStore()
 
 
 # ---------------------------------------------------------------------
@@ -62,117 +84,93 @@ POLICY = {
 #         "default_probability": default_prob
 #     }
 
-def analyze_risk(data):
-    """Perform a balanced financial and risk analysis."""
-    credit_score = float(data.get("credit_score", 0))
-    property_value = float(data.get("property_value", 0))
-    loan_amount = float(data.get("loan_amount", 0))
-    income = float(data.get("revenu_mensuel", 0))
-    expenses = float(data.get("depenses_mensuelles", 0))
-    employment_stable = data.get("emploi_stable", True)
-
-    # Derived metrics
-    monthly_savings = max(0, income - expenses)
-    
-    # --- Debt-to-Income ratio (more realistic) ---
-    # Approximate monthly loan repayment ≈ 1% of the loan amount
-    estimated_monthly_payment = loan_amount * 0.01
-    debt_to_income = estimated_monthly_payment / income if income > 0 else 1
+# The priced rate depends on the risk score, which depends on the DTI, which depends on the
+# rate: iterate from the base rate (monotone, converges in a few steps at 0.01 precision)
+MAX_RATE_ITERATIONS = 20
+
+
+def loan_term_of(data):
+    """Requested term in months (``loan_term_months``), DEFAULT_LOAN_TERM_MONTHS otherwise."""
+    term = data.get("loan_term_months")
+    return check_term(term) if term else DEFAULT_LOAN_TERM_MONTHS
+
+
+def analyze_risk_batch(rows, policy=None):
+    """
+    analyze_risk over a batch, column by column: the static part of the score is computed
+    once per row, then the rate / DTI fixed point is iterated on the whole batch with one
+    annuity-table lookup per row still moving.
+    """
+    policy = policy or POLICIES.current
+    w_credit, w_ltv, w_dti, w_employment = policy.risk_weights
+    n = len(rows)
+    credit = [float(d.get("credit_score", 0)) for d in rows]
+    values = [float(d.get("property_value", 0)) for d in rows]
+    loans = [float(d.get("loan_amount", 0)) for d in rows]
+    incomes = [float(d.get("revenu_mensuel", 0)) for d in rows]
+    expenses = [float(d.get("depenses_mensuelles", 0)) for d in rows]
+    stable = [d.get("emploi_stable", True) for d in rows]
+    terms = [loan_term_of(d) for d in rows]
 
     # Loan-to-Value ratio
-    loan_to_value = loan_amount / property_value if property_value > 0 else 1
-
-    # --- Balanced risk score heuristic ---
-    risk_score = (
-        (credit_score / 100) * 0.6
-        + (1 - loan_to_value) * 0.2
-        + (1 - min(debt_to_income, 1)) * 0.15
-        + (0.05 if employment_stable else 0)
-    )
-    risk_score = min(max(risk_score, 0), 1)
-    default_prob = round((1 - risk_score) * 100, 2)
-
-    return {
-        "credit_score": credit_score,
-        "loan_amount": loan_amount,
-        "property_value": property_value,
-        "loan_to_value": round(loan_to_value, 2),
-        "debt_to_income": round(debt_to_income, 2),
-        "monthly_savings": round(monthly_savings, 2),
-        "employment_stable": employment_stable,
-        "risk_score": round(risk_score * 100, 2),
-        "default_probability": default_prob
-    }
-
-
-def apply_policies(risk_data):
-    """Apply institutional rules and return detailed reasoning."""
-    approved = True
-    reasons = []
-    recommendations = []
-
-    # --- Credit score policy ---
-    if risk_data["credit_score"] < POLICY["min_credit_score"]:
-        approved = False
-        reasons.append(
-            f"Credit score ({risk_data['credit_score']}) is below the minimum threshold ({POLICY['min_credit_score']})."
-        )
-        recommendations.append(
-            "Improve your credit score by paying bills on time, reducing outstanding debts, and avoiding new credit requests."
-        )
-
-    # --- Loan-to-value policy ---
-    if risk_data["loan_to_value"] > POLICY["max_loan_to_value"]:
-        approved = False
-        reasons.append(
-            f"Loan-to-Value ratio ({risk_data['loan_to_value']:.2f}) exceeds the acceptable limit ({POLICY['max_loan_to_value']})."
-        )
-        recommendations.append(
-            "Increase your down payment or consider a lower loan amount to improve your loan-to-value ratio."
-        )
-
-    # --- Debt-to-income policy ---
-    if risk_data["debt_to_income"] > POLICY["max_debt_to_income"]:
-        # Only critical if ratio > 0.6 (less strict for mid-range cases)
-        if risk_data["debt_to_income"] > 0.6:
-            approved = False
-        reasons.append(
-            f"Debt-to-Income ratio ({risk_data['debt_to_income']:.2f}) is higher than the recommended maximum ({POLICY['max_debt_to_income']})."
-        )
-        recommendations.append(
-            "Try to increase your income or reduce your monthly expenses to improve your debt ratio."
-        )
-
-    # --- Global risk score ---
-    if risk_data["risk_score"] < 35:
-        approved = False
-        reasons.append(
-            f"Global risk score ({risk_data['risk_score']}) is too low, indicating a high probability of default."
-        )
-        recommendations.append(
-            "Work on improving your financial stability and credit behavior before reapplying."
-        )
-
-    # --- Employment stability ---
-    if not risk_data["employment_stable"]:
-        approved = False
-        reasons.append("Employment instability detected.")
-        recommendations.append(
-            "Consider applying once your employment situation has stabilized or provide additional financial guarantees."
-        )
-
-    # --- Interest rate calculation (risk-based pricing) ---
-    base_rate = POLICY["base_interest_rate"]
-    # More moderate slope for interest rate changes
-    risk_adjustment = (100 - risk_data["risk_score"]) / 25
-    interest_rate = round(base_rate + risk_adjustment, 2)
-
-    # If approved, provide positive message
-    if approved:
-        reasons.append("Applicant meets institutional risk and policy requirements.")
-        recommendations.append("Maintain your strong financial profile and responsible credit behavior.")
-
-    return approved, reasons, recommendations, interest_rate
+    ltv = [loans[i] / values[i] if values[i] > 0 else 1 for i in range(n)]
+    static = [(credit[i] / 100) * w_credit + (1 - ltv[i]) * w_ltv + (w_employment if stable[i] else 0)
+              for i in range(n)]
+
+    # --- Debt-to-Income ratio: annuity at the risk-priced rate over the loan term ---
+    rates = [policy.base_interest_rate] * n
+    payments, dti, scores = [0.0] * n, [1.0] * n, [0.0] * n
+    moving = list(range(n))
+    for _ in range(MAX_RATE_ITERATIONS):
+        paid = monthly_payments([loans[i] for i in moving], [rates[i] for i in moving], [terms[i] for i in moving])
+        still = []
+        for i, payment in zip(moving, paid):
+            payments[i] = payment
+            dti[i] = payment / incomes[i] if incomes[i] > 0 else 1
+            scores[i] = min(max(static[i] + (1 - min(dti[i], 1)) * w_dti, 0), 1)
+            rate = policy.interest_rate(round(scores[i] * 100, 2))
+            if rate != rates[i]:
+                rates[i] = rate
+                still.append(i)
+        moving = still
+        if not moving:
+            break
+
+    return [{
+        "credit_score": credit[i],
+        "loan_amount": loans[i],
+        "property_value": values[i],
+        "loan_to_value": round(ltv[i], 2),
+        "debt_to_income": round(dti[i], 2),
+        "monthly_savings": round(max(0, incomes[i] - expenses[i]), 2),
+        "employment_stable": stable[i],
+        "risk_score": round(scores[i] * 100, 2),
+        "default_probability": round((1 - scores[i]) * 100, 2),
+        "monthly_payment": round(payments[i], 2),
+        "loan_term_months": terms[i],
+        # raw inputs, kept so that stored decisions can be re-scored (backtesting)
+        "monthly_income": incomes[i],
+        "monthly_expenses": expenses[i]
+    } for i in range(n)]
+
+
+def analyze_risk(data, policy=None):
+    """Perform a balanced financial and risk analysis (weights from the current policy by default)."""
+    return analyze_risk_batch([data], policy)[0]
+
+
+def amortization_details(risk_data, rate, include_schedule=False):
+    """Repayment summary; the month-by-month schedule is generated only when asked for."""
+    summary = amortization_summary(risk_data["loan_amount"], rate, risk_data["loan_term_months"])
+    if include_schedule:
+        summary["schedule"] = list(amortization_schedule(risk_data["loan_amount"], rate,
+                                                         risk_data["loan_term_months"]))
+    return summary
+
+
+def apply_policies(risk_data, policy=None):
+    """Apply institutional rules and return detailed reasoning (current policy by default)."""
+    return (policy or POLICIES.current).evaluate(risk_data)
 
 
 # ---------------------------------------------------------------------
@@ -186,12 +184,13 @@ class DecisionService(ServiceBase):
         try:
             parsed = json.loads(data)
         except Exception as e:
-            logging.error(f"[Decision] Invalid JSON: {e}")
-            return json.dumps({"status": "error", "message": str(e)})
+            logger.error("[Decision] Invalid JSON: %s", e)
+            return dumps({"status": "error", "message": str(e)})
 
         try:
-            risk_data = analyze_risk(parsed)
-            approved, reasons, recommendations, rate = apply_policies(risk_data)
+            policy = POLICIES.current  # figée pour toute la durée de la requête
+            risk_data = analyze_risk(parsed, policy)
+            approved, reasons, recommendations, rate = apply_policies(risk_data, policy)
 
             decision = {
                 "approved": approved,
@@ -200,15 +199,47 @@ class DecisionService(ServiceBase):
                 "risk_details": risk_data,
                 "reasons": reasons,
                 "recommendations": recommendations,
-                "message": "✅ Approved" if approved else "❌ Rejected"
+                "message": "✅ Approved" if approved else "❌ Rejected",
+                "policy_version": policy.version,
+                "amortization": amortization_details(risk_data, rate, bool(parsed.get("include_schedule")))
             }
 
-            logging.info(f"[Decision] {decision['message']} | Rate: {rate}%")
-            return json.dumps(decision, indent=2, ensure_ascii=False)
+            logger.info("[Decision] %s | Rate: %s%%", decision["message"], rate)
+            log_payload(logger, "[Decision] Result", decision)
+            return dumps(decision)
 
         except Exception as e:
-            logging.error(f"[Decision] Error during processing: {e}")
-            return json.dumps({"status": "error", "message": str(e)})
+            logger.error("[Decision] Error during processing: %s", e)
+            return dumps({"status": "error", "message": str(e)})
+
+    @rpc(DecisionInput, _returns=Decision)
+    def make_decision_typed(ctx, data):
+        """Variante typée de make_decision : DecisionInput -> Decision."""
+        try:
+            policy = POLICIES.current
+            data = to_dict(data)
+            risk_data = analyze_risk(data, policy)
+            approved, reasons, recommendations, rate = apply_policies(risk_data, policy)
+            details = amortization_details(risk_data, rate, bool(data.get("include_schedule")))
+        except Exception as e:
+            logger.error("[Decision] Error during processing: %s", e)
+            raise Fault(faultcode="Server", faultstring=str(e))
+
+        message = "✅ Approved" if approved else "❌ Rejected"
+        logger.info("[Decision] %s | Rate: %s%%", message, rate)
+        log_payload(logger, "[Decision] Result", {"approved": approved, "interest_rate": rate, "risk_details": risk_data,
+                                                  "reasons": reasons, "policy_version": policy.version})
+        return Decision(
+            approved=approved,
+            interest_rate=rate,
+            loan_amount=risk_data["loan_amount"],
+            risk_details=to_model(RiskDetails, risk_data),
+            reasons=reasons,
+            recommendations=recommendations,
+            message=message,
+            policy_version=policy.version,
+            amortization=to_model(Amortization, details),
+        )
 
 
 # ---------------------------------------------------------------------
@@ -222,5 +253,12 @@ app = Application(
     out_protocol=Soap11()
 )
 
+# Liaison JSON/HTTP pour les appels internes (sans validation de schéma)
+json_app = json_application([DecisionService], tns='loan.services.decision')
+enforce_deadlines("Decision", logger, app, json_app)
+enable_profiling("decision_service", logger, app, json_app)
+
 if __name__ == '__main__':
-    sys.exit(run_twisted([(WsgiApplication(app), b'DecisionService')], 8004))
+    POLICIES.start_watcher()
+    endpoints = wsgi_endpoints(app, json_app, 'DecisionService') + [(profiling_wsgi_app, b'profiling')]
+    sys.exit(run_twisted(endpoints, 8004))
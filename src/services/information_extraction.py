@@ -1,34 +1,155 @@
+import time
+
+_PROCESS_STARTED = time.monotonic()
+
 import os
 import re
+import sys
 import json
+import threading
 import unicodedata
 import logging
+import urllib.request
+from types import SimpleNamespace
 from spyne import Application, rpc, ServiceBase, Unicode
 from spyne.protocol.soap import Soap11
 from spyne.server.wsgi import WsgiApplication
-from wsgiref.simple_server import make_server
-import google.generativeai as genai
+from spyne.util.wsgi_wrapper import run_twisted
+
+# Import utilitaires partagés (robuste pour exécution en package ou directe)
+try:
+    from common.log_setup import setup_logging, log_payload
+    from common.bindings import json_application, wsgi_endpoints, readiness_wsgi_app_for
+    from common.models import ExtractedApplication, to_model
+    from common.deadline import enforce_deadlines, current_deadline
+    from common.profiling import enable_profiling, profiling_wsgi_app
+    from common.wire import dumps, full_detail
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.log_setup import setup_logging, log_payload
+    from common.bindings import json_application, wsgi_endpoints, readiness_wsgi_app_for
+    from common.models import ExtractedApplication, to_model
+    from common.deadline import enforce_deadlines, current_deadline
+    from common.profiling import enable_profiling, profiling_wsgi_app
+    from common.wire import dumps, full_detail
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+# "google" (API Gemini, clé GOOGLE_API_KEY du .env) ou "stand-in" (doublure locale, tools/stand_ins.py)
+GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "google").lower()
+GEMINI_STAND_IN_URL = os.getenv("GEMINI_STAND_IN_URL", "http://127.0.0.1:8010")
+# Délai d'attente d'un appel Gemini sans deadline (secondes, 0 = aucun)
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+# En dessous de ce budget restant (secondes), on passe directement au fallback regex
+GEMINI_MIN_BUDGET_SECONDS = float(os.getenv("GEMINI_MIN_BUDGET_SECONDS", "1.0"))
+logger = setup_logging("information_extraction")
+
+
+# ---------------------------------------------------------------------
+# Dépendances paresseuses et warm-up
+# ---------------------------------------------------------------------
+# google.generativeai et dotenv ne sont importés que par le warm-up (ou le premier
+# appel Gemini) : le port s'ouvre sans les attendre.
+_model = None
+_model_lock = threading.Lock()
+
+
+class StandInModel:
+    """Client de la doublure Gemini locale (REST generateContent), même forme d'appel que GenerativeModel."""
+
+    def __init__(self, base_url: str, model: str):
+        self.url = f"{base_url.rstrip('/')}/v1beta/models/{model}:generateContent"
+
+    def generate_content(self, prompt: str, request_options: dict = None):
+        timeout = (request_options or {}).get("timeout")
+        body = json.dumps({"contents": [{"role": "user", "parts": [{"text": prompt}]}]}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            payload = json.loads(response.read())
+        parts = payload["candidates"][0]["content"]["parts"]
+        return SimpleNamespace(text="".join(p.get("text", "") for p in parts))
+
+
+def _gemini_model():
+    """Modèle Gemini, construit une seule fois (import du SDK, .env, configure ; ou la doublure locale)."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None and GEMINI_BACKEND == "stand-in":
+                _model = StandInModel(GEMINI_STAND_IN_URL, GEMINI_MODEL)
+            elif _model is None:
+                from dotenv import load_dotenv
+                import google.generativeai as genai
+
+                load_dotenv()
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                _model = genai.GenerativeModel(GEMINI_MODEL)
+    return _model
+
+
+# Motifs d'extraction, compilés par le warm-up (ou au premier usage)
+_PATTERN_SOURCES = {
+    "whitespace": r"\s+",
+    "non_numeric": r"[^\d,.\-]",
+    "nom": r"(?:Nom du Client|Nom)\s*[:\-]?\s*([A-Za-zÀ-ÖØ-öø-ÿ' \-]+)",
+    "adresse": r"(?:Adresse|Adresse du Bien|Adresse)\s*[:\-]?\s*(.*?)(?=\s*(?:Email|Courriel|Montant|$))",
+    "email": r"([\w\.-]+@[\w\.-]+\.\w+)",
+    "telephone": r"(?:Numéro de Téléphone|Téléphone|Tél)\s*[:\-]?\s*([\d\+\s\-]{6,})",
+    "montant_pret": r"(?:Montant du Prêt Demandé|Montant du Prêt|Montant)\s*[:\-]?\s*([\d\s,\.]+)",
+    "revenu_mensuel": r"(?:Revenu Mensuel|Revenu)\s*[:\-]?\s*([\d\s,\.]+)",
+    "depenses_mensuelles": r"(?:Dépenses Mensuelles|Dépenses)\s*[:\-]?\s*([\d\s,\.]+)",
+    "description": r"(?:Description de la Propriété|Description)\s*[:\-]?\s*(.+)",
+}
+_patterns = None
+
+
+def _compiled():
+    global _patterns
+    if _patterns is None:
+        _patterns = {name: re.compile(src, re.IGNORECASE) for name, src in _PATTERN_SOURCES.items()}
+    return _patterns
+
+
+_ready = threading.Event()
+_startup = {"warmup_ms": None, "ready_after_ms": None, "first_response_after_ms": None}
+
+
+def warm_up(load_model: bool = True):
+    """Compile les motifs, exerce le chemin regex et construit le modèle Gemini, puis signale le service prêt."""
+    started = time.monotonic()
+    _compiled()
+    fallback_extract("Nom: Warm Up Montant: 1 Revenu: 1 Dépenses: 1 Description: -")
+    patterns_ms = (time.monotonic() - started) * 1000
+    if load_model:
+        try:
+            _gemini_model()
+        except Exception as e:
+            logger.warning("Gemini SDK unavailable, regex fallback only: %s", e)
+    _startup["warmup_ms"] = round((time.monotonic() - started) * 1000, 1)
+    _startup["ready_after_ms"] = round((time.monotonic() - _PROCESS_STARTED) * 1000, 1)
+    _ready.set()
+    logger.info("[IE] Ready %s ms after start (warm-up %s ms, patterns %.1f ms)",
+                _startup["ready_after_ms"], _startup["warmup_ms"], patterns_ms)
 
-from dotenv import load_dotenv
-import os
-import google.generativeai as genai
 
-# Charger le fichier .env
-load_dotenv()
+def _on_first_response(ctx):
+    if _startup["first_response_after_ms"] is None:
+        _startup["first_response_after_ms"] = round((time.monotonic() - _PROCESS_STARTED) * 1000, 1)
+        logger.info("[IE] First response %s ms after start", _startup["first_response_after_ms"])
+
+
+def readiness():
+    return _ready.is_set(), dict(_startup)
+
 
-# Lire la clé d'environnement
-api_key = os.getenv("GOOGLE_API_KEY")
-logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-genai.configure(api_key=api_key)
 def preprocess_text(texte: str) -> str:
     t = unicodedata.normalize("NFKC", texte or "")
-    t = re.sub(r"\s+", " ", t)
+    t = _compiled()["whitespace"].sub(" ", t)
     return t.strip()
 
-def call_gemini_extract(texte: str) -> dict:
+def call_gemini_extract(texte: str, timeout: float = None) -> dict:
     """
     Demande à Gemini d'extraire les champs en FR et de retourner uniquement un JSON.
-    Si Gemini échoue, on retourne None pour utiliser le fallback regex.
+    Si Gemini échoue (ou dépasse ``timeout`` secondes), on retourne None pour utiliser le fallback regex.
     """
     prompt = f"""
 Tu es un assistant qui extrait des informations depuis une demande de prêt immobilier rédigée en langage naturel.
@@ -43,97 +164,132 @@ Contraintes :
 Texte :
 \"\"\"{texte}\"\"\"
 """
+    if timeout is None and GEMINI_TIMEOUT_SECONDS > 0:
+        timeout = GEMINI_TIMEOUT_SECONDS
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        response = model.generate_content(prompt)
+        model = _gemini_model()
+        if timeout is not None:
+            response = model.generate_content(prompt, request_options={"timeout": timeout})
+        else:
+            response = model.generate_content(prompt)
         text_out = response.text.strip()
         start, end = text_out.find('{'), text_out.rfind('}')
         if start != -1 and end != -1:
             payload = text_out[start:end+1]
             return json.loads(payload)
     except Exception as e:
-        logging.warning("Gemini error: %s", e)
+        logger.warning("Gemini error: %s", e)
     return None
 
 # fallback regex extraction (retourne dict avec mêmes clés)
 def fallback_extract(texte: str) -> dict:
-    def find(pat):
-        m = re.search(pat, texte, re.IGNORECASE)
+    patterns = _compiled()
+
+    def find(name):
+        m = patterns[name].search(texte)
         return m.group(1).strip() if m else ""
 
     def to_number(s):
         if not s:
             return 0.0
-        s2 = re.sub(r"[^\d,.\-]", "", s).replace(",", ".")
+        s2 = patterns["non_numeric"].sub("", s).replace(",", ".")
         try:
             return float(s2) if s2 else 0.0
         except:
             return 0.0
 
     return {
-        "nom": find(r"(?:Nom du Client|Nom)\s*[:\-]?\s*([A-Za-zÀ-ÖØ-öø-ÿ' \-]+)"),
-        "adresse": find(r"(?:Adresse|Adresse du Bien|Adresse)\s*[:\-]?\s*(.*?)(?=\s*(?:Email|Courriel|Montant|$))"),
-        "email": find(r"([\w\.-]+@[\w\.-]+\.\w+)"),
-        "telephone": find(r"(?:Numéro de Téléphone|Téléphone|Tél)\s*[:\-]?\s*([\d\+\s\-]{6,})"),
-        "montant_pret": to_number(find(r"(?:Montant du Prêt Demandé|Montant du Prêt|Montant)\s*[:\-]?\s*([\d\s,\.]+)")),
-        "revenu_mensuel": to_number(find(r"(?:Revenu Mensuel|Revenu)\s*[:\-]?\s*([\d\s,\.]+)")),
-        "depenses_mensuelles": to_number(find(r"(?:Dépenses Mensuelles|Dépenses)\s*[:\-]?\s*([\d\s,\.]+)")),
-        "description": find(r"(?:Description de la Propriété|Description)\s*[:\-]?\s*(.+)")
+        "nom": find("nom"),
+        "adresse": find("adresse"),
+        "email": find("email"),
+        "telephone": find("telephone"),
+        "montant_pret": to_number(find("montant_pret")),
+        "revenu_mensuel": to_number(find("revenu_mensuel")),
+        "depenses_mensuelles": to_number(find("depenses_mensuelles")),
+        "description": find("description")
     }
 
+def extract_fields(text: str, deadline=None) -> dict:
+    """
+    Extrait et normalise les champs d'une demande (Gemini puis fallback regex).
+    ``deadline`` (optionnelle) borne l'appel Gemini au budget restant de la requête.
+    """
+    # entrée libre en langage naturel
+    texte = preprocess_text(text)
+    logger.debug("Received text (snippet): %s", texte[:200])
+
+    # try LLM (seulement s'il reste assez de budget)
+    data = None
+    if deadline is None:
+        data = call_gemini_extract(texte)
+    elif deadline.remaining() >= GEMINI_MIN_BUDGET_SECONDS:
+        data = call_gemini_extract(texte, timeout=deadline.remaining())
+    else:
+        logger.info("Remaining budget too short for Gemini -> fallback regex")
+    if deadline is not None:
+        deadline.check("InformationExtraction")
+    if not data:
+        logger.info("Gemini failed or returned nothing -> fallback regex")
+        data = fallback_extract(texte)
+
+    normalized = normalize_fields(data, texte)
+    log_payload(logger, "Extraction result", normalized)
+    return normalized
+
+
+def normalize_fields(data: dict, texte: str) -> dict:
+    """Complète les champs extraits (Gemini ou regex) avec les valeurs par défaut et des montants numériques."""
+    # ensure keys + defaults and types exactly like original service
+    defaults = {
+        "nom": "Inconnu",
+        "adresse": "Non spécifiée",
+        "email": "unknown@email.com",
+        "telephone": "N/A",
+        "montant_pret": 0.0,
+        "revenu_mensuel": 0.0,
+        "depenses_mensuelles": 0.0,
+        "description": "Aucune description fournie"
+    }
+
+    normalized = {}
+    # numeric cleaning helper
+    def to_num(v):
+        if v is None or v == "":
+            return 0.0
+        try:
+            if isinstance(v, (int, float)):
+                return float(v)
+            s = str(v)
+            s = _compiled()["non_numeric"].sub("", s).replace(",", ".")
+            return float(s) if s else 0.0
+        except:
+            return 0.0
+
+    for k, d in defaults.items():
+        if k in ["montant_pret", "revenu_mensuel", "depenses_mensuelles"]:
+            normalized[k] = to_num(data.get(k)) if data.get(k) is not None else d
+        else:
+            val = data.get(k)
+            normalized[k] = val if (val is not None and str(val).strip() != "") else d
+
+    # ajout du texte original (court extrait)
+    normalized["texte_original"] = texte[:1000]
+    return normalized
+
+
 class InformationExtractionService(ServiceBase):
     @rpc(Unicode, _returns=Unicode)
     def extract_information(ctx, text):
-        # entrée libre en langage naturel
-        texte = preprocess_text(text)
-        logging.info("Received text (snippet): %s", texte[:200])
+        # renvoyer JSON (même format que le 1er service) ; l'écho du texte est omis en mode summary
+        fields = extract_fields(text, current_deadline(ctx))
+        if not full_detail(ctx):
+            fields.pop("texte_original", None)
+        return dumps(fields)
 
-        # try LLM
-        data = call_gemini_extract(texte)
-        if not data:
-            logging.info("Gemini failed or returned nothing -> fallback regex")
-            data = fallback_extract(texte)
-
-        # ensure keys + defaults and types exactly like original service
-        defaults = {
-            "nom": "Inconnu",
-            "adresse": "Non spécifiée",
-            "email": "unknown@email.com",
-            "telephone": "N/A",
-            "montant_pret": 0.0,
-            "revenu_mensuel": 0.0,
-            "depenses_mensuelles": 0.0,
-            "description": "Aucune description fournie"
-        }
-
-        normalized = {}
-        # numeric cleaning helper
-        def to_num(v):
-            if v is None or v == "":
-                return 0.0
-            try:
-                if isinstance(v, (int, float)):
-                    return float(v)
-                s = str(v)
-                s = re.sub(r"[^\d,.\-]", "", s).replace(",", ".")
-                return float(s) if s else 0.0
-            except:
-                return 0.0
-
-        for k, d in defaults.items():
-            if k in ["montant_pret", "revenu_mensuel", "depenses_mensuelles"]:
-                normalized[k] = to_num(data.get(k)) if data.get(k) is not None else d
-            else:
-                val = data.get(k)
-                normalized[k] = val if (val is not None and str(val).strip() != "") else d
-
-        # ajout du texte original (court extrait)
-        normalized["texte_original"] = texte[:1000]
-
-        # renvoyer JSON (même format que le 1er service)
-        result_json = json.dumps(normalized, ensure_ascii=False)
-        logging.info("Extraction result: %s", result_json)
-        return result_json
+    @rpc(Unicode, _returns=ExtractedApplication)
+    def extract_information_typed(ctx, text):
+        """Variante typée de extract_information : retourne un ExtractedApplication."""
+        return to_model(ExtractedApplication, extract_fields(text, current_deadline(ctx)))
 
 # app Spyne
 app = Application(
@@ -143,11 +299,21 @@ app = Application(
     out_protocol=Soap11()
 )
 
+# Liaison JSON/HTTP pour les appels internes (sans validation de schéma)
+json_app = json_application([InformationExtractionService], tns='loan.services.information')
+enforce_deadlines("InformationExtraction", logger, app, json_app)
+enable_profiling("information_extraction", logger, app, json_app)
+for _app in (app, json_app):
+    _app.event_manager.add_listener("method_return_object", _on_first_response)
+
 if __name__ == "__main__":
-    from spyne.server.wsgi import WsgiApplication
-    from wsgiref.simple_server import make_server
-    wsgi_app = WsgiApplication(app)
+    # Twisted (HTTP/1.1 keep-alive) comme les autres services, au lieu de wsgiref (HTTP/1.0)
     port = 8001
     print(f"Service SOAP en écoute sur http://0.0.0.0:{port}")
-    server = make_server("0.0.0.0", port, wsgi_app)
-    server.serve_forever()
+    # Le port s'ouvre tout de suite ; /ready répond 503 jusqu'à la fin du warm-up
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+    endpoints = wsgi_endpoints(app, json_app, 'InformationExtractionService') + [
+        (profiling_wsgi_app, b'profiling'),
+        (readiness_wsgi_app_for(readiness), b'ready'),
+    ]
+    sys.exit(run_twisted(endpoints, port))
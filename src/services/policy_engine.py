@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Moteur de règles de politique de crédit, rechargeable à chaud.
+
+- Les règles sont décrites dans un fichier JSON local (policy_rules.json par défaut)
+- Elles sont compilées une fois en tuples immuables : seuils convertis, textes
+  des raisons pré-découpés autour de la valeur, opérateurs résolus
+- Un thread surveille le fichier et remplace la politique courante d'un seul
+  coup ; une requête en cours garde la politique qu'elle a lue au début
+- Chaque politique porte une version, enregistrée dans la décision
+"""
+
+import hashlib
+import json
+import logging
+import operator
+import os
+import threading
+from typing import Any, Dict, List, Tuple
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "policy_rules.json")
+POLICY_RULES_PATH = os.getenv("POLICY_RULES_PATH", DEFAULT_RULES_PATH)
+POLICY_RELOAD_SECONDS = float(os.getenv("POLICY_RELOAD_SECONDS", "2"))
+
+logger = logging.getLogger("decision_service")
+
+FIELDS = (
+    "credit_score", "loan_to_value", "debt_to_income", "risk_score",
+    "monthly_savings", "default_probability", "employment_stable",
+)
+OPERATORS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "is_false": lambda value, _threshold: not value,
+}
+# Opérateurs qui comparent la valeur au seuil (obligatoire pour eux)
+COMPARISONS = ("<", "<=", ">", ">=")
+
+
+# Pondérations du score de risque (analyze_risk), surchargées par "risk_weights"
+RISK_WEIGHT_DEFAULTS = (("credit", 0.6), ("loan_to_value", 0.2), ("debt_to_income", 0.15), ("employment", 0.05))
+
+
+class PolicyError(ValueError):
+    """Fichier de règles invalide."""
+
+
+def _number(rule_id: str, spec: Dict[str, Any], key: str) -> float:
+    try:
+        return float(spec[key])
+    except (TypeError, ValueError):
+        raise PolicyError(f"Rule {rule_id}: {key} must be a number, got {spec[key]!r}")
+
+
+class CompiledRule:
+    __slots__ = ("id", "field", "test", "threshold", "reject_test", "value_format",
+                 "reason_prefix", "reason_suffix", "reason_has_value", "recommendation")
+
+    def __init__(self, spec: Dict[str, Any]):
+        self.id = spec.get("id", spec.get("field"))
+        self.field = spec["field"]
+        if self.field not in FIELDS:
+            raise PolicyError(f"Rule {self.id}: unknown field '{self.field}'")
+        op = spec.get("op")
+        if op not in OPERATORS:
+            raise PolicyError(f"Rule {self.id}: unknown operator '{op}'")
+        self.test = OPERATORS[op]
+        # Vérifié ici : une règle invalide fait échouer le rechargement, pas chaque décision
+        if op in COMPARISONS and "threshold" not in spec:
+            raise PolicyError(f"Rule {self.id}: operator '{op}' needs a threshold")
+        self.threshold = _number(self.id, spec, "threshold") if "threshold" in spec else None
+
+        # Règle "souple" : signalée au-delà du seuil, bloquante seulement au-delà de reject_above
+        if "reject_above" in spec:
+            limit = _number(self.id, spec, "reject_above")
+            self.reject_test = lambda value, _limit=limit: value > _limit
+        else:
+            self.reject_test = None
+
+        self.value_format = spec.get("value_format", "")
+        try:
+            format(0.0, self.value_format)
+        except (TypeError, ValueError) as e:
+            raise PolicyError(f"Rule {self.id}: invalid value_format '{self.value_format}': {e}")
+        # Le seuil est substitué une fois pour toutes ; seule la valeur reste à insérer
+        threshold_text = str(spec.get("threshold", ""))
+        template = spec.get("reason", "").replace("{threshold}", threshold_text)
+        self.reason_has_value = "{value}" in template
+        self.reason_prefix, _, self.reason_suffix = template.partition("{value}")
+        self.recommendation = spec.get("recommendation", "")
+
+
+class CompiledPolicy:
+    """Politique compilée et immuable."""
+
+    def __init__(self, spec: Dict[str, Any], version: str):
+        self.version = version
+        self.base_interest_rate = float(spec.get("base_interest_rate", 3.0))
+        self.risk_rate_divisor = float(spec.get("risk_rate_divisor", 25))
+        weights = spec.get("risk_weights", {})
+        self.risk_weights = tuple(float(weights.get(k, d)) for k, d in RISK_WEIGHT_DEFAULTS)
+        self.rules: Tuple[CompiledRule, ...] = tuple(CompiledRule(r) for r in spec.get("rules", []))
+        self.approved_reason = spec.get("approved_reason", "")
+        self.approved_recommendation = spec.get("approved_recommendation", "")
+
+    @classmethod
+    def from_file(cls, path: str) -> "CompiledPolicy":
+        with open(path, "rb") as f:
+            raw = f.read()
+        try:
+            spec = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise PolicyError(f"{path}: {e}")
+        digest = hashlib.sha256(raw).hexdigest()[:8]
+        version = f"{spec['version']}+{digest}" if spec.get("version") else digest
+        return cls(spec, version)
+
+    def interest_rate(self, risk_score: float) -> float:
+        # Tarification au risque : pente modérée au-dessus du taux de base
+        return round(self.base_interest_rate + (100 - risk_score) / self.risk_rate_divisor, 2)
+
+    def decide(self, risk_data: Dict[str, Any]) -> Tuple[bool, float]:
+        """Comme evaluate, sans construire les textes : (approved, interest_rate). Utilisé en masse (backtest)."""
+        approved = True
+        for rule in self.rules:
+            value = risk_data[rule.field]
+            if rule.test(value, rule.threshold) and (rule.reject_test is None or rule.reject_test(value)):
+                approved = False
+                break
+        return approved, self.interest_rate(risk_data["risk_score"])
+
+    def evaluate(self, risk_data: Dict[str, Any]) -> Tuple[bool, List[str], List[str], float]:
+        """Retourne (approved, reasons, recommendations, interest_rate)."""
+        approved = True
+        reasons = []
+        recommendations = []
+
+        for rule in self.rules:
+            value = risk_data[rule.field]
+            if not rule.test(value, rule.threshold):
+                continue
+            if rule.reject_test is None or rule.reject_test(value):
+                approved = False
+            if rule.reason_has_value:
+                reasons.append(rule.reason_prefix + format(value, rule.value_format) + rule.reason_suffix)
+            else:
+                reasons.append(rule.reason_prefix)
+            recommendations.append(rule.recommendation)
+
+        interest_rate = self.interest_rate(risk_data["risk_score"])
+
+        if approved:
+            reasons.append(self.approved_reason)
+            recommendations.append(self.approved_recommendation)
+
+        return approved, reasons, recommendations, interest_rate
+
+
+class PolicyStore:
+    """Détient la politique courante et la recharge quand le fichier change."""
+
+    def __init__(self, path: str = POLICY_RULES_PATH):
+        self.path = path
+        self._mtime = os.stat(path).st_mtime_ns
+        self.current = CompiledPolicy.from_file(path)
+        self._watcher = None
+
+    def reload_if_changed(self) -> bool:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        try:
+            policy = CompiledPolicy.from_file(self.path)
+        except Exception as e:
+            # On garde la politique précédente plutôt que de servir une règle cassée
+            logger.error("[Policy] Reload failed, keeping %s: %s", self.current.version, e)
+            return False
+        self.current = policy  # remplacement atomique de la référence
+        logger.info("[Policy] Loaded policy version %s", policy.version)
+        return True
+
+    def start_watcher(self, interval: float = POLICY_RELOAD_SECONDS):
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def loop():
+            stop = threading.Event()
+            while not stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=loop, name="policy-watcher", daemon=True)
+        self._watcher.start()
@@ -1,10 +1,27 @@
-import sys, logging, json, random
+import sys, os, logging, json, random
 from spyne import Application, rpc, ServiceBase, Unicode
+from spyne.error import Fault
 from spyne.protocol.soap import Soap11
-from spyne.server.wsgi import WsgiApplication
 from spyne.util.wsgi_wrapper import run_twisted
 
-logging.basicConfig(level=logging.INFO)
+# Import utilitaires partagés (robuste pour exécution en package ou directe)
+try:
+    from common.log_setup import setup_logging, log_payload
+    from common.bindings import json_application, wsgi_endpoints
+    from common.models import ExtractedApplication, PropertyValuation, property_valuation_from_dict, to_dict
+    from common.deadline import enforce_deadlines
+    from common.profiling import enable_profiling, profiling_wsgi_app
+    from common.wire import dumps, full_detail
+except ModuleNotFoundError:
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from common.log_setup import setup_logging, log_payload
+    from common.bindings import json_application, wsgi_endpoints
+    from common.models import ExtractedApplication, PropertyValuation, property_valuation_from_dict, to_dict
+    from common.deadline import enforce_deadlines
+    from common.profiling import enable_profiling, profiling_wsgi_app
+    from common.wire import dumps, full_detail
+
+logger = setup_logging("property_evaluation")
 
 
 # ---------------------------------------------------------------------
@@ -118,15 +135,27 @@ class PropertyEvaluationService(ServiceBase):
 
         try:
             value, details = evaluate_property_value(parsed)
-            result = {
-                "property_value": value,
-                "details": details
-            }
-            logging.info(f"[PropertyEval] Estimated value: {value} € for region {details['region']}")
-            return json.dumps(result, indent=2, ensure_ascii=False)
+            result = {"property_value": value}
+            if full_detail(ctx):
+                result["details"] = details  # inspection, marché, conformité (audit)
+            logger.info("[PropertyEval] Estimated value: %s € for region %s", value, details["region"])
+            log_payload(logger, "[PropertyEval] Result", result)
+            return dumps(result)
         except Exception as e:
-            logging.error(f"[PropertyEval] Error: {e}")
-            return json.dumps({"status": "error", "message": str(e)})
+            logger.error("[PropertyEval] Error: %s", e)
+            return dumps({"status": "error", "message": str(e)})
+
+    @rpc(ExtractedApplication, _returns=PropertyValuation)
+    def evaluate_property_typed(ctx, application):
+        """Variante typée de evaluate_property : ExtractedApplication -> PropertyValuation."""
+        try:
+            value, details = evaluate_property_value(to_dict(application))
+        except Exception as e:
+            logger.error("[PropertyEval] Error: %s", e)
+            raise Fault(faultcode="Server", faultstring=str(e))
+        logger.info("[PropertyEval] Estimated value: %s € for region %s", value, details["region"])
+        log_payload(logger, "[PropertyEval] Result", {"property_value": value, "details": details})
+        return property_valuation_from_dict({"property_value": value, "details": details})
 
 
 # ---------------------------------------------------------------------
@@ -139,5 +168,11 @@ app = Application(
     out_protocol=Soap11()
 )
 
+# Liaison JSON/HTTP pour les appels internes (sans validation de schéma)
+json_app = json_application([PropertyEvaluationService], tns='loan.services.property')
+enforce_deadlines("PropertyEval", logger, app, json_app)
+enable_profiling("property_evaluation", logger, app, json_app)
+
 if __name__ == '__main__':
-    sys.exit(run_twisted([(WsgiApplication(app), b'PropertyEvaluationService')], 8003))
+    endpoints = wsgi_endpoints(app, json_app, 'PropertyEvaluationService') + [(profiling_wsgi_app, b'profiling')]
+    sys.exit(run_twisted(endpoints, 8003))
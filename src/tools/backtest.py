@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Backtest d'une politique candidate sur l'historique des décisions.
+
+Les enregistrements sont lus en flux (archives puis magasin chaud), découpés en
+lots, et chaque lot est réévalué (analyze_risk_batch + règles) sous la politique de
+référence et sous la candidate dans un pool de processus. Le nombre de lots en
+vol est borné : la mémoire reste constante quelle que soit la taille de l'historique.
+
+Sortie : variation du taux d'approbation, décisions basculées, et distribution
+des taux d'intérêt (approuvés) avant / après.
+
+Usage :
+    python tools/backtest.py --candidate candidate_rules.json [--baseline services/policy_rules.json]
+                             [--from 2025-01-01] [--to 2025-12-31] [--workers 8] [--chunk-size 5000]
+                             [--flips flips.ndjson]
+"""
+
+import argparse
+import json
+import os
+import sys
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# stdout porte les résultats : les logs des services importés (et des workers) vont sur stderr
+os.environ.setdefault("LOG_STREAM", "stderr")
+from composite_service.export import iter_records  # noqa: E402
+from services.decision_service import analyze_risk_batch  # noqa: E402
+from services.amortization import DEFAULT_LOAN_TERM_MONTHS  # noqa: E402
+from services.policy_engine import CompiledPolicy, DEFAULT_RULES_PATH  # noqa: E402
+
+INPUT_KEYS = ("credit_score", "property_value", "loan_amount", "revenu_mensuel", "depenses_mensuelles", "emploi_stable",
+              "loan_term_months")
+
+# Mensualité historique (≈ 1 % du prêt, avant le calcul par annuités) : sert à retrouver
+# le revenu des décisions enregistrées avant que risk_details ne contienne monthly_income
+LEGACY_PAYMENT_RATIO = 0.01
+
+
+def to_input(rec: Dict[str, Any]) -> Optional[Tuple]:
+    """
+    Entrées d'analyze_risk reconstruites depuis risk_details (None si pas de décision).
+    Lève ValueError si le revenu d'une ancienne décision est introuvable.
+    """
+    risk = (rec.get("result") or {}).get("risk_details")
+    if not risk:
+        return None
+    loan = float(risk.get("loan_amount", 0))
+    income = risk.get("monthly_income")
+    expenses = risk.get("monthly_expenses")
+    if income is None:
+        dti = float(risk.get("debt_to_income") or 0)
+        if dti <= 0:
+            # DTI absent ou arrondi à 0 : un revenu nul ferait un faux rejet dans le delta
+            raise ValueError("legacy decision without monthly_income or a usable debt_to_income")
+        income = loan * LEGACY_PAYMENT_RATIO / dti
+        expenses = income - float(risk.get("monthly_savings", 0))
+    return (
+        float(risk.get("credit_score", 0)),
+        float(risk.get("property_value", 0)),
+        loan,
+        float(income),
+        float(expenses or 0),
+        bool(risk.get("employment_stable", True)),
+        int(risk.get("loan_term_months") or DEFAULT_LOAN_TERM_MONTHS),
+    )
+
+
+# --- Côté worker --- #
+_policies: Tuple[CompiledPolicy, CompiledPolicy] = None
+
+
+def _init_worker(baseline_path: str, candidate_path: str):
+    global _policies
+    _policies = (CompiledPolicy.from_file(baseline_path), CompiledPolicy.from_file(candidate_path))
+
+
+def score_chunk(chunk: List[Tuple[str, Tuple]]) -> List[Tuple[str, bool, float, bool, float]]:
+    """Réévalue un lot : (request_id, approuvé_ref, taux_ref, approuvé_cand, taux_cand)."""
+    baseline, candidate = _policies
+    rows = [(request_id, dict(zip(INPUT_KEYS, inputs))) for request_id, inputs in chunk]
+    inputs = [data for _, data in rows]
+    base = [baseline.decide(risk) for risk in analyze_risk_batch(inputs, baseline)]
+    cand = [candidate.decide(risk) for risk in analyze_risk_batch(inputs, candidate)]
+    return [(rows[i][0], *base[i], *cand[i]) for i in range(len(rows))]
+
+
+# --- Côté coordinateur --- #
+def iter_inputs(date_from: str, date_to: str, skipped: Counter) -> Iterator[Tuple[str, Tuple]]:
+    """(request_id, entrées) des décisions rejouables ; les autres sont comptées dans ``skipped``."""
+    for request_id, rec in iter_records(date_from, date_to, "done"):
+        try:
+            inp = to_input(rec)
+        except ValueError:
+            skipped["unreconstructable"] += 1
+            continue
+        if inp is not None:
+            yield request_id, inp
+
+
+def iter_chunks(date_from: str, date_to: str, chunk_size: int,
+                skipped: Counter) -> Iterator[List[Tuple[str, Tuple]]]:
+    inputs = iter_inputs(date_from, date_to, skipped)
+    while True:
+        chunk = list(islice(inputs, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_backtest(baseline_path: str, candidate_path: str, date_from: str = None, date_to: str = None,
+                 workers: int = None, chunk_size: int = 5000, flips_out=None) -> Dict[str, Any]:
+    workers = workers or os.cpu_count() or 1
+    total = approved_base = approved_cand = 0
+    flipped, skipped = Counter(), Counter()
+    rates_base, rates_cand = Counter(), Counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(baseline_path, candidate_path)) as pool:
+        pending = deque()
+        chunks = iter_chunks(date_from, date_to, chunk_size, skipped)
+
+        def drain_one():
+            nonlocal total, approved_base, approved_cand
+            for request_id, ab, rate_b, ac, rate_c in pending.popleft().result():
+                total += 1
+                approved_base += ab
+                approved_cand += ac
+                if ab:
+                    rates_base[rate_b] += 1
+                if ac:
+                    rates_cand[rate_c] += 1
+                if ab != ac:
+                    flipped["approved_to_rejected" if ab else "rejected_to_approved"] += 1
+                    if flips_out:
+                        flips_out.write(json.dumps({
+                            "request_id": request_id, "baseline_approved": ab, "candidate_approved": ac,
+                            "baseline_rate": rate_b, "candidate_rate": rate_c,
+                        }) + "\n")
+
+        # Au plus 2 lots en vol par worker : la lecture avance au rythme du calcul
+        for chunk in chunks:
+            pending.append(pool.submit(score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                drain_one()
+        while pending:
+            drain_one()
+
+    def rate(n):
+        return round(n / total, 4) if total else 0.0
+
+    return {
+        "records": total,
+        "baseline": {"policy": CompiledPolicy.from_file(baseline_path).version,
+                     "approval_rate": rate(approved_base), "interest_rate": distribution(rates_base)},
+        "candidate": {"policy": CompiledPolicy.from_file(candidate_path).version,
+                      "approval_rate": rate(approved_cand), "interest_rate": distribution(rates_cand)},
+        "approval_rate_delta": round(rate(approved_cand) - rate(approved_base), 4),
+        "flipped": dict(flipped),
+        "skipped": dict(skipped),
+    }
+
+
+def distribution(counts: Counter) -> Dict[str, float]:
+    """Moyenne et quantiles depuis un histogramme (les taux sont arrondis à 0.01 : histogramme borné)."""
+    n = sum(counts.values())
+    if not n:
+        return {}
+    ordered = sorted(counts.items())
+    result = {"mean": round(sum(r * c for r, c in ordered) / n, 3)}
+    for q in (0.1, 0.25, 0.5, 0.75, 0.9):
+        target, seen = q * n, 0
+        for r, c in ordered:
+            seen += c
+            if seen >= target:
+                result[f"p{int(q * 100)}"] = r
+                break
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest d'une politique candidate sur l'historique")
+    parser.add_argument("--candidate", required=True, help="fichier de règles candidat")
+    parser.add_argument("--baseline", default=DEFAULT_RULES_PATH, help="fichier de règles de référence")
+    parser.add_argument("--from", dest="date_from")
+    parser.add_argument("--to", dest="date_to")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--flips", help="écrire les décisions basculées (NDJSON) dans ce fichier")
+    args = parser.parse_args()
+
+    flips_out = open(args.flips, "w", encoding="utf-8") if args.flips else None
+    try:
+        report = run_backtest(args.baseline, args.candidate, args.date_from, args.date_to,
+                              args.workers, args.chunk_size, flips_out)
+    finally:
+        if flips_out:
+            flips_out.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
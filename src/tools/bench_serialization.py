@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark de sérialisation par saut : JSON-dans-Unicode (indenté comme avant,
+puis minifié comme common/wire.py) vs ComplexModel typé.
+
+Pour chaque saut (IE, CC, PE, DS) on mesure la taille du fragment XML et le
+coût d'un aller-retour encodage + décodage, tel que payé par l'émetteur et le
+récepteur d'une opération SOAP.
+
+Usage :
+    python tools/bench_serialization.py [--iterations 2000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+from lxml import etree
+from spyne import Unicode
+from spyne.util.xml import get_object_as_xml, get_xml_as_object
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.models import (  # noqa: E402
+    ExtractedApplication, CreditResult, PropertyValuation, Decision,
+    to_model, credit_result_from_dict, property_valuation_from_dict,
+)
+
+# Payloads représentatifs (repris de database.json)
+IE_OUTPUT = {
+    "nom": "Jeanne Petit",
+    "adresse": "5 Rue des Fleurs, Paris",
+    "email": "jeanne.petit@email.com",
+    "telephone": "+33600111222",
+    "montant_pret": 300000.0,
+    "revenu_mensuel": 2000.0,
+    "depenses_mensuelles": 1500.0,
+    "description": "Petit appartement ancien, nécessite quelques travaux, proche d'une route passante.",
+    "texte_original": "Nom du Client: Jeanne Petit Adresse: 5 Rue des Fleurs, Paris Email: jeanne.petit@email.com "
+                      "Numéro de Téléphone: +33600111222 Montant du Prêt Demandé: 300000 Revenu Mensuel: 2000 "
+                      "Dépenses Mensuelles: 1500 Description de la Propriété: Petit appartement ancien, "
+                      "nécessite quelques travaux, proche d'une route passante.",
+}
+CC_OUTPUT = {
+    "credit_score": 51.09,
+    "details": {
+        "revenu_mensuel": 2000.0, "depenses_mensuelles": 1500.0, "montant_pret": 300000.0,
+        "nom": "Jeanne Petit", "prenom": None, "age": None, "emploi_stable": None,
+        "credit_bureau": {"historique_paiement": "bon", "dettes_en_cours": 2, "retards_paiement": 1,
+                          "anciennete_credit": 7, "score_bureau": 612},
+    },
+}
+PE_OUTPUT = {
+    "property_value": 742047.63,
+    "details": {
+        "region": "paris", "prix_m2": 8500, "surface_estimee_m2": 97, "facteur_condition": 0.9,
+        "facteur_conformite": 1.0,
+        "inspection": {"condition_score": 0.9, "surface_estimee_m2": 97},
+        "legal": {"conforme": True, "litige_en_cours": False, "details": "Aucun problème détecté."},
+        "adjustment_factor": 1.0,
+    },
+}
+DS_OUTPUT = {
+    "approved": False,
+    "interest_rate": 5.1,
+    "loan_amount": 300000.0,
+    "risk_details": {
+        "credit_score": 51.09, "loan_amount": 300000.0, "property_value": 742047.63, "loan_to_value": 0.4,
+        "debt_to_income": 1.5, "monthly_savings": 500.0, "employment_stable": True, "risk_score": 47.57,
+        "default_probability": 52.43,
+    },
+    "reasons": ["Debt-to-Income ratio (1.50) is higher than the recommended maximum (0.5)."],
+    "recommendations": ["Try to increase your income or reduce your monthly expenses to improve your debt ratio."],
+    "message": "❌ Rejected",
+}
+
+HOPS = [
+    ("IE", IE_OUTPUT, ExtractedApplication, to_model(ExtractedApplication, IE_OUTPUT), False),
+    ("CC", CC_OUTPUT, CreditResult, credit_result_from_dict(CC_OUTPUT), True),
+    ("PE", PE_OUTPUT, PropertyValuation, property_valuation_from_dict(PE_OUTPUT), True),
+    ("DS", DS_OUTPUT, Decision, to_model(Decision, DS_OUTPUT), True),
+]
+
+
+def string_roundtrip(payload: dict, indent, separators=None):
+    text = json.dumps(payload, indent=indent, ensure_ascii=False, separators=separators)
+    wire = etree.tostring(get_object_as_xml(text, Unicode, "result"))
+    json.loads(get_xml_as_object(etree.fromstring(wire), Unicode))
+    return wire
+
+
+def typed_roundtrip(obj, cls):
+    wire = etree.tostring(get_object_as_xml(obj, cls))
+    get_xml_as_object(etree.fromstring(wire), cls)
+    return wire
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+    n = args.iterations
+
+    print(f"{'hop':<4} {'mode':<14} {'bytes':>7} {'us/roundtrip':>13}")
+    for hop, payload, cls, obj, indented in HOPS:
+        indent = 2 if indented else None
+        rows = [
+            ("json-string", len(string_roundtrip(payload, indent)),
+             timeit.timeit(lambda: string_roundtrip(payload, indent), number=n)),
+            ("json-compact", len(string_roundtrip(payload, None, (",", ":"))),
+             timeit.timeit(lambda: string_roundtrip(payload, None, (",", ":")), number=n)),
+            ("typed", len(typed_roundtrip(obj, cls)),
+             timeit.timeit(lambda: typed_roundtrip(obj, cls), number=n)),
+        ]
+        for mode, size, elapsed in rows:
+            print(f"{hop:<4} {mode:<14} {size:>7} {elapsed / n * 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Évaluation en masse de demandes de prêt, hors SOAP.
+
+Les demandes sont lues en flux depuis un fichier JSONL (un objet par ligne :
+``{"id": ..., "text": ...}``, ou simplement la chaîne du texte), découpées en
+lots, et chaque lot traverse dans un worker du pool de processus la même chaîne
+que le composite :
+    preprocess_text / fallback_extract -> compute_credit_score
+    -> evaluate_property_value -> analyze_risk / apply_policies
+Les étapes s'enchaînent dans le worker (aucun aller-retour entre processus par
+étape), l'analyse de risque se fait en une passe par lot ; les lots se
+répartissent sur les cœurs. L'extraction utilise uniquement
+le fallback regex (pas d'appel Gemini).
+
+Les décisions sont écrites au fil de l'eau en NDJSON, dans l'ordre d'entrée ;
+la progression s'affiche sur stderr. Au plus 2 lots par worker sont en vol :
+la mémoire reste constante quelle que soit la taille du fichier.
+
+Usage :
+    python tools/bulk_score.py applications.jsonl [-o decisions.ndjson] [--rules services/policy_rules.json]
+                               [--workers 8] [--chunk-size 500]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# stdout porte les résultats : les logs des services importés (et des workers) vont sur stderr
+os.environ.setdefault("LOG_STREAM", "stderr")
+from services.information_extraction import preprocess_text, fallback_extract, normalize_fields  # noqa: E402
+from services.credit_check import compute_credit_score  # noqa: E402
+from services.property_evaluation import evaluate_property_value  # noqa: E402
+from services.decision_service import (analyze_risk, analyze_risk_batch, apply_policies,  # noqa: E402
+                                       amortization_details)
+from services.policy_engine import CompiledPolicy, POLICY_RULES_PATH  # noqa: E402
+
+PROGRESS_INTERVAL_SECONDS = 2.0
+
+
+# --- Côté worker --- #
+_policy: CompiledPolicy = None
+
+
+def _init_worker(rules_path: str):
+    global _policy
+    _policy = CompiledPolicy.from_file(rules_path)
+
+
+def prepare_application(text: str) -> Tuple[Any, Dict[str, Any]]:
+    """(email, entrée de DecisionService) pour un texte de demande : extraction, crédit, bien."""
+    texte = preprocess_text(text)
+    parsed = normalize_fields(fallback_extract(texte), texte)
+    credit_score, _bureau = compute_credit_score(parsed)
+    property_value, _details = evaluate_property_value(parsed)
+    return parsed.get("email"), {
+        "credit_score": credit_score,
+        "property_value": property_value,
+        "loan_amount": float(parsed.get("montant_pret", 0)),
+        "revenu_mensuel": parsed.get("revenu_mensuel", 0),
+        "depenses_mensuelles": parsed.get("depenses_mensuelles", 0),
+        "emploi_stable": parsed.get("emploi_stable", True),
+    }
+
+
+def decide(risk_data: Dict[str, Any], policy: CompiledPolicy) -> Dict[str, Any]:
+    """Décision de même forme que celle de DecisionService.make_decision."""
+    approved, reasons, recommendations, rate = apply_policies(risk_data, policy)
+    return {
+        "approved": approved,
+        "interest_rate": rate,
+        "loan_amount": risk_data["loan_amount"],
+        "risk_details": risk_data,
+        "reasons": reasons,
+        "recommendations": recommendations,
+        "message": "✅ Approved" if approved else "❌ Rejected",
+        "policy_version": policy.version,
+        "amortization": amortization_details(risk_data, rate),
+    }
+
+
+def score_application(text: str, policy: CompiledPolicy) -> Dict[str, Any]:
+    email, data = prepare_application(text)
+    return {"email": email, "decision": decide(analyze_risk(data, policy), policy)}
+
+
+def score_chunk(chunk: List[Tuple[str, str]]) -> List[Tuple[str, bool]]:
+    """
+    Évalue un lot ; retourne (ligne NDJSON, approuvé) — l'encodage JSON est fait dans le worker.
+    L'analyse de risque est faite en une passe sur tout le lot (analyze_risk_batch).
+    """
+    rows, prepared = [], []
+    for app_id, text in chunk:
+        try:
+            if isinstance(text, ValueError):
+                raise text
+            email, data = prepare_application(text)
+            rows.append({"id": app_id, "status": "done", "email": email})
+            prepared.append((rows[-1], data))
+        except Exception as e:
+            rows.append({"id": app_id, "status": "error", "message": str(e)})
+
+    try:
+        risks = analyze_risk_batch([data for _, data in prepared], _policy)
+    except Exception:
+        # une entrée invalide ne doit pas faire échouer tout le lot : repli ligne par ligne
+        risks = []
+        for _, data in prepared:
+            try:
+                risks.append(analyze_risk(data, _policy))
+            except Exception as e:
+                risks.append(e)
+    for (row, _), risk in zip(prepared, risks):
+        if not isinstance(risk, Exception):
+            try:
+                row["decision"] = decide(risk, _policy)
+                continue
+            except Exception as e:
+                risk = e
+        app_id = row["id"]
+        row.clear()
+        row.update({"id": app_id, "status": "error", "message": str(risk)})
+
+    out = []
+    for row in rows:
+        approved = row["decision"]["approved"] if row["status"] == "done" else None
+        out.append((json.dumps(row, ensure_ascii=False) + "\n", approved))
+    return out
+
+
+# --- Côté coordinateur --- #
+def iter_applications(lines) -> Iterator[Tuple[str, Union[str, ValueError]]]:
+    """
+    (id, texte) pour chaque ligne non vide ; l'id par défaut est le numéro de ligne.
+    Une ligne illisible donne (numéro de ligne, ValueError) : score_chunk en fait une
+    ligne d'erreur, le reste du fichier est évalué.
+    """
+    for lineno, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield str(lineno), ValueError(f"invalid JSON: {e}")
+            continue
+        if isinstance(item, str):
+            yield str(lineno), item
+        elif isinstance(item, dict):
+            yield str(item.get("id", lineno)), item.get("text", "")
+        else:
+            yield str(lineno), ValueError(f"expected an object or a string, got {type(item).__name__}")
+
+
+def iter_chunks(applications: Iterator[Tuple[str, str]], chunk_size: int) -> Iterator[List[Tuple[str, str]]]:
+    while True:
+        chunk = list(islice(applications, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run_bulk(lines, out, rules_path: str = POLICY_RULES_PATH, workers: int = None, chunk_size: int = 500,
+             progress=sys.stderr) -> Dict[str, Any]:
+    workers = workers or os.cpu_count() or 1
+    counts = Counter()
+    started = last_report = time.monotonic()
+
+    def report(final=False):
+        elapsed = time.monotonic() - started
+        rate = counts["records"] / elapsed if elapsed > 0 else 0.0
+        progress.write(f"{'✅' if final else '…'} {counts['records']} application(s) scored "
+                       f"({rate:.0f}/s, {counts['errors']} error(s))\n")
+        progress.flush()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules_path,)) as pool:
+        pending = deque()
+
+        def drain_one():
+            nonlocal last_report
+            for row, approved in pending.popleft().result():
+                out.write(row)
+                counts["records"] += 1
+                if approved is None:
+                    counts["errors"] += 1
+                elif approved:
+                    counts["approved"] += 1
+            if progress and time.monotonic() - last_report >= PROGRESS_INTERVAL_SECONDS:
+                last_report = time.monotonic()
+                report()
+
+        # Au plus 2 lots en vol par worker : la lecture avance au rythme du calcul
+        for chunk in iter_chunks(iter_applications(lines), chunk_size):
+            pending.append(pool.submit(score_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                drain_one()
+        while pending:
+            drain_one()
+
+    if progress:
+        report(final=True)
+    scored = counts["records"] - counts["errors"]
+    return {
+        "records": counts["records"],
+        "errors": counts["errors"],
+        "approval_rate": round(counts["approved"] / scored, 4) if scored else 0.0,
+        "policy": CompiledPolicy.from_file(rules_path).version,
+        "seconds": round(time.monotonic() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Évaluation en masse de demandes (JSONL -> NDJSON), hors SOAP")
+    parser.add_argument("input", help="fichier JSONL des demandes ('-' pour stdin)")
+    parser.add_argument("-o", "--output", help="fichier NDJSON des décisions (stdout par défaut)")
+    parser.add_argument("--rules", default=POLICY_RULES_PATH, help="fichier de règles de la politique")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args()
+
+    lines = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        summary = run_bulk(lines, out, args.rules, args.workers, args.chunk_size)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(summary, indent=2, ensure_ascii=False), file=sys.stderr if out is sys.stdout else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fusion des profils d'une même trace (un request_id) produits par les services.
+
+Les fichiers ``<request_id>.<service>.<pid>.<n>.pstats`` / ``.folded`` de
+PROFILE_DIR (voir common/profiling.py) sont regroupés :
+- les .pstats en un seul pstats (option -o) et un résumé des fonctions les plus coûteuses ;
+- toutes les piles repliées en un seul fichier (option --collapsed), chaque pile
+  préfixée par le service qui l'a produite (directement exploitable par flamegraph.pl).
+
+Usage :
+    python tools/merge_profiles.py REQ_20251111101409_5426 [--dir src/profiles] [-o trace.pstats]
+                                   [--collapsed trace.folded] [--top 25] [--sort cumulative]
+"""
+
+import argparse
+import glob
+import io
+import os
+import pstats
+import sys
+from collections import Counter
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.profiling import PROFILE_DIR, collapsed_stacks, write_collapsed  # noqa: E402
+
+
+def find_profiles(request_id: str, directory: str = PROFILE_DIR) -> Dict[str, List[str]]:
+    """Fichiers de la trace, par extension."""
+    found = {"pstats": [], "folded": []}
+    for path in sorted(glob.glob(os.path.join(glob.escape(directory), f"{glob.escape(request_id)}.*"))):
+        ext = path.rsplit(".", 1)[-1]
+        if ext in found:
+            found[ext].append(path)
+    return found
+
+
+def service_of(path: str, request_id: str) -> str:
+    return os.path.basename(path)[len(request_id) + 1:].split(".", 1)[0]
+
+
+def merge_collapsed(request_id: str, profiles: Dict[str, List[str]]) -> Counter:
+    """
+    Piles repliées de toute la trace : .folded tels quels, .pstats convertis
+    (racine = service) sauf s'ils ont déjà un .folded jumeau (PROFILE_FORMAT=both).
+    """
+    merged = Counter()
+    folded = {path[:-len(".folded")] for path in profiles["folded"]}
+    for path in profiles["pstats"]:
+        if path[:-len(".pstats")] not in folded:
+            merged.update(collapsed_stacks(pstats.Stats(path), root=service_of(path, request_id)))
+    for path in profiles["folded"]:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                stack, _, value = line.rstrip("\n").rpartition(" ")
+                if stack:
+                    merged[stack] += int(value)
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fusion des profils d'une trace (request_id) entre services")
+    parser.add_argument("request_id")
+    parser.add_argument("--dir", default=PROFILE_DIR, help="répertoire des profils")
+    parser.add_argument("-o", "--output", help="écrire le pstats fusionné dans ce fichier")
+    parser.add_argument("--collapsed", help="écrire les piles repliées fusionnées dans ce fichier")
+    parser.add_argument("--top", type=int, default=25, help="nombre de fonctions du résumé")
+    parser.add_argument("--sort", default="cumulative", help="clé de tri pstats du résumé")
+    args = parser.parse_args()
+
+    profiles = find_profiles(args.request_id, args.dir)
+    if not profiles["pstats"] and not profiles["folded"]:
+        sys.exit(f"❌ Aucun profil pour {args.request_id} dans {args.dir}")
+
+    services = sorted({service_of(p, args.request_id) for paths in profiles.values() for p in paths})
+    print(f"Trace {args.request_id} : {len(profiles['pstats'])} pstats, {len(profiles['folded'])} folded "
+          f"({', '.join(services)})")
+
+    if profiles["pstats"]:
+        out = io.StringIO()
+        stats = pstats.Stats(*profiles["pstats"], stream=out)
+        if args.output:
+            stats.dump_stats(args.output)
+            print(f"✅ pstats fusionné : {args.output}")
+        stats.sort_stats(args.sort).print_stats(args.top)
+        print(out.getvalue())
+
+    if args.collapsed:
+        write_collapsed(merge_collapsed(args.request_id, profiles), args.collapsed)
+        print(f"✅ Piles repliées : {args.collapsed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Doublures locales de Gemini et du serveur SMTP : les cinq services peuvent être
+testés en charge et profilés sur une machine isolée (sans clé d'API ni réseau).
+
+- LLM : point d'accès HTTP au format de l'API REST Gemini
+  (POST /v1beta/models/<modèle>:generateContent). Le texte de la demande est
+  relu dans le prompt et extrait par le fallback regex d'IE ; la réponse est
+  le JSON attendu par call_gemini_extract, entouré d'un bloc ```json comme
+  le renvoie souvent le vrai modèle. GET /ready répond 200, GET /stats donne
+  les compteurs des deux doublures
+- SMTP : puits qui accepte tout message (EHLO, AUTH PLAIN, MAIL, RCPT, DATA)
+  sans le remettre à personne
+- Chaque doublure a sa distribution de latence et ses taux de fautes :
+    erreur   : HTTP 503 « modèle surchargé » / SMTP 451 en fin de DATA
+    blocage  : aucune réponse pendant STAND_IN_HANG_SECONDS (le client atteint
+               son délai d'attente : GEMINI_TIMEOUT_SECONDS, SMTP_TIMEOUT_SECONDS)
+    malformé : (LLM) réponse en prose sans JSON, IE passe au fallback regex
+- Latences (en ms) : ``fixed:<ms>``, ``uniform:<min>,<max>``,
+  ``normal:<moyenne>,<écart-type>``, ``lognormal:<médiane>,<sigma>``, ``exp:<moyenne>``
+- Tout tourne dans le reactor Twisted (attentes par callLater) : une latence
+  simulée n'occupe aucun thread, la doublure ne limite pas le débit mesuré
+
+Usage :
+    python tools/stand_ins.py [--llm-port 8010] [--smtp-port 8025] [--seed 42]
+puis démarrer les services avec GEMINI_BACKEND=stand-in, SMTP_SERVER=127.0.0.1,
+SMTP_PORT=8025 et SMTP_STARTTLS=0 (``STAND_INS=1 python main.py`` fait tout).
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import sys
+from collections import Counter
+from typing import Callable
+
+from twisted.internet import reactor
+from twisted.internet.protocol import Factory
+from twisted.protocols.basic import LineReceiver
+from twisted.web.resource import Resource
+from twisted.web.server import NOT_DONE_YET, Site
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.information_extraction import preprocess_text, fallback_extract  # noqa: E402
+
+# --- Configuration --- #
+STAND_IN_HOST = os.getenv("STAND_IN_HOST", "127.0.0.1")
+LLM_STAND_IN_PORT = int(os.getenv("LLM_STAND_IN_PORT", "8010"))
+SMTP_STAND_IN_PORT = int(os.getenv("SMTP_STAND_IN_PORT", "8025"))
+LLM_STAND_IN_LATENCY = os.getenv("LLM_STAND_IN_LATENCY", "lognormal:900,0.4")
+LLM_STAND_IN_ERROR_RATE = float(os.getenv("LLM_STAND_IN_ERROR_RATE", "0"))
+LLM_STAND_IN_TIMEOUT_RATE = float(os.getenv("LLM_STAND_IN_TIMEOUT_RATE", "0"))
+LLM_STAND_IN_MALFORMED_RATE = float(os.getenv("LLM_STAND_IN_MALFORMED_RATE", "0"))
+SMTP_STAND_IN_LATENCY = os.getenv("SMTP_STAND_IN_LATENCY", "lognormal:120,0.5")
+SMTP_STAND_IN_ERROR_RATE = float(os.getenv("SMTP_STAND_IN_ERROR_RATE", "0"))
+SMTP_STAND_IN_TIMEOUT_RATE = float(os.getenv("SMTP_STAND_IN_TIMEOUT_RATE", "0"))
+STAND_IN_HANG_SECONDS = float(os.getenv("STAND_IN_HANG_SECONDS", "120"))
+STAND_IN_SEED = os.getenv("STAND_IN_SEED")
+
+# Texte de la demande dans le prompt de call_gemini_extract (entre triples guillemets)
+_PROMPT_TEXT = re.compile(r'"""(.*)"""', re.DOTALL)
+_MALFORMED_ANSWER = "Je ne suis pas en mesure d'extraire ces informations de la demande."
+
+
+# --- Latences et fautes --- #
+def latency_sampler(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Tirage d'une latence en secondes selon ``loi:paramètres`` (paramètres en ms)."""
+    kind, _, params = spec.partition(":")
+    try:
+        values = [float(v) for v in params.split(",") if v.strip()]
+        kind = kind.strip().lower()
+        if kind == "fixed":
+            (ms,) = values
+            sample = lambda: ms  # noqa: E731
+        elif kind == "uniform":
+            low, high = values
+            sample = lambda: rng.uniform(low, high)  # noqa: E731
+        elif kind == "normal":
+            mean, stddev = values
+            sample = lambda: rng.gauss(mean, stddev)  # noqa: E731
+        elif kind == "lognormal":
+            median, sigma = values
+            mu = math.log(median)
+            sample = lambda: rng.lognormvariate(mu, sigma)  # noqa: E731
+        elif kind == "exp":
+            (mean,) = values
+            sample = lambda: rng.expovariate(1.0 / mean)  # noqa: E731
+        else:
+            raise ValueError(kind)
+    except (ValueError, ZeroDivisionError):
+        raise ValueError(f"invalid latency spec {spec!r} (fixed, uniform, normal, lognormal or exp)")
+    return lambda: max(sample(), 0.0) / 1000.0
+
+
+class Faults:
+    """Issue tirée pour chaque appel (``ok``, ``error``, ``timeout``, ``malformed``) et sa latence."""
+
+    def __init__(self, latency: str, error_rate: float, timeout_rate: float, rng: random.Random,
+                 malformed_rate: float = 0.0):
+        self.latency = latency_sampler(latency, rng)
+        self.rates = (("error", error_rate), ("timeout", timeout_rate), ("malformed", malformed_rate))
+        self.rng = rng
+        self.counts = Counter()
+
+    def draw(self) -> str:
+        roll = self.rng.random()
+        outcome = "ok"
+        for name, rate in self.rates:
+            if roll < rate:
+                outcome = name
+                break
+            roll -= rate
+        self.counts[outcome] += 1
+        return outcome
+
+    def stats(self):
+        return dict(self.counts)
+
+
+# --- LLM --- #
+def gemini_answer(prompt: str) -> str:
+    """Sortie « modèle » pour un prompt d'extraction : le JSON du fallback regex, en bloc ```json."""
+    m = _PROMPT_TEXT.search(prompt or "")
+    fields = fallback_extract(preprocess_text(m.group(1) if m else prompt or ""))
+    return "```json\n" + json.dumps(fields, ensure_ascii=False, indent=2) + "\n```"
+
+
+def _gemini_body(text: str, model: str) -> bytes:
+    return json.dumps({
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "modelVersion": model,
+    }, ensure_ascii=False).encode("utf-8")
+
+
+class GeminiStandIn(Resource):
+    isLeaf = True
+
+    def __init__(self, faults: Faults, stats: Callable[[], dict]):
+        super().__init__()
+        self.faults = faults
+        self.stats = stats
+
+    def render_GET(self, request):
+        request.setHeader(b"Content-Type", b"application/json")
+        if request.path == b"/ready":
+            return b'{"ready":true}'
+        if request.path == b"/stats":
+            return json.dumps(self.stats()).encode("utf-8")
+        request.setResponseCode(404)
+        return b'{"error":{"code":404,"status":"NOT_FOUND"}}'
+
+    def render_POST(self, request):
+        request.setHeader(b"Content-Type", b"application/json")
+        path = request.path.decode("utf-8", "replace")
+        if not path.endswith(":generateContent"):
+            request.setResponseCode(404)
+            return b'{"error":{"code":404,"status":"NOT_FOUND"}}'
+        try:
+            body = json.loads(request.content.read() or b"{}")
+            prompt = "".join(p.get("text", "") for p in body["contents"][-1]["parts"])
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+            request.setResponseCode(400)
+            return b'{"error":{"code":400,"message":"Invalid JSON payload","status":"INVALID_ARGUMENT"}}'
+
+        model = path.rsplit("/", 1)[-1].split(":", 1)[0]
+        outcome = self.faults.draw()
+        delay = STAND_IN_HANG_SECONDS if outcome == "timeout" else self.faults.latency()
+        call = reactor.callLater(delay, self._answer, request, outcome, prompt, model)
+        # client parti avant la réponse (délai d'attente dépassé) : rien à envoyer
+        request.notifyFinish().addErrback(lambda _: call.active() and call.cancel())
+        return NOT_DONE_YET
+
+    def _answer(self, request, outcome: str, prompt: str, model: str):
+        if outcome in ("error", "timeout"):
+            code, status = (503, "UNAVAILABLE") if outcome == "error" else (504, "DEADLINE_EXCEEDED")
+            request.setResponseCode(code)
+            request.write(json.dumps({"error": {
+                "code": code, "message": "The model is overloaded. Please try again later.", "status": status,
+            }}).encode("utf-8"))
+        else:
+            text = _MALFORMED_ANSWER if outcome == "malformed" else gemini_answer(prompt)
+            request.write(_gemini_body(text, model))
+        request.finish()
+
+
+# --- SMTP --- #
+class SmtpSink(LineReceiver):
+    """Session SMTP minimale : tout est accepté, le message est compté puis jeté."""
+
+    delimiter = b"\r\n"
+    MAX_LENGTH = 1 << 20
+
+    def connectionMade(self):
+        self.in_data = False
+        self.size = 0
+        self.pending = None
+        self.reply(220, "stand-in ESMTP ready")
+
+    def connectionLost(self, reason=None):
+        if self.pending is not None and self.pending.active():
+            self.pending.cancel()
+
+    def reply(self, code: int, text: str):
+        self.sendLine(f"{code} {text}".encode("utf-8"))
+
+    def lineReceived(self, line: bytes):
+        if self.in_data:
+            if line == b".":
+                self.in_data = False
+                self.end_of_data()
+            else:
+                self.size += len(line) + 2
+            return
+        verb = line.split(b" ", 1)[0].upper()
+        if verb == b"EHLO":
+            self.sendLine(b"250-stand-in")
+            self.sendLine(b"250-8BITMIME")
+            self.sendLine(b"250-SMTPUTF8")
+            self.sendLine(b"250 AUTH PLAIN")
+        elif verb == b"HELO":
+            self.reply(250, "stand-in")
+        elif verb == b"AUTH":
+            self.reply(235, "2.7.0 Authentication successful")
+        elif verb in (b"MAIL", b"RCPT", b"RSET", b"NOOP"):
+            self.reply(250, "2.0.0 OK")
+        elif verb == b"DATA":
+            self.in_data, self.size = True, 0
+            self.reply(354, "End data with <CR><LF>.<CR><LF>")
+        elif verb == b"QUIT":
+            self.reply(221, "2.0.0 Bye")
+            self.transport.loseConnection()
+        else:
+            self.reply(502, "5.5.2 Command not implemented")
+
+    def end_of_data(self):
+        faults = self.factory.faults
+        outcome = faults.draw()
+        if outcome == "timeout":
+            self.pending = reactor.callLater(STAND_IN_HANG_SECONDS, self.transport.loseConnection)
+        elif outcome == "error":
+            self.pending = reactor.callLater(faults.latency(), self.reply,
+                                             451, "4.3.0 Temporary local problem, try again later")
+        else:
+            self.factory.received += 1
+            self.factory.bytes += self.size
+            self.pending = reactor.callLater(faults.latency(), self.reply, 250, "2.0.0 Queued")
+
+
+class SmtpSinkFactory(Factory):
+    protocol = SmtpSink
+
+    def __init__(self, faults: Faults):
+        self.faults = faults
+        self.received = 0
+        self.bytes = 0
+
+    def stats(self):
+        return {**self.faults.stats(), "messages": self.received, "bytes": self.bytes}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Doublures locales Gemini et SMTP, avec injection de latence et de fautes")
+    parser.add_argument("--llm-port", type=int, default=LLM_STAND_IN_PORT, help="0 désactive la doublure LLM")
+    parser.add_argument("--smtp-port", type=int, default=SMTP_STAND_IN_PORT, help="0 désactive le puits SMTP")
+    parser.add_argument("--seed", type=int, default=int(STAND_IN_SEED) if STAND_IN_SEED else None,
+                        help="graine des tirages de latence et de fautes (reproductible)")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    llm_faults = Faults(LLM_STAND_IN_LATENCY, LLM_STAND_IN_ERROR_RATE, LLM_STAND_IN_TIMEOUT_RATE, rng,
+                        malformed_rate=LLM_STAND_IN_MALFORMED_RATE)
+    smtp = SmtpSinkFactory(Faults(SMTP_STAND_IN_LATENCY, SMTP_STAND_IN_ERROR_RATE, SMTP_STAND_IN_TIMEOUT_RATE, rng))
+
+    if args.smtp_port:
+        reactor.listenTCP(args.smtp_port, smtp, interface=STAND_IN_HOST)
+        print(f"Puits SMTP sur {STAND_IN_HOST}:{args.smtp_port} (latence {SMTP_STAND_IN_LATENCY})")
+    if args.llm_port:
+        stats = lambda: {"llm": llm_faults.stats(), "smtp": smtp.stats()}  # noqa: E731
+        reactor.listenTCP(args.llm_port, Site(GeminiStandIn(llm_faults, stats)), interface=STAND_IN_HOST)
+        print(f"Doublure Gemini sur http://{STAND_IN_HOST}:{args.llm_port} (latence {LLM_STAND_IN_LATENCY})")
+    reactor.run()
+
+
+if __name__ == "__main__":
+    main()